@@ -0,0 +1,49 @@
+"""daily_equity_snapshots: snapshot_day + unique (account, day)
+
+Revision ID: 0c4e7b9a2d53
+Revises: f8b3d6a2e419
+Create Date: 2026-10-19 13:48:51.206733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c4e7b9a2d53'
+down_revision: Union[str, None] = 'f8b3d6a2e419'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("daily_equity_snapshots", sa.Column("snapshot_day", sa.Date(), nullable=True))
+    op.execute("UPDATE daily_equity_snapshots SET snapshot_day = COALESCE(date, now() AT TIME ZONE 'UTC')::date")
+
+    # اسنپ‌شات‌های تکراری (اجرای دوباره job) — اولین اسنپ‌شات هر روز نگه داشته می‌شود
+    op.execute(
+        """
+        DELETE FROM daily_equity_snapshots d
+        USING (
+            SELECT id, row_number() OVER (
+                PARTITION BY prop_account_id, snapshot_day ORDER BY date ASC NULLS LAST, id
+            ) AS rn
+            FROM daily_equity_snapshots
+        ) ranked
+        WHERE d.id = ranked.id AND ranked.rn > 1
+        """
+    )
+
+    op.alter_column("daily_equity_snapshots", "snapshot_day", nullable=False)
+    op.create_unique_constraint(
+        "uq_daily_equity_snapshots_account_day",
+        "daily_equity_snapshots",
+        ["prop_account_id", "snapshot_day"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_daily_equity_snapshots_account_day", "daily_equity_snapshots", type_="unique")
+    op.drop_column("daily_equity_snapshots", "snapshot_day")
@@ -0,0 +1,43 @@
+"""prop_equity_points (equity curve)
+
+Revision ID: 3f7d2a9c8e15
+Revises: 9e1a6c4f2b87
+Create Date: 2026-10-19 16:40:22.913561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7d2a9c8e15'
+down_revision: Union[str, None] = '9e1a6c4f2b87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prop_equity_points",
+        sa.Column("prop_account_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("ts", sa.DateTime(), nullable=False),
+        sa.Column("equity", sa.Numeric(20, 2), nullable=False),
+        sa.ForeignKeyConstraint(["prop_account_id"], ["prop_accounts.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("prop_account_id", "ts"),
+    )
+
+    # نقطه شروع منحنی برای اکانت‌های موجود
+    op.execute(
+        """
+        INSERT INTO prop_equity_points (prop_account_id, ts, equity)
+        SELECT id, started_at, starting_balance FROM prop_accounts
+        ON CONFLICT DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("prop_equity_points")
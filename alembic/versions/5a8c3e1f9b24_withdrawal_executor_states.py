@@ -0,0 +1,46 @@
+"""withdrawal executor: PROCESSING/COMPLETED states + claim columns
+
+Revision ID: 5a8c3e1f9b24
+Revises: d41f8b2c6e97
+Create Date: 2026-10-19 10:48:02.615339
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a8c3e1f9b24'
+down_revision: Union[str, None] = 'd41f8b2c6e97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 1) enum values used by the model (ALTER TYPE ... ADD VALUE cannot run inside a transaction)
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE withdrawalstatus ADD VALUE IF NOT EXISTS 'PROCESSING'")
+        op.execute("ALTER TYPE withdrawalstatus ADD VALUE IF NOT EXISTS 'COMPLETED'")
+
+    # 2) claim / broadcast bookkeeping
+    op.add_column("withdrawals", sa.Column("claimed_by", sa.String(length=128), nullable=True))
+    op.add_column("withdrawals", sa.Column("claimed_at", sa.DateTime(), nullable=True))
+    op.add_column("withdrawals", sa.Column("broadcast_at", sa.DateTime(), nullable=True))
+
+    # 3) executor queue scan
+    op.create_index(
+        "ix_withdrawals_executor_queue",
+        "withdrawals",
+        ["status", "created_at"],
+        postgresql_where=sa.text("status IN ('PENDING', 'APPROVED', 'PROCESSING')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_withdrawals_executor_queue", table_name="withdrawals")
+    op.drop_column("withdrawals", "broadcast_at")
+    op.drop_column("withdrawals", "claimed_at")
+    op.drop_column("withdrawals", "claimed_by")
+    # enum values cannot be dropped in PostgreSQL; left in place
@@ -0,0 +1,41 @@
+"""add asset/network/block columns to transactions for two-phase deposits
+
+Revision ID: 7c2e9d41a5b3
+Revises: 63da3ac77c7e
+Create Date: 2026-10-19 09:12:44.103217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e9d41a5b3'
+down_revision: Union[str, None] = '63da3ac77c7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("asset", sa.String(length=10), nullable=True))
+    op.add_column("transactions", sa.Column("network", sa.String(length=10), nullable=True))
+    op.add_column("transactions", sa.Column("block_number", sa.BigInteger(), nullable=True))
+    op.add_column("transactions", sa.Column("block_hash", sa.String(length=128), nullable=True))
+
+    # observer: واریزهای PENDING هر شبکه تا عمق تایید
+    op.create_index(
+        "ix_transactions_pending_deposits",
+        "transactions",
+        ["network", "block_number"],
+        postgresql_where=sa.text("status = 'PENDING' AND type = 'DEPOSIT'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_pending_deposits", table_name="transactions")
+    op.drop_column("transactions", "block_hash")
+    op.drop_column("transactions", "block_number")
+    op.drop_column("transactions", "network")
+    op.drop_column("transactions", "asset")
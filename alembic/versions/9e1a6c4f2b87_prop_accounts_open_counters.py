@@ -0,0 +1,43 @@
+"""prop_accounts: open_trades / open_exposure counters
+
+Revision ID: 9e1a6c4f2b87
+Revises: 0c4e7b9a2d53
+Create Date: 2026-10-19 15:12:07.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e1a6c4f2b87'
+down_revision: Union[str, None] = '0c4e7b9a2d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("prop_accounts", sa.Column("open_trades", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("prop_accounts", sa.Column("open_exposure", sa.Numeric(20, 9), server_default="0", nullable=False))
+
+    # backfill از پیش‌بینی‌های باز فعلی
+    op.execute(
+        """
+        UPDATE prop_accounts pa
+        SET open_trades = agg.trades, open_exposure = agg.exposure
+        FROM (
+            SELECT prop_account_id, count(*) AS trades, sum(amount) AS exposure
+            FROM predictions
+            WHERE prop_account_id IS NOT NULL AND status = 'OPEN'
+            GROUP BY prop_account_id
+        ) agg
+        WHERE pa.id = agg.prop_account_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("prop_accounts", "open_exposure")
+    op.drop_column("prop_accounts", "open_trades")
@@ -0,0 +1,25 @@
+"""user_stats.updated_at index (incremental leaderboard refresh)
+
+Revision ID: a4c81e3d6f29
+Revises: 3f7d2a9c8e15
+Create Date: 2026-10-19 18:05:41.337092
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c81e3d6f29'
+down_revision: Union[str, None] = '3f7d2a9c8e15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_stats_updated_at', 'user_stats', ['updated_at'], postgresql_using='btree')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_stats_updated_at', table_name='user_stats')
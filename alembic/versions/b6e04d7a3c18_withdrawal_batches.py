@@ -0,0 +1,64 @@
+"""withdrawal batches: multi-recipient payouts per (asset, network)
+
+Revision ID: b6e04d7a3c18
+Revises: 5a8c3e1f9b24
+Create Date: 2026-10-19 11:36:20.418551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e04d7a3c18'
+down_revision: Union[str, None] = '5a8c3e1f9b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('withdrawal_batches',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('asset', sa.String(length=10), nullable=False),
+    sa.Column('network', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'SENT', 'CONFIRMED', 'FAILED', name='withdrawalbatchstatus'), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=20, scale=9), nullable=False),
+    sa.Column('tx_hash', sa.String(length=255), nullable=True),
+    sa.Column('claimed_by', sa.String(length=128), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('broadcast_at', sa.DateTime(), nullable=True),
+    sa.Column('finalized_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_withdrawal_batches')),
+    sa.UniqueConstraint('tx_hash', name=op.f('uq_withdrawal_batches_tx_hash'))
+    )
+
+    # executor: دسته‌های باز (broadcast نشده / در انتظار تایید)
+    op.create_index(
+        "ix_withdrawal_batches_open",
+        "withdrawal_batches",
+        ["status", "claimed_at"],
+        postgresql_where=sa.text("status IN ('PENDING', 'SENT')"),
+    )
+
+    op.add_column("withdrawals", sa.Column("batch_id", sa.UUID(), nullable=True))
+    op.add_column("withdrawals", sa.Column("batch_index", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        op.f("fk_withdrawals_batch_id_withdrawal_batches"),
+        "withdrawals", "withdrawal_batches",
+        ["batch_id"], ["id"],
+    )
+    op.create_index(op.f("ix_withdrawals_batch_id"), "withdrawals", ["batch_id"])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_withdrawals_batch_id"), table_name="withdrawals")
+    op.drop_constraint(op.f("fk_withdrawals_batch_id_withdrawal_batches"), "withdrawals", type_="foreignkey")
+    op.drop_column("withdrawals", "batch_index")
+    op.drop_column("withdrawals", "batch_id")
+    op.drop_index("ix_withdrawal_batches_open", table_name="withdrawal_batches")
+    op.drop_table("withdrawal_batches")
+    sa.Enum(name="withdrawalbatchstatus").drop(op.get_bind(), checkfirst=True)
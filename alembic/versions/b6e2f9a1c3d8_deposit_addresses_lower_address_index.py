@@ -0,0 +1,31 @@
+"""deposit_addresses lower(address) index (EVM owner lookup)
+
+Revision ID: b6e2f9a1c3d8
+Revises: e5d3a8b7c241
+Create Date: 2026-10-19 21:12:08.514630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2f9a1c3d8'
+down_revision: Union[str, None] = 'e5d3a8b7c241'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # آدرس‌های EVM به صورت checksum ذخیره و با lower(address) جستجو می‌شوند
+    op.create_index(
+        'ix_deposit_addresses_asset_network_address_lower',
+        'deposit_addresses',
+        ['asset', 'network', sa.text('lower(address)')],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_deposit_addresses_asset_network_address_lower', table_name='deposit_addresses')
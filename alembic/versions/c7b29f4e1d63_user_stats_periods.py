@@ -0,0 +1,47 @@
+"""user_stats_periods (daily / weekly / season leaderboards)
+
+Revision ID: c7b29f4e1d63
+Revises: a4c81e3d6f29
+Create Date: 2026-10-19 19:22:16.540871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7b29f4e1d63'
+down_revision: Union[str, None] = 'a4c81e3d6f29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_stats_periods',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('period', sa.String(length=8), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('wins', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('losses', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('ties', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_bets', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('net_pnl', sa.Numeric(precision=18, scale=8), nullable=False, server_default='0'),
+        sa.Column('score', sa.Numeric(precision=18, scale=8), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'period', 'period_start'),
+    )
+    op.create_index(
+        'ix_user_stats_periods_rank', 'user_stats_periods',
+        ['period', 'period_start', 'score'], postgresql_using='btree',
+    )
+    # داده تاریخی: scripts/backfill_user_stats_periods.py
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_stats_periods_rank', table_name='user_stats_periods')
+    op.drop_table('user_stats_periods')
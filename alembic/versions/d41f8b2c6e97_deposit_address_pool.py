@@ -0,0 +1,53 @@
+"""deposit address pool: nullable user_id + assigned_at
+
+Revision ID: d41f8b2c6e97
+Revises: 7c2e9d41a5b3
+Create Date: 2026-10-19 10:03:51.472960
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f8b2c6e97'
+down_revision: Union[str, None] = '7c2e9d41a5b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 1) pool rows have no owner yet
+    op.alter_column(
+        "deposit_addresses",
+        "user_id",
+        existing_type=postgresql.UUID(as_uuid=True),
+        nullable=True,
+    )
+
+    # 2) assignment time (backfill: existing rows were assigned on creation)
+    op.add_column("deposit_addresses", sa.Column("assigned_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE deposit_addresses SET assigned_at = created_at WHERE user_id IS NOT NULL")
+
+    # 3) claim path: next free address per (asset, network)
+    op.create_index(
+        "ix_deposit_addresses_pool",
+        "deposit_addresses",
+        ["asset", "network", "derivation_index"],
+        postgresql_where=sa.text("user_id IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_deposit_addresses_pool", table_name="deposit_addresses")
+    op.execute("DELETE FROM deposit_addresses WHERE user_id IS NULL")
+    op.drop_column("deposit_addresses", "assigned_at")
+    op.alter_column(
+        "deposit_addresses",
+        "user_id",
+        existing_type=postgresql.UUID(as_uuid=True),
+        nullable=False,
+    )
@@ -0,0 +1,32 @@
+"""market_resolutions: partial index on open dispute deadlines
+
+Revision ID: e27a9c5d1f60
+Revises: b6e04d7a3c18
+Create Date: 2026-10-19 12:21:09.530184
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e27a9c5d1f60'
+down_revision: Union[str, None] = 'b6e04d7a3c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # market_finalizer: resolution های نهایی‌نشده به ترتیب مهلت اعتراض
+    op.create_index(
+        "ix_market_resolutions_open_deadline",
+        "market_resolutions",
+        ["dispute_deadline"],
+        postgresql_where=sa.text("is_finalized IS NOT TRUE"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_market_resolutions_open_deadline", table_name="market_resolutions")
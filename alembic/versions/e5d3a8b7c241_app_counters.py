@@ -0,0 +1,33 @@
+"""app_counters (leaderboard generation)
+
+Revision ID: e5d3a8b7c241
+Revises: c7b29f4e1d63
+Create Date: 2026-10-19 20:47:30.118264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5d3a8b7c241'
+down_revision: Union[str, None] = 'c7b29f4e1d63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'app_counters',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.execute("INSERT INTO app_counters (name, value) VALUES ('leaderboard_generation', 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('app_counters')
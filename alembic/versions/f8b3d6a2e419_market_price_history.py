@@ -0,0 +1,47 @@
+"""market_price_history: daily-partitioned price time series
+
+Revision ID: f8b3d6a2e419
+Revises: e27a9c5d1f60
+Create Date: 2026-10-19 13:02:37.771920
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8b3d6a2e419'
+down_revision: Union[str, None] = 'e27a9c5d1f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE market_price_history (
+            market_id UUID NOT NULL,
+            ts TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            yes_price NUMERIC(6, 4),
+            no_price NUMERIC(6, 4),
+            CONSTRAINT pk_market_price_history PRIMARY KEY (market_id, ts)
+        ) PARTITION BY RANGE (ts)
+        """
+    )
+    op.execute("CREATE TABLE market_price_history_default PARTITION OF market_price_history DEFAULT")
+
+    # چند روز اول؛ بعد از آن price_history_service.ensure_price_history_partitions روزانه می‌سازد
+    today = datetime.utcnow().date()
+    for i in range(0, 8):
+        day = today + timedelta(days=i)
+        op.execute(
+            f"CREATE TABLE market_price_history_{day:%Y%m%d} PARTITION OF market_price_history "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+
+
+def downgrade() -> None:
+    # partition ها همراه جدول والد حذف می‌شوند
+    op.execute("DROP TABLE IF EXISTS market_price_history CASCADE")
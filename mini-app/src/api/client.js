@@ -62,7 +62,20 @@ async function request(endpoint, options = {}) {
 
 // === Live Prediction & Prop Markets ===
 export const getActiveMarkets = () => request('/api/markets/active');
+export const getMarketHistory = (marketId, { from, to, resolution = 'auto' } = {}) => {
+  const params = new URLSearchParams({ resolution });
+  if (from) params.set('from', from);
+  if (to) params.set('to', to);
+  return request(`/api/markets/${marketId}/history?${params}`);
+};
 export const getMyPropAccount = () => request('/api/prop/me');
+export const getPropEquity = (propAccountId, { from, to, resolution = 'auto', maxPoints } = {}) => {
+  const params = new URLSearchParams({ resolution });
+  if (from) params.set('from', from);
+  if (to) params.set('to', to);
+  if (maxPoints) params.set('max_points', maxPoints);
+  return request(`/api/prop/${propAccountId}/equity?${params}`);
+};
 export const getBalances = () => request('/api/wallet/balances');
 
 export const placeRealPrediction = (marketId, direction, amount) => 
@@ -96,6 +109,7 @@ export const getActiveRound = () => request('/api/rounds/active');
 export const getPrice = () => request('/api/price');
 export const getBetHistory = () => request('/api/predictions/history');
 export const getPendingDeposit = (asset, network) => request(`/api/wallet/deposit/pending?asset=${asset}&network=${network}`);
+export const getIncomingDeposits = () => request('/api/deposit/incoming');
 export const requestDeposit = (asset, network) => request('/api/wallet/deposit', { method: 'POST', body: JSON.stringify({ asset, network }) });
 export const requestWithdrawal = (to_address, amount, asset, network) => request('/api/wallet/withdraw', { method: 'POST', body: JSON.stringify({ to_address, amount, asset, network }) });
 
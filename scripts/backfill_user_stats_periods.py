@@ -0,0 +1,123 @@
+"""
+Backfill user_stats_periods from historical bets.
+
+- bucket های روزانه / هفتگی / فصلی را از bets تسویه‌شده (WON / LOST / REFUNDED) می‌سازد
+- bets به صورت streaming با keyset pagination روی id خوانده می‌شوند (batch-size ردیف در هر round trip)
+  و هر batch در پایتون تجمیع و با همان upsert افزایشی تسویه (add_period_stats) اعمال می‌شود
+- زمان هر شرط: rounds.settled_at (در نبود آن bets.updated_at)
+- با --since فقط bucket هایی که از آن تاریخ شروع می‌شوند بازسازی می‌شوند؛ بدون آن کل جدول
+
+bucket های هدف ابتدا حذف می‌شوند، پس اجرای دوباره امن است. در حین اجرا round runner
+باید متوقف باشد (تسویه همزمان روی همان bucket ها دوبار شمرده می‌شود).
+
+مثال:
+    PYTHONPATH=. python scripts/backfill_user_stats_periods.py --since 2026-09-01 --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rebuild daily/weekly/season leaderboard buckets from bets")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="YYYY-MM-DD (default: all history)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="bets per streamed batch")
+    parser.add_argument("--dry-run", action="store_true", help="aggregate only, do not write")
+    return parser.parse_args()
+
+
+_UPSERT_CHUNK = 3000  # حد پارامترهای asyncpg / تعداد ستون‌ها
+
+
+async def run(args):
+    from sqlalchemy import delete, func, or_, and_, select
+
+    from src.database.connection import async_session
+    from src.database.models import Bet, BetStatus, Round, UserStatsPeriod
+    from src.core.services.stats_service import (
+        PERIODS, add_period_stats, outcome_deltas, period_start, period_starts,
+    )
+
+    cutoffs = {p: period_start(p, args.since) for p in PERIODS} if args.since else None
+    settled_at = func.coalesce(Round.settled_at, Bet.updated_at)
+
+    async with async_session() as session:
+        if not args.dry_run:
+            t = UserStatsPeriod
+            stmt = delete(t)
+            if cutoffs:
+                stmt = stmt.where(or_(*[
+                    and_(t.period == p, t.period_start >= start) for p, start in cutoffs.items()
+                ]))
+            removed = (await session.execute(stmt)).rowcount
+            await session.commit()
+            print(f"🧹 removed {removed} existing buckets")
+
+        last_id = None
+        bets = buckets_written = 0
+        started = time.perf_counter()
+
+        while True:
+            query = (
+                select(Bet.id, Bet.user_id, Bet.status, Bet.amount, Bet.payout, settled_at.label("settled_at"))
+                .join(Round, Round.id == Bet.round_id)
+                .where(Bet.status.in_([BetStatus.WON, BetStatus.LOST, BetStatus.REFUNDED]))
+                .order_by(Bet.id)
+                .limit(args.batch_size)
+            )
+            if cutoffs:
+                query = query.where(settled_at >= datetime.combine(min(cutoffs.values()), datetime.min.time()))
+            if last_id is not None:
+                query = query.where(Bet.id > last_id)
+
+            rows = (await session.execute(query)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            bets += len(rows)
+
+            agg = {}
+            for r in rows:
+                if r.status == BetStatus.WON:
+                    deltas = outcome_deltas("WIN", (r.payout or Decimal("0")) - r.amount)
+                elif r.status == BetStatus.LOST:
+                    deltas = outcome_deltas("LOSS", -r.amount)
+                else:
+                    deltas = outcome_deltas("TIE", Decimal("0"))
+
+                for period, start in period_starts(r.settled_at).items():
+                    if cutoffs and start < cutoffs[period]:
+                        continue
+                    bucket = agg.setdefault((r.user_id, period, start), {
+                        "user_id": r.user_id, "period": period, "period_start": start,
+                        "wins": 0, "losses": 0, "ties": 0, "total_bets": 0, "net_pnl": Decimal("0"),
+                    })
+                    for key, value in deltas.items():
+                        bucket[key] += value
+
+            buckets = list(agg.values())
+            if not args.dry_run:
+                for i in range(0, len(buckets), _UPSERT_CHUNK):
+                    await add_period_stats(session, buckets[i:i + _UPSERT_CHUNK])
+                await session.commit()
+            buckets_written += len(buckets)
+
+            elapsed = time.perf_counter() - started
+            print(f"  … {bets} bets ({bets / elapsed:.0f}/s), {buckets_written} bucket upserts")
+
+    mode = "dry run" if args.dry_run else "done"
+    print(f"✅ {mode}: {bets} bets → {buckets_written} bucket upserts")
+    return True
+
+
+def main():
+    ok = asyncio.run(run(parse_args()))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Deposit observer benchmark against the local chain simulator.
+
+- simulator (src.simulator.server) را in-process روی یک پورت محلی بالا می‌آورد
+- TRONGRID / TONCENTER / EVM RPC را به simulator اشاره می‌دهد
+- کاربران / آدرس‌ها / memo های bench را در یک دیتابیس scratch seed می‌کند
+- process_deposits را برای هر شبکه در حلقه اجرا می‌کند و گزارش می‌دهد:
+  blocks scanned/sec, credits/sec, latency تا PENDING و تا credit (p50/p95/max),
+  credit روی تراکنش‌های orphan (reorg)، و تعداد 429 ها
+
+فقط روی دیتابیس scratch اجرا شود (BENCH_DATABASE_URL)؛ داده‌های bench در ابتدا و انتها پاک می‌شوند.
+
+مثال:
+    BENCH_DATABASE_URL=postgresql://... PYTHONPATH=. python scripts/bench_observer.py \\
+        --duration 60 --blocks-per-sec 2 --deposits-per-block 20 --rate-limit-probability 0.05
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+BENCH_TELEGRAM_ID_BASE = 9_100_000_000
+BENCH_DERIVATION_BASE = 1_000_000_000
+NETWORKS = ("TRC20", "TON", "ERC20", "BEP20")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark deposit_observer against the chain simulator")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between observer cycles")
+    parser.add_argument("--port", type=int, default=8711)
+    parser.add_argument("--networks", default="TRC20,TON,ERC20", help=f"comma-separated subset of {','.join(NETWORKS)}")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--blocks-per-sec", type=float, default=1.0)
+    parser.add_argument("--deposits-per-block", type=int, default=10)
+    parser.add_argument("--reorg-probability", type=float, default=0.0)
+    parser.add_argument("--reorg-depth", type=int, default=2)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--confirmations", type=int, default=3)
+    parser.add_argument("--provider-rps", type=float, default=200.0, help="client-side token bucket per provider")
+    parser.add_argument("--keep-data", action="store_true")
+    return parser.parse_args()
+
+
+def _fake_tron_address(i: int) -> str:
+    alphabet = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+    digest = hashlib.sha256(f"bench-tron-{i}".encode()).digest()
+    return "T" + "".join(alphabet[b % len(alphabet)] for b in digest[:33])
+
+
+def _fake_evm_address(i: int) -> str:
+    return "0x" + hashlib.sha256(f"bench-evm-{i}".encode()).hexdigest()[:40]
+
+
+def _configure_env(args, networks):
+    """باید قبل از import ماژول‌های src انجام شود (provider ها هنگام import ثبت می‌شوند)"""
+    bench_db = os.getenv("BENCH_DATABASE_URL")
+    if not bench_db:
+        sys.exit("BENCH_DATABASE_URL is required (scratch database only)")
+    os.environ["DATABASE_URL"] = bench_db
+
+    base = f"http://127.0.0.1:{args.port}"
+    os.environ["TRONGRID_BASE_URL"] = f"{base}/tron"
+    os.environ["TONCENTER_BASE_URL"] = f"{base}/ton"
+    os.environ["ERC20_RPC_URL"] = f"{base}/evm/ERC20"
+    os.environ["BEP20_RPC_URL"] = f"{base}/evm/BEP20"
+    for name in ("TRONGRID_FALLBACK_URLS", "TONCENTER_FALLBACK_URLS", "ERC20_RPC_FALLBACK_URLS", "BEP20_RPC_FALLBACK_URLS"):
+        os.environ[name] = ""
+
+    rps = str(args.provider_rps)
+    for name in ("TRONGRID_RPS", "TONCENTER_RPS", "ERC20_RPC_RPS", "BEP20_RPC_RPS"):
+        os.environ[name] = rps
+
+    confirmations = str(args.confirmations)
+    for name in ("TRON_OBSERVER_CONFIRMATIONS", "ERC20_CONFIRMATIONS", "BEP20_CONFIRMATIONS"):
+        os.environ[name] = confirmations
+
+    tmp = tempfile.mkdtemp(prefix="bench_observer_")
+    os.environ["TRON_OBSERVER_CURSOR_FILE"] = os.path.join(tmp, "tron_cursor.json")
+    os.environ["TON_OBSERVER_CURSOR_FILE"] = os.path.join(tmp, "ton_cursor.json")
+    os.environ.setdefault("TON_HOUSE_WALLET_ADDRESS", "EQbench-house-wallet")
+
+
+async def _cleanup(session):
+    from sqlalchemy import text
+
+    user_ids = "SELECT id FROM users WHERE telegram_id >= :base"
+    for table in ("ledger", "transactions", "balances", "deposit_requests", "deposit_addresses"):
+        await session.execute(
+            text(f"DELETE FROM {table} WHERE user_id IN ({user_ids})"),
+            {"base": BENCH_TELEGRAM_ID_BASE},
+        )
+    await session.execute(text("DELETE FROM users WHERE telegram_id >= :base"), {"base": BENCH_TELEGRAM_ID_BASE})
+    await session.commit()
+
+
+async def _seed(session, args, networks, memo_count):
+    from src.database.models import User, DepositAddress, DepositRequest, TransactionStatus
+
+    users = [
+        User(telegram_id=BENCH_TELEGRAM_ID_BASE + i, username=f"bench_{i}")
+        for i in range(args.users)
+    ]
+    session.add_all(users)
+    await session.flush()
+
+    tron_addresses, evm_addresses, memos = [], [], []
+    for i, user in enumerate(users):
+        if "TRC20" in networks:
+            addr = _fake_tron_address(i)
+            tron_addresses.append(addr)
+            session.add(DepositAddress(
+                user_id=user.id, asset="USDT", network="TRC20", address=addr,
+                derivation_index=BENCH_DERIVATION_BASE + i,
+            ))
+        for network in ("ERC20", "BEP20"):
+            if network in networks:
+                addr = _fake_evm_address(i)
+                session.add(DepositAddress(
+                    user_id=user.id, asset="USDT", network=network, address=addr,
+                    derivation_index=BENCH_DERIVATION_BASE + i,
+                ))
+        evm_addresses.append(_fake_evm_address(i))
+
+    if "TON" in networks:
+        expires = datetime.utcnow() + timedelta(days=1)
+        for i in range(memo_count):
+            memo = f"DP-BENCH-{i:08d}"
+            memos.append(memo)
+            session.add(DepositRequest(
+                user_id=users[i % len(users)].id, asset="TON", network="TON", memo=memo,
+                status=TransactionStatus.PENDING, expires_at=expires,
+            ))
+
+    await session.commit()
+    return tron_addresses, evm_addresses, memos
+
+
+async def _observer_loop(network, deadline, interval, cycle_times, errors):
+    from src.core.services.deposit_observer import process_deposits
+
+    asset = "TON" if network == "TON" else "USDT"
+    while time.time() < deadline:
+        t0 = time.perf_counter()
+        try:
+            await process_deposits(asset, network)
+        except Exception as e:
+            errors.append(f"{network}: {e}")
+        elapsed = time.perf_counter() - t0
+        cycle_times.append(elapsed)
+        await asyncio.sleep(max(interval - elapsed, 0))
+
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(int(round(q * (len(values) - 1))), len(values) - 1)
+    return values[idx]
+
+
+async def run(args):
+    networks = [n.strip().upper() for n in args.networks.split(",") if n.strip()]
+    unknown = set(networks) - set(NETWORKS)
+    if unknown:
+        sys.exit(f"unknown networks: {sorted(unknown)}")
+
+    _configure_env(args, networks)
+
+    import uvicorn
+    from sqlalchemy import select
+
+    from src.database.connection import async_session
+    from src.database.models import Transaction, TransactionStatus
+    from src.core.utils.http_transport import close_transport, get_transport_metrics
+    from src.simulator.chain import SimConfig
+    from src.simulator.server import build_simulation, create_app
+
+    memo_count = int(args.duration * args.blocks_per_sec * args.deposits_per_block) + args.deposits_per_block * 10
+
+    async with async_session() as session:
+        await _cleanup(session)
+        tron_addresses, evm_addresses, memos = await _seed(session, args, networks, memo_count)
+
+    config = SimConfig(
+        blocks_per_sec=args.blocks_per_sec,
+        deposits_per_block=args.deposits_per_block,
+        reorg_probability=args.reorg_probability,
+        reorg_depth=args.reorg_depth,
+        rate_limit_probability=args.rate_limit_probability,
+    )
+    sim = build_simulation(
+        config,
+        tron_addresses=tron_addresses if "TRC20" in networks else None,
+        ton_memos=memos if "TON" in networks else None,
+        evm_addresses={n: evm_addresses for n in ("ERC20", "BEP20") if n in networks},
+    )
+
+    server = uvicorn.Server(uvicorn.Config(create_app(sim), host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    print(f"=== bench_observer: {networks} for {args.duration:.0f}s ===")
+    started = time.time()
+    deadline = started + args.duration
+    cycle_times = {n: [] for n in networks}
+    errors = []
+
+    try:
+        await asyncio.gather(*[
+            _observer_loop(n, deadline, args.interval, cycle_times[n], errors)
+            for n in networks
+        ])
+        wall = time.time() - started
+
+        chains = sim.chains()
+        for network in networks:
+            chain = chains[network]
+            produced = dict(chain.produced)
+
+            async with async_session() as session:
+                seen = (
+                    await session.execute(
+                        select(Transaction.tx_hash, Transaction.status, Transaction.created_at, Transaction.updated_at)
+                        .where(Transaction.tx_hash.in_(list(produced.keys())))
+                    )
+                ).all() if produced else []
+
+            def _epoch(dt):
+                return dt.replace(tzinfo=timezone.utc).timestamp()
+
+            # created_at = اولین بار دیده شدن (PENDING یا مستقیم CONFIRMED)، updated_at = تایید
+            rows = [r for r in seen if r.status == TransactionStatus.CONFIRMED]
+            seen_latencies = [_epoch(r.created_at) - produced[r.tx_hash] for r in seen]
+            latencies = [_epoch(r.updated_at) - produced[r.tx_hash] for r in rows]
+            orphan_credits = sum(1 for r in rows if r.tx_hash in chain.orphaned)
+            dropped = sum(1 for r in seen if r.status == TransactionStatus.FAILED)
+            cycles = cycle_times[network]
+
+            unit = "txs" if network == "TON" else "blocks"
+            print(f"\n--- {network} ---")
+            print(f"  {unit} scanned/sec : {chain.blocks_served / wall:.1f}  (total {chain.blocks_served})")
+            print(f"  credits/sec        : {len(rows) / wall:.1f}  ({len(rows)}/{len(produced)} produced)")
+            print(
+                f"  seen latency       : p50={_pct(seen_latencies, 0.5):.2f}s "
+                f"p95={_pct(seen_latencies, 0.95):.2f}s max={max(seen_latencies, default=0):.2f}s"
+            )
+            print(
+                f"  credit latency     : p50={_pct(latencies, 0.5):.2f}s "
+                f"p95={_pct(latencies, 0.95):.2f}s max={max(latencies, default=0):.2f}s"
+            )
+            print(
+                f"  cycle time         : mean={statistics.mean(cycles) if cycles else 0:.3f}s "
+                f"p95={_pct(cycles, 0.95):.3f}s cycles={len(cycles)}"
+            )
+            print(f"  reorgs / orphan credits / dropped pending : {chain.reorgs} / {orphan_credits} / {dropped}")
+            print(f"  requests / 429s    : {chain.requests} / {chain.rate_limited}")
+
+        print("\n--- transport ---")
+        for name, m in get_transport_metrics().items():
+            print(f"  {name}: {m}")
+
+        if errors:
+            print(f"\n⚠️ {len(errors)} observer errors (first 5):")
+            for e in errors[:5]:
+                print(f"  {e}")
+
+    finally:
+        server.should_exit = True
+        await server_task
+        await close_transport()
+        if not args.keep_data:
+            async with async_session() as session:
+                await _cleanup(session)
+
+
+def main():
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
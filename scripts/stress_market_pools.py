@@ -0,0 +1,201 @@
+"""
+Concurrency stress test for local market pools.
+
+- یک بازار LOCAL و N کاربر bench با موجودی TON در دیتابیس scratch می‌سازد
+- N پیش‌بینی همزمان (هر کدام session جدا) با place_prediction ثبت می‌کند
+- بررسی می‌کند total_pool_yes / total_pool_no دقیقاً برابر مجموع پیش‌بینی‌ها باشد
+  و locked هر کاربر برابر مبلغ پیش‌بینی او باشد
+
+فقط روی دیتابیس scratch اجرا شود (BENCH_DATABASE_URL)؛ داده‌های bench در ابتدا و انتها پاک می‌شوند.
+exit code غیر صفر در صورت mismatch.
+
+مثال:
+    BENCH_DATABASE_URL=postgresql://... PYTHONPATH=. python scripts/stress_market_pools.py \\
+        --users 500 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+BENCH_TELEGRAM_ID_BASE = 9_200_000_000
+BENCH_MARKET_TITLE = "__stress_market_pools__"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stress place_prediction pool updates on one market")
+    parser.add_argument("--users", type=int, default=500, help="one prediction per user")
+    parser.add_argument("--concurrency", type=int, default=100, help="max in-flight predictions")
+    parser.add_argument("--min-amount", type=int, default=1)
+    parser.add_argument("--max-amount", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep-data", action="store_true")
+    return parser.parse_args()
+
+
+def _configure_env():
+    """باید قبل از import ماژول‌های src انجام شود"""
+    bench_db = os.getenv("BENCH_DATABASE_URL")
+    if not bench_db:
+        sys.exit("BENCH_DATABASE_URL is required (scratch database only)")
+    os.environ["DATABASE_URL"] = bench_db
+
+
+async def _cleanup(session):
+    from sqlalchemy import text
+
+    market_ids = "SELECT id FROM markets WHERE title = :title"
+    user_ids = "SELECT id FROM users WHERE telegram_id >= :base"
+    await session.execute(text(f"DELETE FROM predictions WHERE market_id IN ({market_ids})"), {"title": BENCH_MARKET_TITLE})
+    await session.execute(text("DELETE FROM markets WHERE title = :title"), {"title": BENCH_MARKET_TITLE})
+    for table in ("ledger", "balances"):
+        await session.execute(
+            text(f"DELETE FROM {table} WHERE user_id IN ({user_ids})"),
+            {"base": BENCH_TELEGRAM_ID_BASE},
+        )
+    await session.execute(text("DELETE FROM users WHERE telegram_id >= :base"), {"base": BENCH_TELEGRAM_ID_BASE})
+    await session.commit()
+
+
+async def _seed(session, args):
+    from src.database.models import Balance, Market, MarketStatus, MarketType, User
+
+    users = [
+        User(telegram_id=BENCH_TELEGRAM_ID_BASE + i, username=f"stress_{i}")
+        for i in range(args.users)
+    ]
+    session.add_all(users)
+    await session.flush()
+
+    for user in users:
+        session.add(Balance(
+            user_id=user.id, available=Decimal(args.max_amount * 2), locked=Decimal("0"),
+            currency="TON", asset="TON", network="TON",
+        ))
+
+    market = Market(
+        title=BENCH_MARKET_TITLE,
+        market_type=MarketType.LOCAL,
+        status=MarketStatus.ACTIVE,
+        closes_at=datetime.utcnow() + timedelta(days=1),
+        min_prediction_amount=Decimal(args.min_amount),
+        max_prediction_amount=Decimal(args.max_amount),
+    )
+    session.add(market)
+    await session.commit()
+    return [u.id for u in users], market.id
+
+
+async def run(args):
+    _configure_env()
+
+    from sqlalchemy import func, select
+
+    from src.database.connection import async_session
+    from src.database.models import Balance, Market, Prediction, PredictionDirection
+    from src.core.services.local_market_service import place_prediction
+
+    rng = random.Random(args.seed)
+
+    async with async_session() as session:
+        await _cleanup(session)
+        user_ids, market_id = await _seed(session, args)
+
+    orders = [
+        (
+            uid,
+            PredictionDirection.YES if rng.random() < 0.5 else PredictionDirection.NO,
+            Decimal(rng.randint(args.min_amount, args.max_amount)),
+        )
+        for uid in user_ids
+    ]
+
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], []
+
+    async def _one(uid, direction, amount):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                async with async_session() as session:
+                    await place_prediction(session, uid, market_id, direction, amount)
+            except Exception as e:
+                errors.append(f"{uid}: {e}")
+            latencies.append(time.perf_counter() - t0)
+
+    print(f"=== stress_market_pools: {len(orders)} predictions, concurrency {args.concurrency} ===")
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*[_one(*o) for o in orders])
+        wall = time.perf_counter() - started
+
+        async with async_session() as session:
+            market = (await session.execute(select(Market).where(Market.id == market_id))).scalar_one()
+            sums = dict(
+                (
+                    await session.execute(
+                        select(Prediction.direction, func.coalesce(func.sum(Prediction.amount), 0))
+                        .where(Prediction.market_id == market_id)
+                        .group_by(Prediction.direction)
+                    )
+                ).all()
+            )
+            locked_mismatch = (
+                await session.execute(
+                    select(func.count())
+                    .select_from(Balance)
+                    .join(Prediction, Prediction.user_id == Balance.user_id)
+                    .where(Prediction.market_id == market_id, Balance.asset == "TON", Balance.locked != Prediction.amount)
+                )
+            ).scalar_one()
+            placed = (
+                await session.execute(
+                    select(func.count()).select_from(Prediction).where(Prediction.market_id == market_id)
+                )
+            ).scalar_one()
+
+        expected_yes = Decimal(sums.get(PredictionDirection.YES, 0))
+        expected_no = Decimal(sums.get(PredictionDirection.NO, 0))
+        latencies.sort()
+
+        print(f"  placed             : {placed}/{len(orders)}  ({placed / wall:.1f}/s, wall {wall:.2f}s)")
+        if latencies:
+            print(
+                f"  latency            : p50={latencies[len(latencies) // 2]:.3f}s "
+                f"p95={latencies[max(int(len(latencies) * 0.95) - 1, 0)]:.3f}s max={latencies[-1]:.3f}s"
+            )
+        print(f"  pool YES           : {market.total_pool_yes} (predictions {expected_yes})")
+        print(f"  pool NO            : {market.total_pool_no} (predictions {expected_no})")
+        print(f"  locked mismatches  : {locked_mismatch}")
+
+        if errors:
+            print(f"\n⚠️ {len(errors)} errors (first 5):")
+            for e in errors[:5]:
+                print(f"  {e}")
+
+        ok = (
+            market.total_pool_yes == expected_yes
+            and market.total_pool_no == expected_no
+            and locked_mismatch == 0
+        )
+        print("\n✅ pools consistent" if ok else "\n❌ pool mismatch")
+        return ok
+
+    finally:
+        if not args.keep_data:
+            async with async_session() as session:
+                await _cleanup(session)
+
+
+def main():
+    ok = asyncio.run(run(parse_args()))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from src.core.services.withdrawal_service import (
     approve_withdrawal,
     cancel_withdrawal
 )
+from src.core.utils.http_transport import get_transport_metrics
 
 settings = get_settings()
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -67,3 +68,9 @@ async def admin_cancel(
     async with async_session() as session:
         w = await cancel_withdrawal(session, uuid.UUID(withdrawal_id), reason=reason)
         return {"ok": True, "id": str(w.id), "status": w.status}
+
+
+@router.get("/transport/metrics")
+async def transport_metrics(_=Depends(require_admin)):
+    """Per-provider HTTP latency / error / circuit state"""
+    return get_transport_metrics()
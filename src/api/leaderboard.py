@@ -2,15 +2,18 @@
 Leaderboard API
 API برای لیدربورد و آمار کاربران
 """
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
-from sqlalchemy import select, desc
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connection import async_session
 from src.database.models import User, UserStats
 from src.core.services.user_service import get_or_create_user
+from src.core.services import leaderboard_cache, leaderboard_index
+from src.core.services.leaderboard_cache import WINDOW_ALL, WINDOWS, etag_matches, leaderboard_entry
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
@@ -25,6 +28,16 @@ class LeaderboardEntry(BaseModel):
     win_rate: float
 
 
+class MyRankResponse(BaseModel):
+    rank: Optional[int]
+    score_rank: Optional[int]
+    total: int
+    percentile: Optional[float]
+    score: Optional[float]
+    neighbours: List[LeaderboardEntry]
+    as_of: Optional[datetime]
+
+
 class UserStatsResponse(BaseModel):
     wins: int
     losses: int
@@ -38,48 +51,82 @@ class UserStatsResponse(BaseModel):
 
 
 @router.get("/top", response_model=List[LeaderboardEntry])
-async def get_leaderboard(limit: int = 50, offset: int = 0):
+async def get_leaderboard(request: Request, limit: int = 50, offset: int = 0, window: str = WINDOW_ALL):
     """
     دریافت لیست برترین‌ها
     
     - limit: حداکثر 50
     - offset: برای pagination
+    - window: all | day | week | season (بازه جاری، UTC)
+
+    پاسخ از کش JSON از پیش serialize‌شده (leaderboard_cache) با ETag / 304
     """
     limit = min(max(limit, 1), 50)
-    
+    offset = max(offset, 0)
+
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of: {', '.join(WINDOWS)}")
+
+    page = await leaderboard_cache.get_page(window, limit, offset)
+    headers = {"ETag": page.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), page.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+
+@router.get("/me/rank", response_model=MyRankResponse)
+async def get_my_rank(telegram_id: int, neighbours: int = 2):
+    """
+    رتبه کاربر فعلی + همسایه‌ها و percentile
+
+    - telegram_id: از initData گرفته می‌شود
+    - neighbours: تعداد بازیکن بالا / پایین (حداکثر 10)
+    """
+    neighbours = min(max(neighbours, 0), 10)
+
     async with async_session() as session:
-        query = (
-            select(
-                User.username,
-                User.telegram_id,
-                UserStats.wins,
-                UserStats.losses,
-                UserStats.total_bets,
-                UserStats.score
+        user = (
+            await session.execute(select(User).where(User.telegram_id == telegram_id))
+        ).scalar_one_or_none()
+
+        if user is None or not leaderboard_index.is_ready():
+            # fallback دیتابیس: فقط رتبه امتیازی (بدون همسایه‌ها)
+            stats = None
+            if user is not None:
+                stats = (
+                    await session.execute(select(UserStats).where(UserStats.user_id == user.id))
+                ).scalar_one_or_none()
+            eligible = (
+                select(func.count())
+                .select_from(UserStats)
+                .join(User, User.id == UserStats.user_id)
+                .where(UserStats.total_bets > 0, User.is_system_user == False)
             )
-            .join(UserStats, UserStats.user_id == User.id)
-            .where(UserStats.total_bets > 0)
-            .where(User.is_system_user == False)
-            .order_by(desc(UserStats.score))
-            .limit(limit)
-            .offset(offset)
-        )
-        
-        result = await session.execute(query)
-        rows = result.all()
-    
-    return [
-        LeaderboardEntry(
-            rank=offset + i + 1,
-            telegram_id=row.telegram_id,
-            username=row.username,
-            wins=row.wins,
-            losses=row.losses,
-            score=float(row.score),
-            win_rate=round(row.wins / row.total_bets * 100, 1) if row.total_bets > 0 else 0
-        )
-        for i, row in enumerate(rows)
-    ]
+            total = (await session.execute(eligible)).scalar_one()
+            if stats is None or stats.total_bets <= 0 or user.is_system_user:
+                return MyRankResponse(rank=None, score_rank=None, total=total, percentile=None,
+                                      score=None, neighbours=[], as_of=None)
+            above = (await session.execute(eligible.where(UserStats.score > stats.score))).scalar_one()
+            return MyRankResponse(
+                rank=above + 1, score_rank=above + 1, total=total,
+                percentile=round((total - above - 1) / total * 100, 2) if total > 1 else 100.0,
+                score=float(stats.score), neighbours=[], as_of=datetime.utcnow(),
+            )
+
+    info = leaderboard_index.rank_of(user.id, neighbours)
+    if info is None:
+        return MyRankResponse(rank=None, score_rank=None, total=leaderboard_index.total(), percentile=None,
+                              score=None, neighbours=[], as_of=leaderboard_index.as_of())
+
+    return MyRankResponse(
+        rank=info["rank"],
+        score_rank=info["score_rank"],
+        total=info["total"],
+        percentile=info["percentile"],
+        score=float(info["row"].score),
+        neighbours=[LeaderboardEntry(**leaderboard_entry(rank, row)) for rank, row in info["neighbours"]],
+        as_of=leaderboard_index.as_of(),
+    )
 
 
 @router.get("/me", response_model=UserStatsResponse)
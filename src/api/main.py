@@ -24,7 +24,7 @@ from src.core.services.user_service import get_or_create_user, get_user_balance
 from src.core.services.betting_service import place_bet, get_user_bets
 from src.core.services.round_manager import get_betting_open_round, get_active_or_locked_round
 from src.core.services.deposit_address_service import get_or_create_deposit_address
-from src.core.services.deposit_service import create_deposit_request, get_pending_deposit
+from src.core.services.deposit_service import create_deposit_request, get_pending_deposit, get_incoming_deposits
 from src.core.services.withdrawal_service import request_withdrawal, get_user_withdrawals, WithdrawalError
 from src.core.config import settings, SUPPORTED_ASSET_NETWORKS
 from src.core.services.price_service import get_current_price
@@ -110,7 +110,15 @@ async def startup_jobs():
             from src.core.services.polymarket_service import sync_polymarket_events
             async with async_session() as session:
                 res = await sync_polymarket_events(session)
-                print(f"🔄 Polymarket Sync: Added {res['added']}, Updated {res['updated']}")
+                print(
+                    f"🔄 Polymarket Sync: Added {res['added']}, Updated {res['updated']}, "
+                    f"Unchanged {res['unchanged']}, Resolved {res['resolved']}"
+                )
+
+            # فقط اکانت‌های پراپ با پوزیشن باز روی بازارهای تغییرکرده دوباره ارزیابی می‌شوند
+            if res["changed"]:
+                from src.core.services.prop_evaluator import mark_markets_moved
+                await mark_markets_moved(c["market_id"] for c in res["changed"])
         except Exception as e:
             print(f"🚨 Polymarket Sync Error: {e}")
 
@@ -118,13 +126,13 @@ async def startup_jobs():
     scheduler.add_job(polymarket_sync_job, "interval", minutes=1)
     
     async def prop_evaluation_job():
-        """اجرای موتور ارزیاب پراپ هر ۵ دقیقه"""
+        """sweep کامل موتور ارزیاب پراپ (safety net؛ ارزیابی اصلی رویدادی است)"""
         try:
             from src.database.connection import async_session
             from src.core.services.prop_service import evaluate_prop_accounts
             async with async_session() as session:
-                await evaluate_prop_accounts(session)
-                print("⚖️ Prop Evaluation Engine ran successfully.")
+                res = await evaluate_prop_accounts(session)
+                print(f"⚖️ Prop Evaluation Engine ran successfully: {res}")
         except Exception as e:
             print(f"🚨 Prop Evaluation Error: {e}")
 
@@ -134,16 +142,113 @@ async def startup_jobs():
             from src.database.connection import async_session
             from src.core.services.prop_service import take_daily_snapshots
             async with async_session() as session:
-                await take_daily_snapshots(session)
-                print("📸 Daily Equity Snapshots taken successfully.")
+                created = await take_daily_snapshots(session)
+                print(f"📸 Daily Equity Snapshots taken successfully: {created}")
         except Exception as e:
             print(f"🚨 Prop Snapshot Error: {e}")
 
-    scheduler.add_job(prop_evaluation_job, "interval", minutes=5)
+    async def prop_counter_verifier_job():
+        """تشخیص drift شمارنده‌های open_trades / open_exposure اکانت‌های پراپ"""
+        try:
+            from src.core.services.prop_service import verify_prop_open_counters
+            async with async_session() as session:
+                drift = await verify_prop_open_counters(session)
+            if drift:
+                await alert_admin(
+                    f"⚠️ Prop open-trade counters drifted on {len(drift)} account(s) (fixed)\n"
+                    + "\n".join(
+                        f"├ {d['prop_account_id']}: trades {d['open_trades']}→{d['actual_trades']}, "
+                        f"exposure {d['open_exposure']}→{d['actual_exposure']}"
+                        for d in drift[:10]
+                    )
+                )
+        except Exception as e:
+            print(f"🚨 Prop counter verifier error: {e}")
+
+    from src.core.services.prop_evaluator import SWEEP_MINUTES, start_prop_evaluator
+    scheduler.add_job(prop_evaluation_job, "interval", minutes=SWEEP_MINUTES)
     scheduler.add_job(prop_daily_snapshot_job, "cron", hour=0, minute=0)
+    scheduler.add_job(prop_counter_verifier_job, "interval", hours=1)
+
+    async def leaderboard_rollover_job():
+        """roll-over لیدربوردهای بازه‌ای: حذف bucket های روزانه / هفتگی قدیمی"""
+        try:
+            from src.core.services.stats_service import prune_period_stats
+            async with async_session() as session:
+                removed = await prune_period_stats(session)
+            print(f"🏆 Leaderboard windows rolled over (pruned {removed} buckets)")
+        except Exception as e:
+            print(f"🚨 Leaderboard rollover error: {e}")
+
+    scheduler.add_job(leaderboard_rollover_job, "cron", hour=0, minute=1)
 
     scheduler.start()
 
+    async def deposit_address_pool_job():
+        """نگه داشتن pool آدرس‌های واریز بالای low-water mark"""
+        try:
+            from src.core.services.deposit_address_service import refill_address_pools
+            async with async_session() as session:
+                added = await refill_address_pools(session)
+            if any(added.values()):
+                print(f"🏦 Deposit address pool refilled: {added}")
+        except Exception as e:
+            print(f"🚨 Deposit address pool error: {e}")
+
+    scheduler.add_job(deposit_address_pool_job, "interval", minutes=1, next_run_time=datetime.now())
+
+    async def price_history_partitions_job():
+        """partition های روزانه market_price_history برای روزهای آینده"""
+        try:
+            from src.core.services.price_history_service import ensure_price_history_partitions
+            async with async_session() as session:
+                await ensure_price_history_partitions(session)
+        except Exception as e:
+            print(f"🚨 Price history partition error: {e}")
+
+    scheduler.add_job(price_history_partitions_job, "cron", hour=0, minute=5, next_run_time=datetime.now())
+
+    # تسویه خودکار بازارهای LOCAL در پایان مهلت اعتراض
+    from src.core.services.market_finalizer import start_market_finalizer
+    start_market_finalizer()
+
+    # ارزیابی رویدادی اکانت‌های پراپ
+    start_prop_evaluator()
+
+    # ایندکس رتبه‌بندی درون‌حافظه‌ای لیدربورد
+    from src.core.services.leaderboard_index import start_leaderboard_index
+    start_leaderboard_index()
+
+    # کش صفحات لیدربورد (invalidation با generation تسویه)
+    from src.core.services.leaderboard_cache import start_leaderboard_cache
+    start_leaderboard_cache()
+
+    # HD account node ها یک بار (خارج از event loop) ساخته می‌شوند
+    try:
+        from src.core.services.deposit_address_service import warm_derivation_cache
+        warmed = await warm_derivation_cache()
+        print(f"🔑 HD derivation cache: {warmed}")
+    except Exception as e:
+        print(f"🚨 HD derivation warmup error: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    """Stop background jobs and close pooled HTTP clients"""
+    from src.core.utils.http_transport import close_transport
+    from src.core.services.market_finalizer import stop_market_finalizer
+    from src.core.services.prop_evaluator import stop_prop_evaluator
+    from src.core.services.leaderboard_index import stop_leaderboard_index
+    from src.core.services.leaderboard_cache import stop_leaderboard_cache
+
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await stop_market_finalizer()
+    await stop_prop_evaluator()
+    await stop_leaderboard_index()
+    await stop_leaderboard_cache()
+    await close_transport()
+
 
 # === Pydantic Models ===
 
@@ -211,6 +316,16 @@ class DepositResponse(BaseModel):
     expected_amount: Optional[float]
     expires_at: Optional[str] = None
 
+class IncomingDepositItem(BaseModel):
+    tx_hash: str
+    asset: Optional[str]
+    network: Optional[str]
+    amount: float
+    status: str
+    block_number: Optional[int]
+    confirmations_required: Optional[int]
+    seen_at: str
+
 class WithdrawalRequest(BaseModel):
     amount: float
     to_address: str
@@ -535,6 +650,8 @@ async def request_deposit(
                 asset="USDT",
                 network=network,
             )
+            # تخصیص آدرس (pool یا fallback) باید پایدار شود
+            await session.commit()
             return DepositResponse(
                 memo=None,
                 to_address=da.address,
@@ -584,6 +701,17 @@ async def get_pending_deposit_endpoint(
             expires_at=pending["expires_at"]
         )
 
+
+@app.get("/api/deposit/incoming", response_model=List[IncomingDepositItem])
+async def get_incoming_deposits_endpoint(
+    user_data: dict = Depends(get_current_user),
+    limit: int = 20,
+):
+    """واریزهای دیده‌شده روی زنجیره که در انتظار تایید هستند"""
+    async with async_session() as session:
+        items = await get_incoming_deposits(session, user_data["id"], limit=min(limit, 100))
+        return [IncomingDepositItem(**item) for item in items]
+
 # === Withdrawal Endpoints ===
 
 @app.post("/api/withdrawal/request", response_model=WithdrawalResponse)
@@ -632,7 +760,8 @@ async def get_withdrawal_history(user_data: dict = Depends(get_current_user), li
                 amount=float(w.amount),
                 to_address=w.to_address,
                 status=w.status.value,
-                tx_hash=w.tx_hash,
+                # برداشت‌های دسته‌ای: tx_hash روی WithdrawalBatch است
+                tx_hash=w.tx_hash or (w.batch.tx_hash if w.batch else None),
                 created_at=w.created_at.isoformat()
             )
             for w in withdrawals
@@ -1,7 +1,8 @@
 import uuid
 from decimal import Decimal
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel
 from sqlalchemy import select, or_
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,10 +10,15 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.connection import async_session
 from src.api.auth import get_current_user
 from src.core.services.local_market_service import get_active_local_markets, place_prediction
+from src.core.services.price_history_service import get_price_history
+from src.core.utils.timeseries import auto_resolution, parse_resolution, resolution_label, to_naive_utc
 from src.database.models import Market, MarketStatus, MarketType, PredictionDirection
 
 router = APIRouter(prefix="/api/markets", tags=["Markets"])
 
+HISTORY_MAX_POINTS = 500
+HISTORY_MAX_RAW_SPAN = timedelta(days=2)
+
 
 async def get_db():
     async with async_session() as session:
@@ -63,6 +69,49 @@ async def get_active_markets(db: AsyncSession = Depends(get_db)):
     ]
 
 
+@router.get("/{market_id}/history")
+async def get_market_history(
+    market_id: uuid.UUID,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    resolution: str = "auto",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    تاریخچه قیمت بازار با downsampling سمت سرور
+    from / to: ISO (UTC)، پیش‌فرض ۲۴ ساعت اخیر؛ resolution: raw | auto | 1m | 5m | 15m | 1h | 4h | 1d
+    """
+    end = to_naive_utc(to) if to else datetime.utcnow()
+    start = to_naive_utc(from_) if from_ else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    try:
+        seconds = parse_resolution(resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if seconds is None:
+        seconds = auto_resolution(start, end, HISTORY_MAX_POINTS)
+    if seconds == 0 and end - start > HISTORY_MAX_RAW_SPAN:
+        raise HTTPException(status_code=400, detail="raw resolution is limited to 2 days")
+
+    points = await get_price_history(db, market_id, start, end, seconds)
+    return {
+        "market_id": str(market_id),
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "resolution": resolution_label(seconds),
+        "points": [
+            {
+                "ts": p["ts"].isoformat(),
+                "yes_price": float(p["yes_price"]) if p["yes_price"] is not None else None,
+                "no_price": float(p["no_price"]) if p["no_price"] is not None else None,
+            }
+            for p in points
+        ],
+    }
+
+
 # ── existing endpoints (kept exactly as they were) ────────────────────────────
 
 @router.get("/local")
@@ -1,6 +1,8 @@
 import uuid
+from datetime import datetime, timedelta
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -9,9 +11,15 @@ from src.database.connection import async_session
 from src.database.models import User, PredictionDirection, PropAccount
 from src.api.auth import get_current_user
 from src.core.services.prop_service import buy_prop_challenge, place_prop_prediction
+from src.core.services.prop_mtm import EMPTY_MARK, mark_to_market
+from src.core.services.prop_equity_service import get_equity_curve
+from src.core.utils.timeseries import parse_resolution, resolution_label, to_naive_utc
 
 router = APIRouter(prefix="/api/prop", tags=["Prop Firm"])
 
+EQUITY_MAX_POINTS = 500
+EQUITY_MAX_RAW_SPAN = timedelta(days=7)
+
 async def get_db():
     async with async_session() as session:
         yield session
@@ -77,6 +85,12 @@ async def api_get_my_prop(db: AsyncSession = Depends(get_db), telegram_user: dic
     if not account:
         return {"has_account": False}
         
+    # اکوئیتی لحظه‌ای (mark-to-market پوزیشن‌های باز)
+    mark = EMPTY_MARK
+    if account.open_trades > 0:
+        mark = (await mark_to_market(db, [account.id])).get(account.id, EMPTY_MARK)
+    equity = account.virtual_balance + mark.market_value
+
     return {
         "has_account": True,
         "account": {
@@ -84,6 +98,10 @@ async def api_get_my_prop(db: AsyncSession = Depends(get_db), telegram_user: dic
             "phase": account.phase,
             "status": account.status,
             "virtual_balance": float(account.virtual_balance),
+            "equity": float(equity),
+            "open_exposure": float(mark.open_exposure),
+            "unrealized_pnl": float(mark.unrealized_pnl),
+            "open_positions": mark.positions,
             "starting_balance": float(account.starting_balance),
             "peak_balance": float(account.peak_balance),
             "target_profit_pct": float(account.target_profit_pct),
@@ -95,6 +113,48 @@ async def api_get_my_prop(db: AsyncSession = Depends(get_db), telegram_user: dic
     }
 
 
+@router.get("/{prop_account_id}/equity")
+async def api_get_prop_equity(
+    prop_account_id: uuid.UUID,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    resolution: str = "auto",
+    max_points: int = Query(EQUITY_MAX_POINTS, ge=10, le=2000),
+    db: AsyncSession = Depends(get_db),
+    telegram_user: dict = Depends(get_current_user),
+):
+    """
+    منحنی اکوئیتی اکانت پراپ کاربر با downsampling سمت سرور
+    from / to: ISO (UTC)، پیش‌فرض از شروع اکانت تا الان
+    resolution: auto (LTTB تا max_points نقطه) | raw | 1m | 5m | 15m | 1h | 4h | 1d
+    """
+    db_user = await get_db_user(db, telegram_user)
+    account = await db.get(PropAccount, prop_account_id)
+    if not account or account.user_id != db_user.id:
+        raise HTTPException(status_code=404, detail="Prop account not found")
+
+    end = to_naive_utc(to) if to else datetime.utcnow()
+    start = to_naive_utc(from_) if from_ else account.started_at
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    try:
+        seconds = parse_resolution(resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if seconds == 0 and end - start > EQUITY_MAX_RAW_SPAN:
+        raise HTTPException(status_code=400, detail="raw resolution is limited to 7 days")
+
+    points = await get_equity_curve(db, prop_account_id, start, end, seconds, max_points)
+    return {
+        "prop_account_id": str(prop_account_id),
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "resolution": "lttb" if seconds is None else resolution_label(seconds),
+        "points": [{"ts": p["ts"].isoformat(), "equity": float(p["equity"])} for p in points],
+    }
+
+
 from src.database.models import PropAccount, PropPhase, PropStatus
 
 @router.post("/demo")
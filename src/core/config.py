@@ -142,3 +142,24 @@ EVM_CONFIRMATIONS = {
     "ERC20": int(os.getenv("ERC20_CONFIRMATIONS", "12")),
     "BEP20": int(os.getenv("BEP20_CONFIRMATIONS", "5")),
 }
+
+# عمق تایید واریزهای address-based (برای نمایش وضعیت PENDING به کاربر)
+DEPOSIT_CONFIRMATIONS = {
+    "TRC20": int(os.getenv("TRON_OBSERVER_CONFIRMATIONS", "20")),
+    **EVM_CONFIRMATIONS,
+}
+
+
+def env_list(name: str, default: str = "") -> list[str]:
+    """comma-separated env → list (برای fallback URL ها)"""
+    raw = os.getenv(name)
+    if raw is None:
+        raw = default
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+# EVM RPC fallbacks (opt-in از env؛ به ترتیب latency مشاهده‌شده استفاده می‌شوند)
+EVM_RPC_FALLBACK_URLS = {
+    "ERC20": env_list("ERC20_RPC_FALLBACK_URLS"),
+    "BEP20": env_list("BEP20_RPC_FALLBACK_URLS"),
+}
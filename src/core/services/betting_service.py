@@ -17,7 +17,7 @@ from src.database.models import (
 )
 from src.core.config import get_settings
 
-from src.core.services.stats_service import apply_bet_result
+from src.core.services.stats_service import apply_bet_result, bump_leaderboard_generation
 
 settings = get_settings()
 
@@ -327,6 +327,10 @@ async def settle_round(
         round_obj.settle_price = settle_price
         round_obj.settled_at = datetime.utcnow()
 
+        # ۹. invalidation کش لیدربورد (یک بار برای کل راند)
+        if winners_count or losers_count:
+            await bump_leaderboard_generation(session)
+
     return {
         "status": "settled",
         "round_status": new_status.value,
@@ -397,6 +401,9 @@ async def _refund_all_bets(session: AsyncSession, round_obj: Round, bets: list)
     round_obj.house_fee = Decimal("0")
     round_obj.settled_at = datetime.utcnow()
 
+    if refunded_count:
+        await bump_leaderboard_generation(session)
+
     return {
         "status": "refunded",
         "round_status": RoundStatus.VOID.value,
@@ -2,12 +2,23 @@
 Deposit Address Service (Exchange-style)
 - Per-user deposit address for (asset, network)
 - TRON HD wallet derivation for TRC20 deposits
+- Address pool: آدرس‌های pre-derived بدون مالک (user_id IS NULL)
+  تخصیص با یک UPDATE ... FOR UPDATE SKIP LOCKED (بدون lock سراسری)؛
+  filler پس‌زمینه pool را بالای low-water mark نگه می‌دارد
 """
 
+import asyncio
+import hashlib
+import os
+import threading
 import uuid
 import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import select, text, func
+from sqlalchemy import select, text, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bip_utils import Bip39SeedGenerator, Bip44, Bip44Coins, Bip44Changes
@@ -36,30 +47,62 @@ def _advisory_keys(asset: str, network: str) -> tuple[int, int]:
     return a, n
 
 
+# network → (coin, settings attr, env name)
+_DERIVATION_COINS = {
+    "TRC20": (Bip44Coins.TRON, "tron_mnemonic", "TRON_MNEMONIC"),
+    "ERC20": (Bip44Coins.ETHEREUM, "evm_mnemonic", "EVM_MNEMONIC"),
+    "BEP20": (Bip44Coins.ETHEREUM, "evm_mnemonic", "EVM_MNEMONIC"),
+}
+
+# (coin, mnemonic fingerprint) → node در سطح m/44'/coin'/0'/0
+# PBKDF2 (2048 دور) + مسیر BIP44 از master فقط یک بار در هر process انجام می‌شود
+_change_nodes: Dict[Tuple[Bip44Coins, str], Bip44] = {}
+_change_nodes_lock = threading.Lock()
+
+
+def _change_node(network: str) -> Bip44:
+    """node حساب 0 / زنجیره‌ی خارجی برای شبکه (cached)"""
+    entry = _DERIVATION_COINS.get(network)
+    if entry is None:
+        raise DepositAddressError(f"Unsupported network for address derivation: {network}")
+    coin, attr, env_name = entry
+
+    mn = (getattr(settings, attr) or "").strip()
+    if not mn:
+        raise DepositAddressError(f"{env_name} is not set")
+
+    key = (coin, hashlib.sha256(mn.encode("utf-8")).hexdigest())
+    node = _change_nodes.get(key)
+    if node is not None:
+        return node
+
+    with _change_nodes_lock:
+        node = _change_nodes.get(key)
+        if node is not None:
+            return node
+
+        wc = len(mn.split())
+        if wc not in (12, 24):
+            raise DepositAddressError(f"Invalid {env_name} word count: {wc}")
+
+        seed_bytes = Bip39SeedGenerator(mn).Generate()
+        node = (
+            Bip44
+            .FromSeed(seed_bytes, coin)
+            .Purpose()
+            .Coin()
+            .Account(0)
+            .Change(Bip44Changes.CHAIN_EXT)
+        )
+        _change_nodes[key] = node
+        return node
+
+
 def _derive_tron_address(derivation_index: int) -> str:
     """
     TRON derivation path: m/44'/195'/0'/0/{index}
     """
-    mn = (settings.tron_mnemonic or "").strip()
-    if not mn:
-        raise DepositAddressError("TRON_MNEMONIC is not set")
-
-    wc = len(mn.split())
-    if wc not in (12, 24):
-        raise DepositAddressError(f"Invalid TRON_MNEMONIC word count: {wc}")
-
-    seed_bytes = Bip39SeedGenerator(mn).Generate()
-
-    ctx = (
-        Bip44
-        .FromSeed(seed_bytes, Bip44Coins.TRON)
-        .Purpose()
-        .Coin()
-        .Account(0)
-        .Change(Bip44Changes.CHAIN_EXT)
-        .AddressIndex(int(derivation_index))
-    )
-    return ctx.PublicKey().ToAddress()
+    return _change_node("TRC20").AddressIndex(int(derivation_index)).PublicKey().ToAddress()
 
 
 def _derive_evm_address(derivation_index: int) -> str:
@@ -67,26 +110,37 @@ def _derive_evm_address(derivation_index: int) -> str:
     EVM derivation path: m/44'/60'/0'/0/{index}
     Same address works for both ERC20 (Ethereum) and BEP20 (BSC).
     """
-    mn = (settings.evm_mnemonic or "").strip()
-    if not mn:
-        raise DepositAddressError("EVM_MNEMONIC is not set")
-
-    wc = len(mn.split())
-    if wc not in (12, 24):
-        raise DepositAddressError(f"Invalid EVM_MNEMONIC word count: {wc}")
-
-    seed_bytes = Bip39SeedGenerator(mn).Generate()
-
-    ctx = (
-        Bip44
-        .FromSeed(seed_bytes, Bip44Coins.ETHEREUM)
-        .Purpose()
-        .Coin()
-        .Account(0)
-        .Change(Bip44Changes.CHAIN_EXT)
-        .AddressIndex(int(derivation_index))
-    )
-    return ctx.PublicKey().ToAddress()
+    return _change_node("ERC20").AddressIndex(int(derivation_index)).PublicKey().ToAddress()
+
+
+def _derive_range_sync(network: str, start: int, count: int) -> List[str]:
+    node = _change_node(network)
+    return [
+        node.AddressIndex(i).PublicKey().ToAddress()
+        for i in range(int(start), int(start) + int(count))
+    ]
+
+
+async def derive_range(network: str, start: int, count: int) -> List[str]:
+    """
+    آدرس‌های ایندکس start .. start+count-1 (در worker thread؛ event loop بلاک نمی‌شود)
+    """
+    network = network.strip().upper()
+    if count <= 0:
+        return []
+    return await asyncio.to_thread(_derive_range_sync, network, start, count)
+
+
+async def warm_derivation_cache() -> List[str]:
+    """ساخت node های cached در startup (خروجی: شبکه‌هایی که mnemonic دارند)"""
+    warmed = []
+    for network in _DERIVATION_COINS:
+        try:
+            await asyncio.to_thread(_change_node, network)
+            warmed.append(network)
+        except DepositAddressError:
+            continue
+    return warmed
 
 
 async def _locked_get_or_create(
@@ -95,6 +149,10 @@ async def _locked_get_or_create(
     asset: str,
     network: str,
 ) -> DepositAddress:
+    """
+    fallback وقتی pool خالی است (یا filler هنوز اجرا نشده):
+    advisory lock روی (asset, network) + max(derivation_index)+1
+    """
     k1, k2 = _advisory_keys(asset, network)
     await session.execute(
         text("SELECT pg_advisory_xact_lock(:k1, :k2)"),
@@ -122,13 +180,8 @@ async def _locked_get_or_create(
     )
     next_index = int(res.scalar_one())
 
-    # Route to correct derivation function based on network
-    if network == "TRC20":
-        address = _derive_tron_address(next_index)
-    elif network in ("ERC20", "BEP20"):
-        address = _derive_evm_address(next_index)
-    else:
-        raise DepositAddressError(f"Unsupported network for address derivation: {network}")
+    # cached account node + worker thread (lock فقط برای چند میکروثانیه نگه داشته می‌شود)
+    address = (await derive_range(network, next_index, 1))[0]
 
     row = DepositAddress(
         id=uuid.uuid4(),
@@ -137,12 +190,65 @@ async def _locked_get_or_create(
         network=network,
         address=address,
         derivation_index=next_index,
+        assigned_at=datetime.utcnow(),
     )
     session.add(row)
     await session.flush()
     return row
 
 
+async def _claim_pooled_address(
+    session: AsyncSession,
+    user: User,
+    asset: str,
+    network: str,
+) -> Optional[DepositAddress]:
+    """
+    تخصیص کوچک‌ترین آدرس آزاد pool به کاربر
+
+    UPDATE deposit_addresses SET user_id = :uid
+    WHERE id = (SELECT id ... WHERE user_id IS NULL ORDER BY derivation_index
+                LIMIT 1 FOR UPDATE SKIP LOCKED)
+    RETURNING *
+
+    درخواست‌های همزمان ردیف‌های قفل‌شده را رد می‌کنند و هرکدام آدرس متفاوتی می‌گیرند.
+    """
+    free_id = (
+        select(DepositAddress.id)
+        .where(
+            DepositAddress.asset == asset,
+            DepositAddress.network == network,
+            DepositAddress.user_id.is_(None),
+        )
+        .order_by(DepositAddress.derivation_index)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(DepositAddress)
+        .where(DepositAddress.id == free_id)
+        .values(user_id=user.id, assigned_at=datetime.utcnow())
+        .returning(DepositAddress)
+        .execution_options(synchronize_session=False)
+    )
+
+    try:
+        async with session.begin_nested():
+            res = await session.execute(stmt)
+            return res.scalar_one_or_none()
+    except IntegrityError:
+        # همین کاربر همزمان (در درخواست دیگری) آدرس گرفته است
+        res = await session.execute(
+            select(DepositAddress).where(
+                DepositAddress.user_id == user.id,
+                DepositAddress.asset == asset,
+                DepositAddress.network == network,
+            )
+        )
+        return res.scalar_one_or_none()
+
+
 async def get_or_create_deposit_address(
     session: AsyncSession,
     telegram_id: int,
@@ -152,6 +258,9 @@ async def get_or_create_deposit_address(
     asset = asset.strip().upper()
     network = network.strip().upper()
 
+    # اگر caller تراکنش باز ندارد، commit با همین تابع است
+    owns_transaction = not session.in_transaction()
+
     res = await session.execute(
         select(User).where(User.telegram_id == telegram_id)
     )
@@ -171,9 +280,114 @@ async def get_or_create_deposit_address(
     if existing:
         return existing
 
-    # Transaction-safe creation
-    if session.in_transaction():
-        return await _locked_get_or_create(session, user, asset, network)
+    # Pool path (constant-time, no global lock)
+    row = await _claim_pooled_address(session, user, asset, network)
+
+    # Transaction-safe creation (fallback)
+    if row is None:
+        row = await _locked_get_or_create(session, user, asset, network)
+
+    if owns_transaction:
+        await session.commit()
+    return row
+
+
+# ---------------------------------------------------------------------------
+# Pool filler
+# ---------------------------------------------------------------------------
+
+POOL_NETWORKS = (("USDT", "TRC20"), ("USDT", "ERC20"), ("USDT", "BEP20"))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+async def fill_address_pool(
+    session: AsyncSession,
+    asset: str,
+    network: str,
+    low_water: Optional[int] = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """
+    اگر تعداد آدرس‌های آزاد کمتر از low_water باشد، batch_size آدرس جدید derive و درج می‌کند
+
+    advisory lock فقط اینجا (و در fallback) گرفته می‌شود؛ مسیر تخصیص به آن نیازی ندارد.
+    خروجی: تعداد آدرس‌های اضافه‌شده
+    """
+    asset = asset.strip().upper()
+    network = network.strip().upper()
+    low_water = low_water if low_water is not None else _env_int("DEPOSIT_ADDRESS_POOL_LOW_WATER", 200)
+    batch_size = batch_size if batch_size is not None else _env_int("DEPOSIT_ADDRESS_POOL_BATCH", 500)
+
+    free = (
+        await session.execute(
+            select(func.count(DepositAddress.id)).where(
+                DepositAddress.asset == asset,
+                DepositAddress.network == network,
+                DepositAddress.user_id.is_(None),
+            )
+        )
+    ).scalar_one()
+    if free >= low_water:
+        await session.rollback()
+        return 0
+
+    k1, k2 = _advisory_keys(asset, network)
+    locked = (
+        await session.execute(
+            text("SELECT pg_try_advisory_xact_lock(:k1, :k2)"),
+            {"k1": k1, "k2": k2},
+        )
+    ).scalar_one()
+    if not locked:
+        # filler دیگری (یا fallback) در حال کار است
+        await session.rollback()
+        return 0
+
+    next_index = int(
+        (
+            await session.execute(
+                select(func.coalesce(func.max(DepositAddress.derivation_index), -1) + 1).where(
+                    DepositAddress.asset == asset,
+                    DepositAddress.network == network,
+                )
+            )
+        ).scalar_one()
+    )
 
-    async with session.begin():
-        return await _locked_get_or_create(session, user, asset, network)
+    addresses = await derive_range(network, next_index, batch_size)
+
+    stmt = pg_insert(DepositAddress).values([
+        {
+            "id": uuid.uuid4(),
+            "user_id": None,
+            "asset": asset,
+            "network": network,
+            "address": address,
+            "derivation_index": next_index + i,
+        }
+        for i, address in enumerate(addresses)
+    ]).on_conflict_do_nothing(
+        constraint="uq_deposit_addresses_asset_network_derivation_index",
+    ).returning(DepositAddress.id)
+
+    inserted = len((await session.execute(stmt)).all())
+    await session.commit()
+    return inserted
+
+
+async def refill_address_pools(session: AsyncSession) -> Dict[str, int]:
+    """اجرای filler برای همه‌ی شبکه‌هایی که mnemonic دارند"""
+    out: Dict[str, int] = {}
+    for asset, network in POOL_NETWORKS:
+        try:
+            out[f"{asset}/{network}"] = await fill_address_pool(session, asset, network)
+        except DepositAddressError:
+            await session.rollback()
+            continue
+    return out
@@ -0,0 +1,646 @@
+"""
+Batch Deposit Crediting
+ثبت دسته‌ای واریزها - یک commit برای هر بلاک / دسته
+
+ورودی: لیست transfer های normalize شده (خروجی provider ها):
+  - hash: str
+  - amount: Decimal
+  - to_address: str   (address-based: TRC20 / ERC20 / BEP20)
+  - memo: str         (memo-based: TON)
+  - from_address, timestamp (اختیاری)
+
+Idempotency روی tx_hash:
+  1) pre-filter هش‌های دیده‌شده با یک کوئری WHERE tx_hash = ANY(...)
+  2) INSERT INTO transactions ... ON CONFLICT (tx_hash) DO NOTHING RETURNING tx_hash
+     فقط هش‌هایی که واقعاً درج شدند credit می‌شوند (race-safe بین چند observer)
+
+واریزهای address-based دو مرحله‌ای هستند:
+  - record_pending_address_deposits: نزدیک head، ردیف PENDING با block_number/block_hash (بدون تغییر موجودی)
+  - credit_address_deposits_batch: در عمق تایید، PENDING → CONFIRMED + credit؛
+    PENDING هایی که در بازه‌ی اسکن‌شده در زنجیره‌ی canonical دیده نشدند FAILED می‌شوند (reorg)
+"""
+
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import String, and_, any_, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import (
+    Balance, DepositAddress, DepositRequest, Ledger, LedgerEventType,
+    Transaction, TransactionStatus, TransactionType,
+)
+from src.core.config import get_settings
+
+settings = get_settings()
+
+AMOUNT_TOLERANCE = Decimal("0.01")
+
+# شبکه‌های EVM: آدرس hex بدون حساسیت به حروف (checksum)؛ بقیه (TRON base58) دقیق
+EVM_NETWORKS = ("ERC20", "BEP20")
+
+
+@dataclass
+class PendingCredit:
+    """یک واریز معتبر که آماده‌ی ثبت است"""
+    tx_hash: str
+    user_id: uuid.UUID
+    amount: Decimal
+    asset: str
+    network: str
+    idempotency_key: str
+    description: str
+    memo: Optional[str] = None
+    deposit_request_id: Optional[uuid.UUID] = None
+    block_number: Optional[int] = None
+    block_hash: Optional[str] = None
+
+
+def _any_of(values: Iterable[str]):
+    """WHERE col = ANY(:array) - یک bind parameter به جای N پارامتر"""
+    return any_(literal(list(values), ARRAY(String)))
+
+
+def _address_key(address: str, network: str) -> str:
+    address = (address or "").strip()
+    return address.lower() if network in EVM_NETWORKS else address
+
+
+def _dedupe_by_hash(transfers: List[Dict[str, Any]]) -> "OrderedDict[str, Dict[str, Any]]":
+    out: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    for tx in transfers:
+        h = str(tx.get("hash") or "").strip()
+        if h and h not in out:
+            out[h] = tx
+    return out
+
+
+def _describe(amount: Decimal, asset: str, network: str, tx: Dict[str, Any]) -> str:
+    desc = f"واریز {amount} {asset} ({network})"
+    from_address = tx.get("from_address")
+    if from_address:
+        desc += f" from {from_address[:10]}..."
+    timestamp_ms = tx.get("timestamp")
+    if timestamp_ms and network != "TON":
+        try:
+            dt = datetime.utcfromtimestamp(int(timestamp_ms) / 1000)
+            desc += f" @ {dt.isoformat()}Z"
+        except Exception:
+            pass
+    return desc
+
+
+async def _seen_tx_hashes(session: AsyncSession, hashes: List[str]) -> set:
+    if not hashes:
+        return set()
+    r = await session.execute(
+        select(Transaction.tx_hash).where(Transaction.tx_hash == _any_of(hashes))
+    )
+    return {row[0] for row in r.all()}
+
+
+# وضعیت‌هایی که هنوز credit نشده‌اند و می‌توانند (دوباره) PENDING یا CONFIRMED شوند
+_OPEN_DEPOSIT_STATUSES = (TransactionStatus.PENDING, TransactionStatus.FAILED)
+
+
+async def _tx_states(session: AsyncSession, hashes: List[str]) -> Dict[str, Tuple[TransactionStatus, Optional[str]]]:
+    """tx_hash → (status, block_hash) برای هش‌های موجود"""
+    if not hashes:
+        return {}
+    r = await session.execute(
+        select(Transaction.tx_hash, Transaction.status, Transaction.block_hash)
+        .where(Transaction.tx_hash == _any_of(hashes))
+    )
+    return {h: (st, bh) for h, st, bh in r.all()}
+
+
+async def _claim_transactions(
+    session: AsyncSession,
+    credits: List[PendingCredit],
+    status: TransactionStatus = TransactionStatus.CONFIRMED,
+    upsert: bool = False,
+) -> set:
+    """
+    درج دسته‌ای Transaction ها؛ خروجی = هش‌هایی که توسط همین دسته درج شدند
+
+    upsert=True: ردیف DEPOSIT موجود با وضعیت PENDING/FAILED هم به‌روزرسانی (و در خروجی) می‌شود
+    - status=PENDING: بلاک جدید پس از reorg / re-include
+    - status=CONFIRMED: ارتقای واریز pending در عمق تایید
+    ردیف‌های CONFIRMED هیچ‌وقت دوباره claim نمی‌شوند.
+    """
+    if not credits:
+        return set()
+
+    now = datetime.utcnow()
+    stmt = pg_insert(Transaction).values([
+        {
+            "id": uuid.uuid4(),
+            "user_id": c.user_id,
+            "type": TransactionType.DEPOSIT,
+            "amount": c.amount,
+            "status": status,
+            "tx_hash": c.tx_hash,
+            "memo": c.memo,
+            "asset": c.asset,
+            "network": c.network,
+            "block_number": c.block_number,
+            "block_hash": c.block_hash,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for c in credits
+    ])
+    if upsert:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["tx_hash"],
+            set_={
+                "user_id": stmt.excluded.user_id,
+                "amount": stmt.excluded.amount,
+                "status": stmt.excluded.status,
+                "block_number": stmt.excluded.block_number,
+                "block_hash": stmt.excluded.block_hash,
+                "updated_at": now,
+            },
+            where=and_(
+                Transaction.type == TransactionType.DEPOSIT,
+                Transaction.status.in_(_OPEN_DEPOSIT_STATUSES),
+            ),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=["tx_hash"])
+    r = await session.execute(stmt.returning(Transaction.tx_hash))
+    return {row[0] for row in r.all()}
+
+
+async def _drop_stale_pending(
+    session: AsyncSession,
+    asset: str,
+    network: str,
+    through_block: int,
+    from_block: Optional[int] = None,
+    addresses: Optional[Iterable[str]] = None,
+) -> List[str]:
+    """
+    واریزهای PENDING در بازه‌ی اسکن‌شده [from_block, through_block] که در اسکن canonical
+    همین دسته CONFIRMED نشدند (block_hash عوض شده / تراکنش از زنجیره حذف شده) → FAILED
+
+    addresses: اگر اسکن فقط برای این آدرس‌ها بوده، PENDING کاربران دیگر دست نمی‌خورد.
+    اگر تراکنش بعداً در بلاک دیگری ظاهر شود، upsert دوباره PENDING/CONFIRMED اش می‌کند.
+    """
+    stmt = update(Transaction).where(
+        Transaction.type == TransactionType.DEPOSIT,
+        Transaction.status == TransactionStatus.PENDING,
+        Transaction.asset == asset,
+        Transaction.network == network,
+        Transaction.block_number <= int(through_block),
+    )
+    if from_block is not None:
+        stmt = stmt.where(Transaction.block_number >= int(from_block))
+    if addresses is not None:
+        stmt = stmt.where(Transaction.user_id.in_(
+            select(DepositAddress.user_id).where(
+                DepositAddress.asset == asset,
+                DepositAddress.network == network,
+                DepositAddress.address == _any_of(set(addresses)),
+            )
+        ))
+
+    r = await session.execute(
+        stmt
+        .values(status=TransactionStatus.FAILED, updated_at=datetime.utcnow())
+        .returning(Transaction.tx_hash)
+        .execution_options(synchronize_session=False)
+    )
+    return [row[0] for row in r.all()]
+
+
+async def _apply_balance_credits(
+    session: AsyncSession,
+    credits: List[PendingCredit],
+) -> None:
+    """
+    upsert موجودی‌ها با ON CONFLICT + درج دسته‌ای Ledger
+
+    برای هر (user, asset, network) مجموع واریزها یک‌جا اضافه می‌شود؛
+    available_before/after هر ردیف Ledger از موجودی نهایی به عقب محاسبه می‌شود.
+    """
+    if not credits:
+        return
+
+    totals: Dict[Tuple[uuid.UUID, str, str], Decimal] = {}
+    for c in credits:
+        key = (c.user_id, c.asset, c.network)
+        totals[key] = totals.get(key, Decimal("0")) + c.amount
+
+    # ترتیب ثابت برای جلوگیری از Deadlock بین دو دسته‌ی همزمان
+    keys = sorted(totals.keys(), key=lambda k: (str(k[0]), k[1], k[2]))
+
+    now = datetime.utcnow()
+    stmt = pg_insert(Balance).values([
+        {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "available": totals[(user_id, asset, network)],
+            "locked": Decimal("0"),
+            "currency": asset,
+            "asset": asset,
+            "network": network,
+            "updated_at": now,
+        }
+        for (user_id, asset, network) in keys
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_balances_user_asset_network",
+        set_={
+            "available": Balance.available + stmt.excluded.available,
+            "updated_at": now,
+        },
+    ).returning(
+        Balance.user_id, Balance.asset, Balance.network,
+        Balance.available, Balance.locked,
+    )
+    r = await session.execute(stmt)
+
+    running: Dict[Tuple[uuid.UUID, str, str], Decimal] = {}
+    locked: Dict[Tuple[uuid.UUID, str, str], Decimal] = {}
+    for row in r.all():
+        key = (row.user_id, row.asset, row.network)
+        running[key] = Decimal(row.available) - totals[key]
+        locked[key] = Decimal(row.locked or 0)
+
+    ledger_rows = []
+    for c in credits:
+        key = (c.user_id, c.asset, c.network)
+        before = running[key]
+        after = before + c.amount
+        running[key] = after
+        ledger_rows.append({
+            "id": uuid.uuid4(),
+            "user_id": c.user_id,
+            "event_type": LedgerEventType.DEPOSIT,
+            "amount": c.amount,
+            "currency": c.asset,
+            "asset": c.asset,
+            "network": c.network,
+            "available_before": before,
+            "available_after": after,
+            "locked_before": locked[key],
+            "locked_after": locked[key],
+            "description": c.description,
+            "idempotency_key": c.idempotency_key,
+            "created_at": now,
+        })
+
+    await session.execute(
+        pg_insert(Ledger).values(ledger_rows).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    )
+
+
+async def _commit_credits(
+    session: AsyncSession,
+    credits: List[PendingCredit],
+    results: "OrderedDict[str, Dict[str, Any]]",
+    *,
+    upsert: bool = False,
+    finalize: Optional[Tuple[str, str, int, Optional[int], Optional[Iterable[str]]]] = None,
+) -> int:
+    """
+    claim + balance + ledger + یک commit؛ خروجی = تعداد واریزهای ثبت‌شده
+
+    finalize=(asset, network, through_block, from_block, addresses): رها کردن PENDING های reorg شده در همین commit
+    """
+    if not credits and finalize is None:
+        return 0
+
+    dropped: List[str] = []
+    try:
+        claimed = await _claim_transactions(session, credits, upsert=upsert)
+        fresh = [c for c in credits if c.tx_hash in claimed]
+
+        await _apply_balance_credits(session, fresh)
+
+        request_ids = [c.deposit_request_id for c in fresh if c.deposit_request_id]
+        if request_ids:
+            await session.execute(
+                update(DepositRequest)
+                .where(DepositRequest.id.in_(request_ids))
+                .values(status=TransactionStatus.CONFIRMED)
+                .execution_options(synchronize_session=False)
+            )
+
+        if finalize is not None:
+            dropped = await _drop_stale_pending(session, *finalize)
+
+        await session.commit()
+
+    except IntegrityError:
+        await session.rollback()
+        for c in credits:
+            results[c.tx_hash] = {"status": "error", "reason": "batch_integrity_error", "hash": c.tx_hash}
+        return 0
+
+    for h in dropped:
+        results[h] = {"status": "dropped", "reason": "reorged_out", "hash": h}
+
+    for c in credits:
+        if c.tx_hash in claimed:
+            results[c.tx_hash] = {
+                "status": "credited",
+                "hash": c.tx_hash,
+                "amount": float(c.amount),
+                "user_id": str(c.user_id),
+            }
+        else:
+            results[c.tx_hash] = {"status": "ignored", "reason": "race_duplicate", "hash": c.tx_hash}
+
+    return len(fresh)
+
+
+def _summary(results: "OrderedDict[str, Dict[str, Any]]", credited: int) -> dict:
+    return {
+        "processed": len(results),
+        "credited": credited,
+        "results": list(results.values()),
+    }
+
+
+async def pending_deposit_blocks(
+    session: AsyncSession,
+    asset: str,
+    network: str,
+    through_block: int,
+) -> set:
+    """شماره بلاک‌هایی (تا through_block) که واریز PENDING دارند"""
+    r = await session.execute(
+        select(Transaction.block_number).distinct().where(
+            Transaction.type == TransactionType.DEPOSIT,
+            Transaction.status == TransactionStatus.PENDING,
+            Transaction.asset == asset,
+            Transaction.network == network,
+            Transaction.block_number <= int(through_block),
+        )
+    )
+    return {int(row[0]) for row in r.all() if row[0] is not None}
+
+
+async def _resolve_address_credits(
+    session: AsyncSession,
+    by_hash: "OrderedDict[str, Dict[str, Any]]",
+    skip: Dict[str, str],
+    results: "OrderedDict[str, Dict[str, Any]]",
+    asset: str,
+    network: str,
+) -> List[PendingCredit]:
+    """
+    اعتبارسنجی + پیدا کردن مالک هر transfer (یک کوئری)
+
+    skip: tx_hash → reason برای هش‌هایی که نباید دوباره پردازش شوند
+    """
+    candidates: List[Tuple[str, Dict[str, Any], Decimal, str]] = []
+    for h, tx in by_hash.items():
+        if h in skip:
+            results[h] = {"status": "ignored", "reason": skip[h], "hash": h}
+            continue
+        to_address = (tx.get("to_address") or "").strip()
+        amount = tx.get("amount")
+        if not to_address:
+            results[h] = {"status": "ignored", "reason": "missing_to_address", "hash": h}
+            continue
+        if amount is None or Decimal(amount) <= 0:
+            results[h] = {"status": "ignored", "reason": "invalid_amount", "hash": h}
+            continue
+        candidates.append((h, tx, Decimal(amount), _address_key(to_address, network)))
+
+    owners: Dict[str, uuid.UUID] = {}
+    if candidates:
+        # TRC20: index (asset, network, address)؛ EVM: index (asset, network, lower(address))
+        stored = func.lower(DepositAddress.address) if network in EVM_NETWORKS else DepositAddress.address
+        r = await session.execute(
+            select(stored, DepositAddress.user_id).where(
+                DepositAddress.asset == asset,
+                DepositAddress.network == network,
+                DepositAddress.user_id.is_not(None),
+                stored == _any_of({c[3] for c in candidates}),
+            )
+        )
+        owners = {addr: user_id for addr, user_id in r.all()}
+
+    credits: List[PendingCredit] = []
+    for h, tx, amount, addr in candidates:
+        user_id = owners.get(addr)
+        if not user_id:
+            results[h] = {"status": "ignored", "reason": "address_not_managed", "hash": h}
+            continue
+        block_number = tx.get("block_number")
+        results[h] = {"status": "pending", "hash": h}
+        credits.append(PendingCredit(
+            tx_hash=h,
+            user_id=user_id,
+            amount=amount,
+            asset=asset,
+            network=network,
+            idempotency_key=f"DEPOSIT:{network}:{h}",
+            description=_describe(amount, asset, network, tx),
+            block_number=int(block_number) if block_number is not None else None,
+            block_hash=tx.get("block_hash"),
+        ))
+    return credits
+
+
+async def record_pending_address_deposits(
+    session: AsyncSession,
+    transfers: List[Dict[str, Any]],
+    *,
+    asset: str = "USDT",
+    network: str = "TRC20",
+) -> dict:
+    """
+    فاز ۱: ثبت transfer های تاییدنشده (نزدیک head) به صورت Transaction با وضعیت PENDING
+
+    موجودی تغییر نمی‌کند؛ کاربر واریز را فوراً در /api/deposit/incoming می‌بیند.
+    transfer ها باید block_number و block_hash داشته باشند.
+    """
+    asset = (asset or "USDT").strip().upper()
+    network = (network or "TRC20").strip().upper()
+
+    by_hash = _dedupe_by_hash(transfers)
+    results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    if not by_hash:
+        return _summary(results, 0)
+
+    skip: Dict[str, str] = {}
+    for h, (status, block_hash) in (await _tx_states(session, list(by_hash.keys()))).items():
+        if status not in _OPEN_DEPOSIT_STATUSES:
+            skip[h] = "tx_already_seen"
+        elif status == TransactionStatus.PENDING and block_hash == by_hash[h].get("block_hash"):
+            skip[h] = "already_pending"
+
+    credits = await _resolve_address_credits(session, by_hash, skip, results, asset, network)
+    if not credits:
+        return _summary(results, 0)
+
+    try:
+        recorded = await _claim_transactions(session, credits, status=TransactionStatus.PENDING, upsert=True)
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        for c in credits:
+            results[c.tx_hash] = {"status": "error", "reason": "batch_integrity_error", "hash": c.tx_hash}
+        return _summary(results, 0)
+
+    for c in credits:
+        if c.tx_hash in recorded:
+            results[c.tx_hash] = {
+                "status": "pending",
+                "hash": c.tx_hash,
+                "amount": float(c.amount),
+                "user_id": str(c.user_id),
+                "block_number": c.block_number,
+            }
+        else:
+            results[c.tx_hash] = {"status": "ignored", "reason": "race_duplicate", "hash": c.tx_hash}
+
+    summary = _summary(results, 0)
+    summary["pending"] = len(recorded)
+    return summary
+
+
+async def credit_address_deposits_batch(
+    session: AsyncSession,
+    transfers: List[Dict[str, Any]],
+    *,
+    asset: str = "USDT",
+    network: str = "TRC20",
+    finalized_through: Optional[int] = None,
+    finalized_from: Optional[int] = None,
+    scanned_addresses: Optional[Iterable[str]] = None,
+) -> dict:
+    """
+    معادل دسته‌ای credit_trc20_deposit_by_address
+    (شناسایی کاربر با deposit_addresses.address)
+
+    فاز ۲: transfer ها باید در عمق تایید باشند؛ ردیف PENDING همان tx به CONFIRMED ارتقا می‌یابد.
+    finalized_from / finalized_through: بازه‌ی بلاکی که برای scanned_addresses (None = همه) کامل
+    اسکن شده؛ فقط PENDING های باقی‌مانده‌ی همین بازه / آدرس‌ها رها می‌شوند.
+    """
+    asset = (asset or "USDT").strip().upper()
+    network = (network or "TRC20").strip().upper()
+
+    by_hash = _dedupe_by_hash(transfers)
+    results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    if not by_hash and finalized_through is None:
+        return _summary(results, 0)
+
+    # 1) tx idempotency (یک کوئری برای کل دسته)
+    skip = {
+        h: "tx_already_seen"
+        for h, (status, _) in (await _tx_states(session, list(by_hash.keys()))).items()
+        if status not in _OPEN_DEPOSIT_STATUSES
+    }
+
+    # 2) owners (یک کوئری)
+    credits = await _resolve_address_credits(session, by_hash, skip, results, asset, network)
+
+    # 3) balance + Transaction + Ledger در یک commit
+    credited = await _commit_credits(
+        session,
+        credits,
+        results,
+        upsert=True,
+        finalize=(
+            (asset, network, finalized_through, finalized_from, scanned_addresses)
+            if finalized_through is not None else None
+        ),
+    )
+    return _summary(results, credited)
+
+
+async def credit_memo_deposits_batch(
+    session: AsyncSession,
+    transfers: List[Dict[str, Any]],
+) -> dict:
+    """
+    معادل دسته‌ای credit_deposit (شناسایی کاربر با memo درخواست واریز)
+    """
+    by_hash = _dedupe_by_hash(transfers)
+    results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    if not by_hash:
+        return _summary(results, 0)
+
+    seen = await _seen_tx_hashes(session, list(by_hash.keys()))
+
+    memos = {
+        str(tx.get("memo")).strip()
+        for h, tx in by_hash.items()
+        if h not in seen and tx.get("memo")
+    }
+    requests: Dict[str, DepositRequest] = {}
+    if memos:
+        r = await session.execute(
+            select(DepositRequest).where(DepositRequest.memo == _any_of(memos))
+        )
+        requests = {dr.memo: dr for dr in r.scalars().all()}
+
+    now = datetime.utcnow()
+    consumed: set = set()
+    credits: List[PendingCredit] = []
+
+    for h, tx in by_hash.items():
+        if h in seen:
+            results[h] = {"status": "ignored", "reason": "tx_already_seen", "hash": h}
+            continue
+
+        amount = tx.get("amount")
+        if amount is None or Decimal(amount) <= 0:
+            results[h] = {"status": "ignored", "reason": "invalid_amount", "hash": h}
+            continue
+        amount = Decimal(amount)
+
+        memo = str(tx.get("memo") or "").strip()
+        dr = requests.get(memo)
+        if not dr:
+            results[h] = {"status": "ignored", "reason": "memo_not_found", "hash": h}
+            continue
+        if dr.status != TransactionStatus.PENDING or memo in consumed:
+            results[h] = {"status": "ignored", "reason": "already_processed", "hash": h}
+            continue
+        if dr.expires_at and dr.expires_at < now:
+            results[h] = {"status": "ignored", "reason": "expired", "hash": h}
+            continue
+        if dr.expected_amount is not None:
+            expected = Decimal(str(dr.expected_amount))
+            if abs(amount - expected) > AMOUNT_TOLERANCE:
+                results[h] = {
+                    "status": "ignored",
+                    "reason": "amount_mismatch",
+                    "hash": h,
+                    "expected": float(expected),
+                    "received": float(amount),
+                }
+                continue
+
+        asset = (dr.asset or settings.default_asset).strip().upper()
+        network = (dr.network or settings.default_network).strip().upper()
+
+        consumed.add(memo)
+        results[h] = {"status": "pending", "hash": h}
+        credits.append(PendingCredit(
+            tx_hash=h,
+            user_id=dr.user_id,
+            amount=amount,
+            asset=asset,
+            network=network,
+            idempotency_key=f"DEPOSIT:{h}",
+            description=f"واریز {amount} {asset} ({network})",
+            memo=memo,
+            deposit_request_id=dr.id,
+        ))
+
+    credited = await _commit_credits(session, credits, results)
+    return _summary(results, credited)
@@ -13,15 +13,23 @@ from sqlalchemy import select
 
 from src.database.connection import async_session
 from src.database.models import DepositAddress
-from src.core.config import get_settings, TRC20_TOKEN_CONTRACTS, EVM_TOKEN_CONTRACTS
-from src.core.services.deposit_service import credit_deposit
-from src.core.services.trc20_deposit_service import credit_trc20_deposit_by_address
-from src.core.services.ton_provider import fetch_incoming_transactions
+from src.core.config import get_settings, TRC20_TOKEN_CONTRACTS, EVM_TOKEN_CONTRACTS, EVM_CONFIRMATIONS
+from src.core.services.deposit_batch_service import (
+    credit_address_deposits_batch,
+    credit_memo_deposits_batch,
+    pending_deposit_blocks,
+    record_pending_address_deposits,
+)
+from src.core.services.ton_provider import (
+    fetch_new_incoming_transactions,
+    fetch_incoming_transactions_range,
+)
 from src.core.services.tron_provider import (
     get_latest_tron_block_number,
+    get_tron_block_hash,
     fetch_trc20_transfers_by_block,
 )
-from src.core.services.evm_provider import fetch_incoming_evm_transfers
+from src.core.services.evm_provider import get_evm_block_number, fetch_evm_transfers_range
 from src.core.services.alerts import alert_admin
 
 settings = get_settings()
@@ -40,21 +48,95 @@ def _env_int(name: str, default: int) -> int:
 _TRON_CURSOR_FILE = Path(os.getenv("TRON_OBSERVER_CURSOR_FILE", ".tron_observer_cursor.json"))
 
 
-def _load_tron_cursor() -> Optional[int]:
+# last_scanned_block: فاز تایید (credit) | last_pending_block: فاز pending نزدیک head
+def _load_tron_cursor(key: str = "last_scanned_block") -> Optional[int]:
     try:
         if _TRON_CURSOR_FILE.exists():
             data = json.loads(_TRON_CURSOR_FILE.read_text(encoding="utf-8"))
-            v = data.get("last_scanned_block")
+            v = data.get(key)
             return int(v) if v is not None else None
     except Exception:
         return None
     return None
 
 
-def _save_tron_cursor(block_number: int) -> None:
+def _save_tron_cursor(block_number: int, key: str = "last_scanned_block") -> None:
     try:
-        _TRON_CURSOR_FILE.write_text(
-            json.dumps({"last_scanned_block": int(block_number)}, ensure_ascii=False),
+        data = {}
+        if _TRON_CURSOR_FILE.exists():
+            data = json.loads(_TRON_CURSOR_FILE.read_text(encoding="utf-8"))
+        data[key] = int(block_number)
+        _TRON_CURSOR_FILE.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    except Exception:
+        # best-effort; idempotency protects us anyway
+        pass
+
+
+_EVM_CURSOR_FILE = Path(os.getenv("EVM_OBSERVER_CURSOR_FILE", ".evm_observer_cursor.json"))
+
+
+# آخرین بلاک تایید‌شده‌ی اسکن‌شده برای هر شبکه‌ی EVM (ERC20 / BEP20)
+def _load_evm_cursor(network: str) -> Optional[int]:
+    try:
+        if _EVM_CURSOR_FILE.exists():
+            data = json.loads(_EVM_CURSOR_FILE.read_text(encoding="utf-8"))
+            v = data.get(network)
+            return int(v) if v is not None else None
+    except Exception:
+        return None
+    return None
+
+
+def _save_evm_cursor(network: str, block_number: int) -> None:
+    try:
+        data = {}
+        if _EVM_CURSOR_FILE.exists():
+            data = json.loads(_EVM_CURSOR_FILE.read_text(encoding="utf-8"))
+        data[network] = int(block_number)
+        _EVM_CURSOR_FILE.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    except Exception:
+        # best-effort; idempotency protects us anyway
+        pass
+
+
+_TON_CURSOR_FILE = Path(os.getenv("TON_OBSERVER_CURSOR_FILE", ".ton_observer_cursor.json"))
+
+
+def _load_ton_cursor() -> Optional[int]:
+    """watermark: lt آخرین تراکنش پردازش‌شده‌ی house wallet"""
+    try:
+        if _TON_CURSOR_FILE.exists():
+            data = json.loads(_TON_CURSOR_FILE.read_text(encoding="utf-8"))
+            v = data.get("last_processed_lt")
+            return int(v) if v is not None else None
+    except Exception:
+        return None
+    return None
+
+
+def _load_ton_resume() -> Optional[Dict[str, Any]]:
+    """
+    پیمایش ناتمام: {target_lt, target_hash, resume_lt, resume_hash}
+    بازه‌ی (watermark, resume_lt) هنوز پیمایش نشده؛ بعد از اتمام، watermark به target می‌رود
+    """
+    try:
+        if _TON_CURSOR_FILE.exists():
+            data = json.loads(_TON_CURSOR_FILE.read_text(encoding="utf-8"))
+            resume = data.get("resume")
+            if resume and resume.get("resume_lt") and resume.get("resume_hash"):
+                return resume
+    except Exception:
+        return None
+    return None
+
+
+def _save_ton_cursor(lt: int, tx_hash: Optional[str]) -> None:
+    try:
+        _TON_CURSOR_FILE.write_text(
+            json.dumps(
+                {"last_processed_lt": int(lt), "last_processed_hash": tx_hash},
+                ensure_ascii=False,
+            ),
             encoding="utf-8",
         )
     except Exception:
@@ -62,6 +144,16 @@ def _save_tron_cursor(block_number: int) -> None:
         pass
 
 
+def _save_ton_resume(resume: Dict[str, Any]) -> None:
+    """ثبت cursor ادامه کنار watermark فعلی (watermark تغییر نمی‌کند)"""
+    try:
+        data = json.loads(_TON_CURSOR_FILE.read_text(encoding="utf-8")) if _TON_CURSOR_FILE.exists() else {}
+        data["resume"] = resume
+        _TON_CURSOR_FILE.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    except Exception:
+        pass
+
+
 def _norm_addr(addr: str) -> str:
     return (addr or "").strip().lower()
 
@@ -92,6 +184,37 @@ def _get_trc20_contract(asset: str, network: str) -> Optional[str]:
     return None
 
 
+def _log_batch_results(batch: Dict[str, Any], amounts: Dict[str, Any]) -> None:
+    for r in batch.get("results", []):
+        h = r.get("hash")
+        if r.get("status") == "credited":
+            print(f"💰 واریز تایید شد: {amounts.get(h)} | hash: {h}")
+        elif r.get("status") == "pending" and "block_number" in r:
+            print(f"⏳ واریز در انتظار تایید: {amounts.get(h)} | block: {r['block_number']} | hash: {h}")
+        elif r.get("status") == "dropped":
+            print(f"↩️ واریز pending به دلیل reorg رها شد | hash: {h}")
+        elif r.get("status") in ("ignored", "error") and r.get("reason") not in (
+            "tx_already_seen",
+            "already_processed",
+        ):
+            print(f"⚠️ واریز نادیده گرفته شد: {r.get('reason')} | hash: {h}")
+
+
+async def _credit_ton_transactions(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    memo_txs = [
+        tx for tx in transactions
+        if tx.get("memo") and str(tx.get("memo")).startswith("DP-")
+    ]
+    if not memo_txs:
+        return {"processed": 0, "credited": 0, "results": []}
+
+    async with async_session() as session:
+        batch = await credit_memo_deposits_batch(session, memo_txs)
+
+    _log_batch_results(batch, {tx["hash"]: tx["amount"] for tx in memo_txs})
+    return batch
+
+
 async def process_deposits(asset: str = "TON", network: str = "TON"):
     """
     یک سیکل اسکن تراکنش‌ها
@@ -119,35 +242,50 @@ async def process_deposits(asset: str = "TON", network: str = "TON"):
         if not house_address:
             raise RuntimeError("TON_HOUSE_WALLET_ADDRESS is not set")
 
-        transactions = await fetch_incoming_transactions(house_address, limit=limit)
-
-        async with async_session() as session:
-            for tx in transactions:
-                memo = tx.get("memo")
-                if not memo or not str(memo).startswith("DP-"):
-                    continue
-
-                processed += 1
-                result = await credit_deposit(
-                    session,
-                    memo=memo,
-                    tx_hash=tx["hash"],
-                    amount=tx["amount"],
-                )
-
-                if result.get("status") == "credited":
-                    credited += 1
-                    print(f"💰 واریز تایید شد: {tx['amount']} | hash: {tx['hash']}")
-                elif result.get("status") == "ignored" and result.get("reason") not in (
-                    "tx_already_seen",
-                    "already_processed",
-                ):
-                    print(f"⚠️ واریز نادیده گرفته شد: {result.get('reason')} | hash: {tx['hash']}")
+        max_pages = _env_int("TON_OBSERVER_MAX_PAGES", 20)
+        watermark = _load_ton_cursor()
+        resume = _load_ton_resume() if watermark is not None else None
+        page = await fetch_new_incoming_transactions(
+            house_address,
+            after_lt=watermark,
+            page_size=limit,
+            max_pages=max_pages,
+            resume_lt=resume["resume_lt"] if resume else None,
+            resume_hash=resume["resume_hash"] if resume else None,
+        )
+        transactions = page["transactions"]
+
+        batch = await _credit_ton_transactions(transactions)
+        processed += batch["processed"]
+        credited += batch["credited"]
+
+        failed = any(r.get("status") == "error" for r in batch["results"])
+        if failed:
+            # cursor جلو نمی‌رود تا همین بازه در سیکل بعد دوباره پردازش شود
+            pass
+        elif not page["complete"]:
+            # بیش از limit * max_pages تراکنش بعد از watermark: watermark ثابت می‌ماند و
+            # سیکل بعد پیمایش از قدیمی‌ترین تراکنش دیده‌شده به سمت watermark ادامه پیدا می‌کند
+            target = resume or {"target_lt": page["head_lt"], "target_hash": page["head_hash"]}
+            _save_ton_resume({
+                "target_lt": target["target_lt"],
+                "target_hash": target["target_hash"],
+                "resume_lt": page["oldest_lt"],
+                "resume_hash": page["oldest_hash"],
+            })
+            print(f"⚠️ TON: بیش از {limit * max_pages} تراکنش جدید؛ ادامه از lt={page['oldest_lt']} در سیکل بعد")
+        elif resume:
+            # شکاف پر شد → watermark به جدیدترین تراکنش پیمایش ناتمام
+            _save_ton_cursor(resume["target_lt"], resume["target_hash"])
+        elif page["head_lt"] and page["head_lt"] != watermark:
+            _save_ton_cursor(page["head_lt"], page["head_hash"])
 
         return {"processed": processed, "credited": credited}
 
     # ----------------------------
     # 2) USDT/TRC20 (block scanning + cursor)
+    #    فاز ۲: safe_head = head - confirmations → credit (و رها کردن PENDING های reorg شده)
+    #    فاز ۱: (safe_head, head] → فقط PENDING برای نمایش فوری به کاربر
     # ----------------------------
     if a == "USDT" and n == "TRC20":
         token_contract = _get_trc20_contract(a, n)
@@ -155,6 +293,8 @@ async def process_deposits(asset: str = "TON", network: str = "TON"):
             raise RuntimeError(f"missing_trc20_contract for {a}-{n} in TRC20_TOKEN_CONTRACTS")
 
         confirmations = _env_int("TRON_OBSERVER_CONFIRMATIONS", 20)
+        pending_scan = _env_int("DEPOSIT_PENDING_SCAN", 1) > 0
+        pending = 0
 
         # load deposit addresses once
         async with async_session() as session:
@@ -163,6 +303,7 @@ async def process_deposits(asset: str = "TON", network: str = "TON"):
                     select(DepositAddress).where(
                         DepositAddress.asset == a,
                         DepositAddress.network == n,
+                        DepositAddress.user_id.is_not(None),
                     )
                 )
             ).scalars().all()
@@ -180,53 +321,104 @@ async def process_deposits(asset: str = "TON", network: str = "TON"):
                 # start slightly behind to avoid missing anything on first run
                 cursor = max(safe_head - 200, 0)
 
-            # scan forward
-            for bn in range(cursor + 1, safe_head + 1):
-                txs = await fetch_trc20_transfers_by_block(
-                    block_number=bn,
-                    token_contract=token_contract,
-                )
+            # بلاک‌هایی که PENDING دارند باید حتی بدون transfer تایید‌شده finalize شوند
+            pending_blocks = await pending_deposit_blocks(session, a, n, safe_head)
 
-                for tx in txs:
-                    to_addr = _norm_addr(tx.get("to_address") or "")
-                    if not to_addr or to_addr not in addr_set:
-                        continue
-
-                    processed += 1
-                    result = await credit_trc20_deposit(
-                        session=session,
-                        to_address=tx.get("to_address") or "",
-                        tx_hash=tx["hash"],
-                        amount=tx["amount"],
+            # scan forward (confirmed)
+            for bn in range(cursor + 1, safe_head + 1):
+                try:
+                    txs = await fetch_trc20_transfers_by_block(
+                        block_number=bn,
+                        token_contract=token_contract,
+                        raise_on_error=True,
+                    )
+                    matched = [
+                        tx for tx in txs
+                        if _norm_addr(tx.get("to_address") or "") in addr_set
+                    ]
+                    if matched:
+                        block_hash = await get_tron_block_hash(bn)
+                        for tx in matched:
+                            tx["block_hash"] = block_hash
+                except Exception as e:
+                    # cursor جلو نمی‌رود تا بلاک در سیکل بعد دوباره اسکن شود
+                    print(f"⚠️ TRC20: خطا در اسکن بلاک {bn}: {e}")
+                    break
+
+                stale = bool(pending_blocks) and min(pending_blocks) <= bn
+                if matched or stale:
+                    # یک commit برای کل بلاک
+                    batch = await credit_address_deposits_batch(
+                        session,
+                        matched,
                         asset=a,
                         network=n,
-                        from_address=tx.get("from_address"),
-                        timestamp_ms=tx.get("timestamp"),
+                        finalized_through=bn,
                     )
+                    processed += batch["processed"]
+                    credited += batch["credited"]
+                    _log_batch_results(batch, {tx["hash"]: tx["amount"] for tx in matched})
 
-                    if result.get("status") == "credited":
-                        credited += 1
-                        print(f"💰 واریز تایید شد: {tx['amount']} | hash: {tx['hash']}")
-                    elif result.get("status") == "ignored" and result.get("reason") not in (
-                        "tx_already_seen",
-                        "already_processed",
-                    ):
-                        print(f"⚠️ واریز نادیده گرفته شد: {result.get('reason')} | hash: {tx['hash']}")
+                    if any(r.get("status") == "error" for r in batch["results"]):
+                        # cursor جلو نمی‌رود تا بلاک در سیکل بعد دوباره اسکن شود
+                        break
+                    pending_blocks = {b for b in pending_blocks if b > bn}
 
                 _save_tron_cursor(bn)
 
-        return {"processed": processed, "credited": credited}
+            # scan near head (unconfirmed → PENDING)
+            if pending_scan:
+                pending_cursor = _load_tron_cursor("last_pending_block")
+                start = max(pending_cursor or 0, safe_head) + 1
+                for bn in range(start, head + 1):
+                    try:
+                        txs = await fetch_trc20_transfers_by_block(
+                            block_number=bn,
+                            token_contract=token_contract,
+                            only_confirmed=False,
+                            raise_on_error=True,
+                        )
+                        matched = [
+                            tx for tx in txs
+                            if _norm_addr(tx.get("to_address") or "") in addr_set
+                        ]
+                        if matched:
+                            block_hash = await get_tron_block_hash(bn)
+                            for tx in matched:
+                                tx["block_hash"] = block_hash
+                            batch = await record_pending_address_deposits(
+                                session,
+                                matched,
+                                asset=a,
+                                network=n,
+                            )
+                            pending += batch.get("pending", 0)
+                            _log_batch_results(batch, {tx["hash"]: tx["amount"] for tx in matched})
+                    except Exception as e:
+                        # فاز pending best-effort است؛ فاز تایید همه‌چیز را دوباره پوشش می‌دهد
+                        print(f"⚠️ TRC20: خطا در اسکن pending بلاک {bn}: {e}")
+                        break
+
+                    _save_tron_cursor(bn, key="last_pending_block")
+
+        return {"processed": processed, "credited": credited, "pending": pending}
 
     # ----------------------------
     # 3) USDT/ERC20 or USDT/BEP20 (batch fetch by address list)
+    #    فاز ۲: [safe - range, safe] → credit | فاز ۱: (safe, head] → PENDING
     # ----------------------------
     if a == "USDT" and n in ("ERC20", "BEP20"):
+        pending_scan = _env_int("DEPOSIT_PENDING_SCAN", 1) > 0
+        block_range = _env_int("EVM_OBSERVER_BLOCK_RANGE", 5000)
+        pending = 0
+
         async with async_session() as session:
             rows = (
                 await session.execute(
                     select(DepositAddress).where(
                         DepositAddress.asset == a,
                         DepositAddress.network == n,
+                        DepositAddress.user_id.is_not(None),
                     )
                 )
             ).scalars().all()
@@ -235,35 +427,76 @@ async def process_deposits(asset: str = "TON", network: str = "TON"):
                 return {"processed": 0, "credited": 0}
 
             addr_list = [da.address for da in rows if da.address]
-            transactions = await fetch_incoming_evm_transfers(
-                addresses=addr_list,
-                network=n,
-                asset=a,
-            )
-
-            for tx in transactions:
-                processed += 1
-                result = await credit_trc20_deposit(
-                    session=session,
-                    to_address=tx.get("to_address") or "",
-                    tx_hash=tx["hash"],
-                    amount=tx["amount"],
-                    asset=a,
-                    network=n,
-                    from_address=tx.get("from_address"),
-                    timestamp_ms=tx.get("timestamp"),
-                )
 
-                if result.get("status") == "credited":
-                    credited += 1
-                    print(f"💰 واریز تایید شد: {tx['amount']} | hash: {tx['hash']}")
-                elif result.get("status") == "ignored" and result.get("reason") not in (
-                    "tx_already_seen",
-                    "already_processed",
-                ):
-                    print(f"⚠️ واریز نادیده گرفته شد: {result.get('reason')} | hash: {tx['hash']}")
+            try:
+                head = await get_evm_block_number(n)
+            except Exception as e:
+                print(f"❌ Error fetching EVM head ({n}): {e}")
+                return {"processed": 0, "credited": 0}
 
-        return {"processed": processed, "credited": credited}
+            safe_block = head - EVM_CONFIRMATIONS.get(n, 12)
+
+            # پنجره‌ی تایید از cursor همین شبکه ادامه پیدا می‌کند (حداکثر block_range بلاک در هر سیکل)
+            # تا بعد از downtime بلاکی بین دو پنجره جا نماند
+            last_scanned = _load_evm_cursor(n)
+            from_block = max(safe_block - block_range, 0) if last_scanned is None else last_scanned + 1
+            to_block = min(safe_block, from_block + block_range)
+
+            if safe_block > 0 and from_block <= to_block:
+                try:
+                    transactions = await fetch_evm_transfers_range(
+                        addr_list,
+                        n,
+                        from_block=from_block,
+                        to_block=to_block,
+                        asset=a,
+                    )
+                except Exception as e:
+                    # بدون اسکن کامل، PENDING ها رها نمی‌شوند
+                    print(f"❌ Error fetching EVM transfers ({n}): {e}")
+                    transactions = None
+
+                if transactions is not None:
+                    batch = await credit_address_deposits_batch(
+                        session,
+                        transactions,
+                        asset=a,
+                        network=n,
+                        finalized_through=to_block,
+                        finalized_from=from_block,
+                        scanned_addresses=addr_list,
+                    )
+                    processed += batch["processed"]
+                    credited += batch["credited"]
+                    _log_batch_results(batch, {tx["hash"]: tx["amount"] for tx in transactions})
+
+                    if not any(r.get("status") == "error" for r in batch["results"]):
+                        _save_evm_cursor(n, to_block)
+                    if to_block < safe_block:
+                        print(f"⏩ {n}: catching up, scanned through {to_block} (safe {safe_block})")
+
+            if pending_scan and head > max(safe_block, 0):
+                try:
+                    unconfirmed = await fetch_evm_transfers_range(
+                        addr_list,
+                        n,
+                        from_block=max(safe_block, 0) + 1,
+                        to_block=head,
+                        asset=a,
+                    )
+                    if unconfirmed:
+                        batch = await record_pending_address_deposits(
+                            session,
+                            unconfirmed,
+                            asset=a,
+                            network=n,
+                        )
+                        pending += batch.get("pending", 0)
+                        _log_batch_results(batch, {tx["hash"]: tx["amount"] for tx in unconfirmed})
+                except Exception as e:
+                    print(f"⚠️ Error fetching pending EVM transfers ({n}): {e}")
+
+        return {"processed": processed, "credited": credited, "pending": pending}
 
     raise NotImplementedError(f"Deposit observer for {a}-{n} is not implemented yet")
 
@@ -298,6 +531,29 @@ async def run_deposit_observer(interval_seconds: int = 15):
         await asyncio.sleep(interval_seconds)
 
 
+async def backfill_ton_deposits(
+    from_lt: int,
+    to_lt: Optional[int] = None,
+    to_hash: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Backfill: اسکن دوباره‌ی بازه‌ی lt مشخص (بدون تغییر watermark)
+    """
+    house_address = settings.ton_house_wallet_address
+    if not house_address:
+        raise RuntimeError("TON_HOUSE_WALLET_ADDRESS is not set")
+
+    transactions = await fetch_incoming_transactions_range(
+        house_address,
+        from_lt=from_lt,
+        to_lt=to_lt,
+        to_hash=to_hash,
+        page_size=_env_int("DEPOSIT_OBSERVER_LIMIT", 50),
+    )
+    batch = await _credit_ton_transactions(transactions)
+    return {"processed": batch["processed"], "credited": batch["credited"]}
+
+
 async def run_single_scan():
     """
     اجرای یک اسکن (برای تست)
@@ -312,4 +568,14 @@ async def run_single_scan():
 
 
 if __name__ == "__main__":
-    asyncio.run(run_deposit_observer())
+    backfill_from = os.getenv("TON_BACKFILL_FROM_LT")
+    if backfill_from:
+        to_lt = os.getenv("TON_BACKFILL_TO_LT")
+        result = asyncio.run(backfill_ton_deposits(
+            from_lt=int(backfill_from),
+            to_lt=int(to_lt) if to_lt else None,
+            to_hash=os.getenv("TON_BACKFILL_TO_HASH") or None,
+        ))
+        print(f"نتیجه backfill: {result}")
+    else:
+        asyncio.run(run_deposit_observer())
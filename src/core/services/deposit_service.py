@@ -17,7 +17,7 @@ from src.database.models import (
     DepositRequest, Transaction, TransactionType, TransactionStatus,
     Balance, Ledger, LedgerEventType, User
 )
-from src.core.config import get_settings, SUPPORTED_ASSET_NETWORKS
+from src.core.config import get_settings, SUPPORTED_ASSET_NETWORKS, DEPOSIT_CONFIRMATIONS
 from src.core.services.deposit_address_service import get_or_create_deposit_address
 from src.core.config import get_house_wallet_address
 
@@ -147,6 +147,45 @@ async def get_pending_deposit(
     }
 
 
+async def get_incoming_deposits(
+    session: AsyncSession,
+    telegram_id: int,
+    limit: int = 20,
+) -> list[dict]:
+    """
+    واریزهای on-chain دیده‌شده که هنوز به عمق تایید نرسیده‌اند (PENDING)
+    """
+    result = await session.execute(
+        select(User).where(User.telegram_id == telegram_id)
+    )
+    user = result.scalar_one_or_none()
+
+    if not user:
+        return []
+
+    result = await session.execute(
+        select(Transaction).where(
+            Transaction.user_id == user.id,
+            Transaction.type == TransactionType.DEPOSIT,
+            Transaction.status == TransactionStatus.PENDING,
+        ).order_by(Transaction.created_at.desc()).limit(limit)
+    )
+
+    return [
+        {
+            "tx_hash": tx.tx_hash,
+            "asset": tx.asset,
+            "network": tx.network,
+            "amount": float(tx.amount),
+            "status": tx.status.value,
+            "block_number": tx.block_number,
+            "confirmations_required": DEPOSIT_CONFIRMATIONS.get(tx.network or ""),
+            "seen_at": tx.created_at.isoformat(),
+        }
+        for tx in result.scalars().all()
+    ]
+
+
 async def credit_deposit(
     session: AsyncSession,
     memo: str,
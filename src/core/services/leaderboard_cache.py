@@ -0,0 +1,189 @@
+"""
+Leaderboard Cache
+صفحات /leaderboard/top به صورت JSON از پیش serialize‌شده (bytes) برای هر (window, bucket, limit, offset)
+
+- invalidation با app_counters.leaderboard_generation (در تراکنش تسویه هر راند +1 می‌شود)
+- worker پس‌زمینه هر LEADERBOARD_CACHE_POLL_SECONDS فقط generation را می‌خواند (یک lookup روی PK)؛
+  با تغییر آن (یا شروع روز / هفته / فصل جدید) صفحات داغ دوباره ساخته می‌شوند و تا آن موقع
+  نسخه قبلی سرو می‌شود → دیتابیس O(تسویه‌ها) را می‌بیند، نه O(بازدیدها)
+- صفحات اول هر window از قبل ساخته می‌شوند؛ فقط اولین درخواست یک صفحه جدید هزینه ساخت را می‌دهد
+- ETag = hash محتوا؛ اگر ترتیب بعد از تسویه تغییر نکرده باشد همان ETag (304) می‌ماند
+- هر worker کش خودش را دارد و مستقل همان generation را poll می‌کند
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, select
+
+from src.database.connection import async_session
+from src.database.models import User, UserStats, UserStatsPeriod
+from src.core.services import leaderboard_index
+from src.core.services.stats_service import PERIODS, get_leaderboard_generation, period_start
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+POLL_SECONDS = _env_int("LEADERBOARD_CACHE_POLL_SECONDS", 2)
+PREWARM_PAGES = _env_int("LEADERBOARD_CACHE_PREWARM_PAGES", 3)
+MAX_PAGES = _env_int("LEADERBOARD_CACHE_MAX_PAGES", 500)
+PAGE_SIZE = 50
+
+WINDOW_ALL = "all"
+WINDOWS = (WINDOW_ALL,) + PERIODS
+
+PageKey = Tuple[str, Optional[date], int, int]  # (window, period_start, limit, offset)
+
+
+@dataclass
+class CachedPage:
+    body: bytes
+    etag: str
+    generation: int
+
+
+_pages: Dict[PageKey, CachedPage] = {}
+_generation: Optional[int] = None
+_task: Optional[asyncio.Task] = None
+
+
+def _bucket(window: str, today: Optional[date] = None) -> Optional[date]:
+    if window == WINDOW_ALL:
+        return None
+    return period_start(window, today or datetime.utcnow().date())
+
+
+def leaderboard_entry(rank: int, row) -> dict:
+    """serializer مشترک یک ردیف لیدربورد (صفحات کش و همسایه‌های /me/rank)"""
+    return {
+        "rank": rank,
+        "telegram_id": row.telegram_id,
+        "username": row.username,
+        "wins": row.wins,
+        "losses": row.losses,
+        "score": float(row.score),
+        "win_rate": round(row.wins / row.total_bets * 100, 1) if row.total_bets > 0 else 0,
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    مقایسه If-None-Match با ETag صفحه (RFC 9110: لیست entity-tag ها با کاما، * و مقایسه weak)
+    """
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    if "*" in tags:
+        return True
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+
+async def _fetch_rows(window: str, bucket: Optional[date], limit: int, offset: int) -> List[dict]:
+    if window == WINDOW_ALL and leaderboard_index.is_ready():
+        return [leaderboard_entry(rank, row) for rank, row in leaderboard_index.top(limit, offset)]
+
+    stats = UserStats if window == WINDOW_ALL else UserStatsPeriod
+    query = (
+        select(User.username, User.telegram_id, stats.wins, stats.losses, stats.total_bets, stats.score)
+        .join(stats, stats.user_id == User.id)
+        .where(stats.total_bets > 0)
+        .where(User.is_system_user == False)
+        .order_by(desc(stats.score))
+        .limit(limit)
+        .offset(offset)
+    )
+    if window != WINDOW_ALL:
+        # index روی (period, period_start, score)
+        query = query.where(UserStatsPeriod.period == window, UserStatsPeriod.period_start == bucket)
+
+    async with async_session() as session:
+        rows = (await session.execute(query)).all()
+    return [leaderboard_entry(offset + i + 1, row) for i, row in enumerate(rows)]
+
+
+async def _build(key: PageKey, generation: int) -> CachedPage:
+    window, bucket, limit, offset = key
+    body = json.dumps(await _fetch_rows(window, bucket, limit, offset), separators=(",", ":")).encode()
+    page = CachedPage(body=body, etag=f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"', generation=generation)
+    if key in _pages or len(_pages) < MAX_PAGES:
+        _pages[key] = page
+    return page
+
+
+async def get_page(window: str, limit: int, offset: int) -> CachedPage:
+    """صفحه کش‌شده؛ در miss یک بار ساخته و برای refresh پس‌زمینه ثبت می‌شود"""
+    key = (window, _bucket(window), limit, offset)
+    page = _pages.get(key)
+    if page is not None:
+        return page
+    return await _build(key, _generation or 0)
+
+
+async def _refresh(generation: int) -> int:
+    today = datetime.utcnow().date()
+
+    # صفحات بازه‌های تمام‌شده کنار گذاشته می‌شوند
+    for key in [k for k in _pages if k[1] != _bucket(k[0], today)]:
+        _pages.pop(key, None)
+
+    keys = set(_pages)
+    for window in WINDOWS:
+        for i in range(PREWARM_PAGES):
+            keys.add((window, _bucket(window, today), PAGE_SIZE, i * PAGE_SIZE))
+
+    if leaderboard_index.is_ready():
+        # همان تسویه‌ای که generation را عوض کرده در ایندکس هم دیده شود
+        await leaderboard_index.refresh_leaderboard_index()
+
+    for key in keys:
+        await _build(key, generation)
+    return len(keys)
+
+
+async def run_leaderboard_cache() -> None:
+    global _generation
+    print(f"🗂️ Leaderboard cache started (poll {POLL_SECONDS}s, prewarm {PREWARM_PAGES} pages/window)")
+    last_day: Optional[date] = None
+
+    while True:
+        try:
+            async with async_session() as session:
+                generation = await get_leaderboard_generation(session)
+            today = datetime.utcnow().date()
+            if generation != _generation or today != last_day:
+                built = await _refresh(generation)
+                if _generation is not None:
+                    print(f"🗂️ Leaderboard cache rebuilt: generation {generation}, {built} pages")
+                _generation = generation
+                last_day = today
+        except Exception as e:
+            print(f"🚨 Leaderboard cache error: {e}")
+        await asyncio.sleep(POLL_SECONDS)
+
+
+def start_leaderboard_cache() -> asyncio.Task:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run_leaderboard_cache())
+    return _task
+
+
+async def stop_leaderboard_cache() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,243 @@
+"""
+Leaderboard Index
+ایندکس رتبه‌بندی درون‌حافظه‌ای لیدربورد (skip list با کلید (-score, user_id))
+
+- صفحه top-N، رتبه کاربر + همسایه‌ها و percentile در O(log n) بدون ORDER BY / OFFSET روی دیتابیس
+- ساخت کامل از دیتابیس در startup و هر LEADERBOARD_REBUILD_MINUTES (حذف کاربران system / تغییرات خارج از user_stats)
+- به‌روزرسانی افزایشی هر LEADERBOARD_REFRESH_SECONDS از user_stats.updated_at (index دارد)
+
+چند worker / چند process: آمار در تراکنش‌های round runner (process جدا) تغییر می‌کند، پس هیچ
+worker مستقیم خبردار نمی‌شود. هر worker ایندکس خودش را از همان منبع (user_stats) با polling
+می‌سازد؛ پاسخ‌ها حداکثر LEADERBOARD_REFRESH_SECONDS عقب‌اند و as_of برمی‌گردانند.
+polling با همپوشانی (REFRESH_OVERLAP) تکرار می‌شود تا تراکنش‌هایی که updated_at قدیمی‌تر از
+watermark دارند ولی دیرتر commit شده‌اند از دست نروند (اعمال دوباره یک ردیف idempotent است).
+تا قبل از اولین ساخت، endpoint ها به مسیر دیتابیس برمی‌گردند.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, select
+
+from src.database.connection import async_session
+from src.database.models import User, UserStats
+from src.core.utils.skiplist import IndexableSkipList
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+REFRESH_SECONDS = _env_int("LEADERBOARD_REFRESH_SECONDS", 5)
+REBUILD_MINUTES = _env_int("LEADERBOARD_REBUILD_MINUTES", 60)
+REFRESH_OVERLAP = timedelta(seconds=_env_int("LEADERBOARD_REFRESH_OVERLAP_SECONDS", 30))
+
+_MIN_USER_ID = uuid.UUID(int=0)
+
+
+class LeaderboardRow(NamedTuple):
+    user_id: uuid.UUID
+    telegram_id: int
+    username: Optional[str]
+    wins: int
+    losses: int
+    total_bets: int
+    score: Decimal
+
+
+class _State:
+    def __init__(self):
+        self.index = IndexableSkipList()
+        self.rows: Dict[uuid.UUID, LeaderboardRow] = {}
+        self.watermark: Optional[datetime] = None
+        self.as_of: Optional[datetime] = None
+        self.ready = False
+
+
+_state = _State()
+_task: Optional[asyncio.Task] = None
+_lock: Optional[asyncio.Lock] = None
+
+
+def _get_lock() -> asyncio.Lock:
+    # rebuild / refresh از چند مسیر (loop ایندکس، کش صفحات) صدا زده می‌شوند
+    global _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    return _lock
+
+
+def _key(row: LeaderboardRow):
+    return (-row.score, row.user_id)
+
+
+def _eligible_query():
+    return (
+        select(
+            UserStats.user_id, User.telegram_id, User.username,
+            UserStats.wins, UserStats.losses, UserStats.total_bets, UserStats.score,
+        )
+        .join(User, User.id == UserStats.user_id)
+        .where(UserStats.total_bets > 0, User.is_system_user == False)
+    )
+
+
+def _upsert(state: _State, row: LeaderboardRow) -> None:
+    old = state.rows.get(row.user_id)
+    if old is not None:
+        if _key(old) == _key(row):
+            state.rows[row.user_id] = row
+            return
+        state.index.remove(_key(old))
+    state.index.insert(_key(row))
+    state.rows[row.user_id] = row
+
+
+async def rebuild_leaderboard_index() -> int:
+    """ساخت کامل در یک ایندکس جدید و جایگزینی (خواننده‌ها هیچ‌وقت ایندکس نیمه‌کاره نمی‌بینند)"""
+    async with _get_lock():
+        return await _rebuild()
+
+
+async def refresh_leaderboard_index() -> int:
+    """اعمال ردیف‌های user_stats تغییرکرده از آخرین watermark (با همپوشانی)"""
+    async with _get_lock():
+        if not _state.ready:
+            return await _rebuild()
+        return await _refresh()
+
+
+async def _rebuild() -> int:
+    global _state
+    async with async_session() as session:
+        db_now = (await session.execute(select(func.localtimestamp()))).scalar_one()
+        rows = (await session.execute(_eligible_query())).all()
+
+    state = _State()
+    for r in rows:
+        _upsert(state, LeaderboardRow(*r))
+    state.watermark = db_now
+    state.as_of = db_now
+    state.ready = True
+    _state = state
+    return len(rows)
+
+
+async def _refresh() -> int:
+    state = _state
+    async with async_session() as session:
+        db_now = (await session.execute(select(func.localtimestamp()))).scalar_one()
+        rows = (
+            await session.execute(
+                select(
+                    UserStats.user_id, User.telegram_id, User.username,
+                    UserStats.wins, UserStats.losses, UserStats.total_bets, UserStats.score,
+                    User.is_system_user,
+                )
+                .join(User, User.id == UserStats.user_id)
+                .where(UserStats.updated_at >= state.watermark - REFRESH_OVERLAP)
+            )
+        ).all()
+
+    for r in rows:
+        row = LeaderboardRow(*r[:7])
+        if row.total_bets > 0 and not r.is_system_user:
+            _upsert(state, row)
+        else:
+            old = state.rows.pop(row.user_id, None)
+            if old is not None:
+                state.index.remove(_key(old))
+
+    state.watermark = db_now
+    state.as_of = db_now
+    return len(rows)
+
+
+def is_ready() -> bool:
+    return _state.ready
+
+
+def as_of() -> Optional[datetime]:
+    return _state.as_of
+
+
+def total() -> int:
+    return len(_state.index)
+
+
+def top(limit: int, offset: int = 0) -> List[tuple]:
+    """[(rank, LeaderboardRow), ...] از رتبه offset + 1"""
+    state = _state
+    out = []
+    for key in state.index.iter_from(offset):
+        if len(out) >= limit:
+            break
+        out.append((offset + len(out) + 1, state.rows[key[1]]))
+    return out
+
+
+def rank_of(user_id: uuid.UUID, neighbours: int = 2) -> Optional[dict]:
+    """
+    رتبه کاربر (مکانی، مثل /top)، رتبه امتیازی (هم‌امتیازها رتبه یکسان)، percentile و همسایه‌ها
+    None اگر کاربر در لیدربورد نیست
+    """
+    state = _state
+    row = state.rows.get(user_id)
+    if row is None:
+        return None
+
+    position = state.index.rank(_key(row))
+    size = len(state.index)
+    start = max(position - neighbours, 0)
+    return {
+        "rank": position + 1,
+        "score_rank": state.index.rank((-row.score, _MIN_USER_ID)) + 1,
+        "total": size,
+        # درصد بازیکنانی که پایین‌تر از کاربر هستند
+        "percentile": round((size - position - 1) / size * 100, 2) if size > 1 else 100.0,
+        "row": row,
+        "neighbours": top(position - start + neighbours + 1, start),
+    }
+
+
+async def run_leaderboard_index() -> None:
+    print(f"🏆 Leaderboard index started (refresh {REFRESH_SECONDS}s, rebuild every {REBUILD_MINUTES}m)")
+    last_rebuild: Optional[float] = None
+
+    while True:
+        loop_now = asyncio.get_running_loop().time()
+        try:
+            if last_rebuild is None or loop_now - last_rebuild >= REBUILD_MINUTES * 60:
+                count = await rebuild_leaderboard_index()
+                last_rebuild = loop_now
+                print(f"🏆 Leaderboard index rebuilt: {count} players")
+            else:
+                await refresh_leaderboard_index()
+        except Exception as e:
+            print(f"🚨 Leaderboard index error: {e}")
+        await asyncio.sleep(REFRESH_SECONDS)
+
+
+def start_leaderboard_index() -> asyncio.Task:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run_leaderboard_index())
+    return _task
+
+
+async def stop_leaderboard_index() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -1,9 +1,14 @@
+import os
 import uuid
 from decimal import Decimal
 from datetime import datetime, timedelta
-from sqlalchemy import select, update
+from sqlalchemy import Numeric, and_, case, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.services.market_finalizer import schedule_market_finalization
+from src.core.services.prop_evaluator import mark_prop_accounts_dirty
+from src.core.services.prop_service import settle_prop_market
 from src.database.models import (
     Market, MarketType, MarketStatus,
     Prediction, PredictionDirection, PredictionStatus,
@@ -11,6 +16,10 @@ from src.database.models import (
 )
 
 HOUSE_FEE_RATE = Decimal("0.05")  # ۵ درصد کارمزد پلتفرم از استخر بازنده‌ها
+MARKET_ASSET = "TON"  # فعلاً مبنای پولی بازارها TON است
+
+# تعداد کاربر در هر تراکنش تسویه (0 = کل بازار در یک تراکنش)
+FINALIZE_CHUNK_SIZE = int(os.getenv("MARKET_FINALIZE_CHUNK_SIZE", "0") or 0)
 
 async def create_local_market(
     session: AsyncSession,
@@ -53,7 +62,7 @@ async def place_prediction(
 ) -> Prediction:
     """ثبت پیش‌بینی توسط کاربر با رعایت Locking دیتابیس"""
     
-    # ۱. چک کردن وضعیت بازار
+    # ۱. چک کردن وضعیت بازار (بدون lock؛ وضعیت نهایی در UPDATE استخر دوباره چک می‌شود)
     market = await session.get(Market, market_id)
     if not market or market.status != MarketStatus.ACTIVE:
         raise ValueError("Market is not active or does not exist")
@@ -77,13 +86,7 @@ async def place_prediction(
     balance.available -= amount
     balance.locked += amount
 
-    # ۴. آپدیت استخر مالی بازار
-    if direction == PredictionDirection.YES:
-        market.total_pool_yes += amount
-    else:
-        market.total_pool_no += amount
-
-    # ۵. ایجاد رکورد پیش‌بینی
+    # ۴. ایجاد رکورد پیش‌بینی
     prediction = Prediction(
         user_id=user_id,
         market_id=market_id,
@@ -94,7 +97,7 @@ async def place_prediction(
     session.add(prediction)
     await session.flush()  # برای گرفتن ID پیش‌بینی
 
-    # ۶. ثبت در دفتر کل (Ledger)
+    # ۵. ثبت در دفتر کل (Ledger)
     ledger_entry = Ledger(
         user_id=user_id,
         event_type=LedgerEventType.BET_LOCK,
@@ -110,6 +113,21 @@ async def place_prediction(
         idempotency_key=f"LOCK:{market_id}:{prediction.id}"
     )
     session.add(ledger_entry)
+    await session.flush()
+
+    # ۶. آپدیت اتمیک استخر بازار (آخرین دستور قبل از commit تا lock ردیف بازار کوتاه بماند)
+    pool_column = Market.total_pool_yes if direction == PredictionDirection.YES else Market.total_pool_no
+    pool_result = await session.execute(
+        update(Market)
+        .where(Market.id == market_id, Market.status == MarketStatus.ACTIVE)
+        .values({pool_column: pool_column + amount})
+        .returning(Market.total_pool_yes, Market.total_pool_no)
+        .execution_options(synchronize_session=False)
+    )
+    if pool_result.one_or_none() is None:
+        # بازار بین چک اولیه و ثبت بسته شده
+        await session.rollback()
+        raise ValueError("Market is not active or does not exist")
 
     await session.commit()
     return prediction
@@ -138,112 +156,284 @@ async def propose_resolution(
     session.add(resolution)
     await session.commit()
     await session.refresh(resolution)
+
+    # بیدار کردن market_finalizer برای تسویه خودکار در پایان مهلت اعتراض
+    schedule_market_finalization(market_id, resolution.dispute_deadline)
     return resolution
 
-async def finalize_market(session: AsyncSession, market_id: uuid.UUID) -> dict:
-    """تسویه نهایی بازار و توزیع سود با رعایت Idempotency"""
-    
-    market = await session.get(Market, market_id)
+async def _lock_market_for_finalize(session: AsyncSession, market_id: uuid.UUID):
+    """قفل ردیف بازار (یک finalizer در هر لحظه برای هر بازار) + گرفتن resolution"""
+    market = (
+        await session.execute(
+            select(Market)
+            .where(Market.id == market_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+    ).scalar_one_or_none()
     if not market or market.status != MarketStatus.PENDING_RESOLUTION:
         raise ValueError("Market is not in pending resolution status")
 
     stmt = select(MarketResolution).where(MarketResolution.market_id == market_id)
-    res_result = await session.execute(stmt)
-    resolution = res_result.scalar_one_or_none()
-    
+    resolution = (await session.execute(stmt)).scalar_one_or_none()
     if not resolution:
         raise ValueError("Resolution data not found")
 
+    return market, resolution
+
+
+async def _settle_real_chunk(
+    session: AsyncSession,
+    market_id: uuid.UUID,
+    winning_direction: PredictionDirection,
+    payout_ratio: Decimal,
+    limit: int | None = None,
+) -> int:
+    """
+    تسویه یک دسته از پیش‌بینی‌های real باز (به ترتیب user_id) با تعداد round trip ثابت:
+    ۱. قفل balance ها به ترتیب user_id (جلوگیری از deadlock)
+    ۲. UPDATE predictions (وضعیت + payout محاسبه‌شده در SQL)
+    ۳. UPDATE balances ... FROM predictions
+    ۴. INSERT ledger چندردیفی با ON CONFLICT (idempotency_key) DO NOTHING
+    """
+    open_real = and_(
+        Prediction.market_id == market_id,
+        Prediction.account_context == "real",
+        Prediction.status == PredictionStatus.OPEN,
+    )
+
+    # کاربرانی که ردیف balance TON ندارند با join زیر جا می‌مانند و پیش‌بینی‌شان OPEN می‌ماند
+    # (شرط NOT EXISTS برای ردیف TON روی network دیگر؛ ON CONFLICT برای race)
+    has_balance = select(Balance.id).where(Balance.user_id == Prediction.user_id, Balance.asset == MARKET_ASSET)
+    missing = (
+        await session.execute(
+            pg_insert(Balance)
+            .from_select(
+                ["id", "user_id", "available", "locked", "currency", "asset", "network", "updated_at"],
+                select(
+                    func.gen_random_uuid(), Prediction.user_id,
+                    literal(Decimal("0"), Numeric), literal(Decimal("0"), Numeric),
+                    literal(MARKET_ASSET), literal(MARKET_ASSET), literal(MARKET_ASSET),
+                    func.now(),
+                ).where(open_real, ~has_balance.exists()),
+            )
+            .on_conflict_do_nothing(constraint="uq_balances_user_asset_network")
+            .returning(Balance.user_id)
+        )
+    ).scalars().all()
+    if missing:
+        print(f"⚠️ Market {market_id}: created {len(missing)} missing {MARKET_ASSET} balance row(s) for settlement")
+
+    lock_stmt = (
+        select(Balance.user_id)
+        .join(Prediction, Prediction.user_id == Balance.user_id)
+        .where(open_real, Balance.asset == MARKET_ASSET)
+        .order_by(Balance.user_id)
+        .with_for_update(of=Balance)
+    )
+    if limit:
+        lock_stmt = lock_stmt.limit(limit)
+    user_ids = (await session.execute(lock_stmt)).scalars().all()
+    if not user_ids:
+        return 0
+
+    is_win = Prediction.direction == winning_direction
+    now = datetime.utcnow()
+
+    settled = (
+        await session.execute(
+            update(Prediction)
+            .where(open_real, Prediction.user_id.in_(user_ids))
+            .values(
+                status=case(
+                    (is_win, literal(PredictionStatus.WON, Prediction.status.type)),
+                    else_=literal(PredictionStatus.LOST, Prediction.status.type),
+                ),
+                is_correct=is_win,
+                payout=case(
+                    (is_win, Prediction.amount + Prediction.amount * literal(payout_ratio, Numeric)),
+                    else_=literal(Decimal("0"), Numeric),
+                ),
+                resolved_at=now,
+            )
+            .returning(Prediction.id, Prediction.user_id, Prediction.amount, Prediction.payout, Prediction.is_correct)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    by_user = {row.user_id: row for row in settled}
+
+    balances = (
+        await session.execute(
+            update(Balance)
+            .where(
+                Balance.user_id == Prediction.user_id,
+                Balance.asset == MARKET_ASSET,
+                Prediction.market_id == market_id,
+                Prediction.account_context == "real",
+                Prediction.user_id.in_(list(by_user.keys())),
+            )
+            .values(
+                # ردیف‌های تازه‌ساخته‌شده (بالا) stake قفل‌شده ندارند
+                locked=func.greatest(Balance.locked - Prediction.amount, literal(Decimal("0"), Numeric)),
+                available=Balance.available + Prediction.payout,
+                updated_at=now,
+            )
+            .returning(
+                Balance.user_id, Balance.available, Balance.locked,
+                Balance.currency, Balance.asset, Balance.network,
+            )
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+
+    ledger_rows = []
+    for b in balances:
+        pred = by_user[b.user_id]
+        if pred.is_correct:
+            event_type = LedgerEventType.SETTLE_WIN
+            amount = pred.payout
+            description = f"Won prediction {pred.id} on market {market_id}"
+            idempotency_key = f"MARKET_PAYOUT:{market_id}:{pred.id}"
+        else:
+            event_type = LedgerEventType.SETTLE_LOSS
+            amount = pred.amount
+            description = f"Lost prediction {pred.id} on market {market_id}"
+            idempotency_key = f"MARKET_LOSS:{market_id}:{pred.id}"
+
+        ledger_rows.append({
+            "id": uuid.uuid4(),
+            "user_id": b.user_id,
+            "event_type": event_type,
+            "amount": amount,
+            "currency": b.currency,
+            "asset": b.asset,
+            "network": b.network,
+            "available_before": b.available - pred.payout,
+            "available_after": b.available,
+            "locked_before": b.locked + pred.amount,
+            "locked_after": b.locked,
+            "description": description,
+            "idempotency_key": idempotency_key,
+            "created_at": now,
+        })
+
+    if ledger_rows:
+        await session.execute(
+            pg_insert(Ledger)
+            .values(ledger_rows)
+            .on_conflict_do_nothing(index_elements=[Ledger.idempotency_key])
+        )
+
+    return len(settled)
+
+
+async def finalize_market(
+    session: AsyncSession,
+    market_id: uuid.UUID,
+    chunk_size: int | None = None,
+) -> dict:
+    """
+    تسویه نهایی بازار و توزیع سود با رعایت Idempotency (set-based)
+
+    تعداد round trip به تعداد پیش‌بینی‌ها وابسته نیست. با chunk_size (یا MARKET_FINALIZE_CHUNK_SIZE)
+    بازارهای خیلی بزرگ در چند تراکنش کوتاه (هر کدام chunk_size کاربر) تسویه می‌شوند؛
+    بازار تا آخرین دسته PENDING_RESOLUTION می‌ماند و اجرای دوباره از همان‌جا ادامه می‌دهد.
+    استخرها و payout فقط از پیش‌بینی‌های account_context='real'؛ پیش‌بینی‌های پراپ
+    در همان تراکنش نهایی با settle_prop_market (payout قیمت‌محور) تسویه می‌شوند.
+    """
+    if chunk_size is None:
+        chunk_size = FINALIZE_CHUNK_SIZE
+
+    market, resolution = await _lock_market_for_finalize(session, market_id)
+
     winning_direction = PredictionDirection.YES if resolution.outcome == "YES" else PredictionDirection.NO
-    
-    total_winning_pool = market.total_pool_yes if winning_direction == PredictionDirection.YES else market.total_pool_no
-    total_losing_pool = market.total_pool_no if winning_direction == PredictionDirection.YES else market.total_pool_yes
-    
+
+    # استخرها از خود پیش‌بینی‌ها (در اجرای دوباره بعد از chunk های commit‌شده هم ثابت می‌ماند)
+    is_win = Prediction.direction == winning_direction
+    zero = literal(Decimal("0"), Numeric)
+    pools = (
+        await session.execute(
+            select(
+                func.coalesce(func.sum(case((is_win, Prediction.amount), else_=zero)), zero).label("winning"),
+                func.coalesce(func.sum(case((is_win, zero), else_=Prediction.amount)), zero).label("losing"),
+            ).where(
+                Prediction.market_id == market_id,
+                Prediction.account_context == "real",
+                Prediction.status != PredictionStatus.REFUNDED,
+            )
+        )
+    ).one()
+    total_winning_pool = Decimal(pools.winning)
+    total_losing_pool = Decimal(pools.losing)
+
     # محاسبه کارمزد پلتفرم از استخر بازنده‌ها
     house_fee_amount = total_losing_pool * HOUSE_FEE_RATE
     net_losing_pool = total_losing_pool - house_fee_amount
+    payout_ratio = net_losing_pool / total_winning_pool if total_winning_pool > 0 else Decimal("0")
 
-    # گرفتن تمام پیش‌بینی‌های این بازار
-    pred_stmt = select(Prediction).where(Prediction.market_id == market_id)
-    predictions = (await session.execute(pred_stmt)).scalars().all()
-
-    total_payouts = Decimal("0")
-
-    for pred in predictions:
-        # دوباره موجودی کاربر را با لاک می‌گیریم
-        bal_stmt = select(Balance).where(
-            Balance.user_id == pred.user_id,
-            Balance.asset == "TON"
-        ).with_for_update()
-        balance = (await session.execute(bal_stmt)).scalar_one_or_none()
-        
-        if not balance:
-            continue
-            
-        # آزادسازی مقدار قفل شده در هر صورت (چه برد چه باخت)
-        balance.locked -= pred.amount
-
-        if pred.direction == winning_direction:
-            # کاربر برنده شده است
-            user_share_pct = pred.amount / total_winning_pool if total_winning_pool > 0 else Decimal("0")
-            profit = net_losing_pool * user_share_pct
-            payout = pred.amount + profit
-            
-            balance.available += payout
-            pred.status = PredictionStatus.WON
-            pred.is_correct = True
-            pred.payout = payout
-            total_payouts += payout
-
-            # ثبت لجر برد با کلید Idempotency
-            session.add(Ledger(
-                user_id=pred.user_id,
-                event_type=LedgerEventType.SETTLE_WIN,
-                amount=payout,
-                currency=balance.currency,
-                asset=balance.asset,
-                network=balance.network,
-                description=f"Won prediction {pred.id} on market {market_id}",
-                idempotency_key=f"MARKET_PAYOUT:{market_id}:{pred.id}"
-            ))
-        else:
-            # کاربر باخته است
-            pred.status = PredictionStatus.LOST
-            pred.is_correct = False
-            pred.payout = Decimal("0")
-
-            session.add(Ledger(
-                user_id=pred.user_id,
-                event_type=LedgerEventType.SETTLE_LOSS,
-                amount=pred.amount,
-                currency=balance.currency,
-                asset=balance.asset,
-                network=balance.network,
-                description=f"Lost prediction {pred.id} on market {market_id}",
-                idempotency_key=f"MARKET_LOSS:{market_id}:{pred.id}"
-            ))
-
-    # ثبت کارمزد پلتفرم در لجر (همانطور که کلاد خواسته بود)
+    while True:
+        settled = await _settle_real_chunk(
+            session, market_id, winning_direction, payout_ratio, limit=chunk_size or None
+        )
+        if not chunk_size or settled < chunk_size:
+            break
+        await session.commit()
+        market, resolution = await _lock_market_for_finalize(session, market_id)
+
+    # ثبت کارمزد پلتفرم در لجر
     if house_fee_amount > 0:
-        session.add(Ledger(
-            event_type=LedgerEventType.HOUSE_FEE,
-            amount=house_fee_amount,
-            currency="TON",
-            asset="TON",
-            network="TON",
-            description=f"House fee for market {market_id}",
-            idempotency_key=f"HOUSE_FEE:{market_id}"
-        ))
+        await session.execute(
+            pg_insert(Ledger)
+            .values(
+                id=uuid.uuid4(),
+                event_type=LedgerEventType.HOUSE_FEE,
+                amount=house_fee_amount,
+                currency=MARKET_ASSET,
+                asset=MARKET_ASSET,
+                network=MARKET_ASSET,
+                description=f"House fee for market {market_id}",
+                idempotency_key=f"HOUSE_FEE:{market_id}",
+                created_at=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing(index_elements=[Ledger.idempotency_key])
+        )
+
+    total_payouts = (
+        await session.execute(
+            select(func.coalesce(func.sum(Prediction.payout), zero)).where(
+                Prediction.market_id == market_id,
+                Prediction.account_context == "real",
+                Prediction.status == PredictionStatus.WON,
+            )
+        )
+    ).scalar_one()
+
+    left_open = (
+        await session.execute(
+            select(func.count()).select_from(Prediction).where(
+                Prediction.market_id == market_id,
+                Prediction.account_context == "real",
+                Prediction.status == PredictionStatus.OPEN,
+            )
+        )
+    ).scalar_one()
+    if left_open:
+        # بازار RESOLVED نمی‌شود؛ finalizer دوباره تلاش می‌کند
+        raise RuntimeError(f"Market {market_id}: {left_open} real prediction(s) still OPEN after settlement")
+
+    prop_accounts = await settle_prop_market(session, market_id, winning_direction)
 
     market.status = MarketStatus.RESOLVED
     resolution.is_finalized = True
     resolution.finalized_at = datetime.utcnow()
 
     await session.commit()
-    
+    mark_prop_accounts_dirty(prop_accounts, event=True)
+
     return {
         "market_id": market_id,
         "winning_pool": str(total_winning_pool),
         "house_fee": str(house_fee_amount),
-        "total_payouts": str(total_payouts)
+        "total_payouts": str(total_payouts),
+        "prop_accounts_settled": len(prop_accounts),
     }
@@ -0,0 +1,208 @@
+"""
+Market Finalizer
+تسویه خودکار بازارهای LOCAL بعد از پایان مهلت اعتراض (dispute_deadline)
+
+- heap درون‌حافظه‌ای از (dispute_deadline, market_id)؛ worker دقیقاً تا نزدیک‌ترین مهلت می‌خوابد
+- propose_resolution با schedule_market_finalization آن را بیدار می‌کند (بدون polling)
+- resync دوره‌ای از دیتابیس (index جزئی روی resolution های نهایی‌نشده) برای
+  restart / چند instance / resolution هایی که از مسیر دیگری ثبت شده‌اند
+- بازارهای دارای اعتراض (dispute_count > 0) خودکار تسویه نمی‌شوند و برای ادمین می‌مانند
+- idempotent: finalize_market ردیف بازار را FOR UPDATE قفل و وضعیت را دوباره چک می‌کند
+"""
+
+import asyncio
+import heapq
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+
+from src.database.connection import async_session
+from src.database.models import Market, MarketResolution, MarketStatus
+from src.core.services.alerts import alert_admin
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+FINALIZER_CONCURRENCY = _env_int("MARKET_FINALIZER_CONCURRENCY", 4)
+FINALIZER_RESYNC_SECONDS = _env_int("MARKET_FINALIZER_RESYNC_SECONDS", 300)
+FINALIZER_RETRY_SECONDS = _env_int("MARKET_FINALIZER_RETRY_SECONDS", 60)
+
+_heap: List[Tuple[datetime, str, uuid.UUID]] = []
+_deadlines: Dict[uuid.UUID, datetime] = {}
+_in_flight: Set[uuid.UUID] = set()
+_wake: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+
+def _event() -> asyncio.Event:
+    global _wake
+    if _wake is None:
+        _wake = asyncio.Event()
+    return _wake
+
+
+def schedule_market_finalization(market_id: uuid.UUID, deadline: datetime) -> None:
+    """ثبت / به‌روزرسانی مهلت یک بازار و بیدار کردن worker"""
+    if _deadlines.get(market_id) == deadline:
+        return
+    _deadlines[market_id] = deadline
+    # ورودی‌های قدیمی همان بازار در heap می‌مانند و هنگام pop نادیده گرفته می‌شوند
+    heapq.heappush(_heap, (deadline, str(market_id), market_id))
+    _event().set()
+
+
+def unschedule_market_finalization(market_id: uuid.UUID) -> None:
+    _deadlines.pop(market_id, None)
+
+
+async def resync_schedule() -> int:
+    """بارگذاری resolution های نهایی‌نشده و بدون اعتراض بازارهای PENDING_RESOLUTION"""
+    async with async_session() as session:
+        rows = (
+            await session.execute(
+                select(MarketResolution.market_id, MarketResolution.dispute_deadline)
+                .join(Market, Market.id == MarketResolution.market_id)
+                .where(
+                    MarketResolution.is_finalized.is_not(True),
+                    func.coalesce(MarketResolution.dispute_count, 0) == 0,
+                    Market.status == MarketStatus.PENDING_RESOLUTION,
+                )
+            )
+        ).all()
+
+    for row in rows:
+        # مهلت retry بعد از خطا (دیرتر از dispute_deadline) با resync به سررسید فوری برنگردد
+        stored = _deadlines.get(row.market_id)
+        deadline = max(stored, row.dispute_deadline) if stored is not None else row.dispute_deadline
+        schedule_market_finalization(row.market_id, deadline)
+    return len(rows)
+
+
+def _pop_due(now: datetime) -> List[uuid.UUID]:
+    due = []
+    while _heap and _heap[0][0] <= now:
+        deadline, _, market_id = heapq.heappop(_heap)
+        if _deadlines.get(market_id) != deadline or market_id in _in_flight:
+            continue
+        due.append(market_id)
+    return due
+
+
+def _seconds_until_next(now: datetime) -> float:
+    while _heap and _deadlines.get(_heap[0][2]) != _heap[0][0]:
+        heapq.heappop(_heap)
+    if not _heap:
+        return float(FINALIZER_RESYNC_SECONDS)
+    return max(0.0, min((_heap[0][0] - now).total_seconds(), FINALIZER_RESYNC_SECONDS))
+
+
+async def _finalize_one(market_id: uuid.UUID, sem: asyncio.Semaphore) -> str:
+    from src.core.services.local_market_service import finalize_market
+
+    async with sem:
+        try:
+            async with async_session() as session:
+                resolution = (
+                    await session.execute(
+                        select(MarketResolution).where(MarketResolution.market_id == market_id)
+                    )
+                ).scalar_one_or_none()
+
+                if resolution is None or resolution.is_finalized:
+                    unschedule_market_finalization(market_id)
+                    return "skipped"
+
+                if (resolution.dispute_count or 0) > 0:
+                    unschedule_market_finalization(market_id)
+                    await alert_admin(
+                        f"⚖️ Market {market_id}: dispute window closed with "
+                        f"{resolution.dispute_count} dispute(s) — manual finalize required"
+                    )
+                    return "disputed"
+
+                if resolution.dispute_deadline > datetime.utcnow():
+                    # مهلت تمدید شده
+                    schedule_market_finalization(market_id, resolution.dispute_deadline)
+                    return "rescheduled"
+
+                await session.rollback()
+                result = await finalize_market(session, market_id)
+
+            unschedule_market_finalization(market_id)
+            print(
+                f"🏁 Market {market_id} finalized: payouts {result['total_payouts']} "
+                f"| house fee {result['house_fee']}"
+            )
+            return "finalized"
+
+        except ValueError:
+            # وضعیت بازار دیگر PENDING_RESOLUTION نیست (instance دیگر / ادمین تسویه کرده)
+            unschedule_market_finalization(market_id)
+            return "skipped"
+        except Exception as e:
+            print(f"🚨 Market finalizer error ({market_id}): {e}")
+            await alert_admin(f"🚨 Market finalizer error ({market_id}): {e}")
+            schedule_market_finalization(market_id, datetime.utcnow() + timedelta(seconds=FINALIZER_RETRY_SECONDS))
+            return "error"
+
+
+async def _run_due(market_ids: List[uuid.UUID], sem: asyncio.Semaphore) -> None:
+    _in_flight.update(market_ids)
+    try:
+        await asyncio.gather(*[_finalize_one(mid, sem) for mid in market_ids])
+    finally:
+        _in_flight.difference_update(market_ids)
+        _event().set()
+
+
+async def run_market_finalizer() -> None:
+    sem = asyncio.Semaphore(FINALIZER_CONCURRENCY)
+    wake = _event()
+    last_resync: Optional[float] = None
+
+    print(f"🏁 Market finalizer started (concurrency {FINALIZER_CONCURRENCY}, resync {FINALIZER_RESYNC_SECONDS}s)")
+
+    while True:
+        loop_now = asyncio.get_running_loop().time()
+        if last_resync is None or loop_now - last_resync >= FINALIZER_RESYNC_SECONDS:
+            try:
+                await resync_schedule()
+            except Exception as e:
+                print(f"🚨 Market finalizer resync error: {e}")
+            last_resync = loop_now
+
+        due = _pop_due(datetime.utcnow())
+        if due:
+            asyncio.create_task(_run_due(due, sem))
+
+        wake.clear()
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=_seconds_until_next(datetime.utcnow()))
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_market_finalizer() -> asyncio.Task:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run_market_finalizer())
+    return _task
+
+
+async def stop_market_finalizer() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
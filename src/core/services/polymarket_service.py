@@ -1,16 +1,35 @@
+import asyncio
 import logging
+import os
 import uuid
 import json
-import httpx
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import select
+from sqlalchemy import exists, literal_column, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from dateutil.parser import parse
-from src.database.models import Market, MarketType, MarketStatus
+from src.database.models import (
+    Market, MarketType, MarketStatus, Prediction, PredictionDirection, PredictionStatus
+)
+from src.core.services.price_history_service import record_price_points
+from src.core.services.prop_evaluator import mark_prop_accounts_dirty
+from src.core.services.prop_service import settle_prop_market
+from src.core.utils.http_transport import register_provider, request, request_json
 
 POLYMARKET_API_URL = "https://gamma-api.polymarket.com/events"
 
+register_provider(
+    "polymarket",
+    ["https://gamma-api.polymarket.com"],
+    rate_per_sec=float(os.getenv("POLYMARKET_RPS", "5")),
+    headers={
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Accept": "application/json",
+    },
+    timeout=30.0,
+)
+
 _CATEGORY_MAP = [
     ("crypto", "Crypto"), ("bitcoin", "Crypto"), ("ethereum", "Crypto"), ("defi", "Crypto"),
     ("politic", "Politics"), ("election", "Politics"), ("president", "Politics"), ("government", "Politics"),
@@ -43,70 +62,398 @@ def _canonicalize_category(raw_category: str, title: str) -> str:
             return canonical
     return "Other"
 
+_PRICE_QUANT = Decimal("0.0001")  # Market.yes_price / no_price = Numeric(6, 4)
+_UPSERT_CHUNK = 1000  # حد پارامترهای asyncpg (۳۲۷۶۷) / تعداد ستون‌ها
+
+
+def _parse_prices(m: dict):
+    """(yes_price, no_price) از outcomePrices یا None"""
+    prices = m.get("outcomePrices", [])
+    if isinstance(prices, str):
+        try: prices = json.loads(prices)
+        except: return None
+    if not isinstance(prices, list) or len(prices) < 2:
+        return None
+
+    try:
+        return Decimal(str(prices[0])).quantize(_PRICE_QUANT), Decimal(str(prices[1])).quantize(_PRICE_QUANT)
+    except:
+        return None
+
+
+def _is_closed(m: dict) -> bool:
+    return str(m.get("closed")).lower() == "true"
+
+
+def _resolved_outcome(m: dict):
+    """"YES" / "NO" برای market بسته‌شده با قیمت قطعی (۱ / ۰)، در غیر این صورت None"""
+    if not _is_closed(m):
+        return None
+    prices = _parse_prices(m)
+    if prices == (Decimal("1"), Decimal("0")):
+        return "YES"
+    if prices == (Decimal("0"), Decimal("1")):
+        return "NO"
+    return None
+
+
+def _parse_event_markets(event: dict) -> list:
+    """تبدیل یک event پالی‌مارکت به ردیف‌های آماده upsert در جدول markets"""
+    rows = []
+    for m in event.get("markets", []):
+        condition_id = m.get("conditionId")
+        if not condition_id or str(m.get("active")).lower() != "true" or _is_closed(m):
+            continue
+
+        prices = _parse_prices(m)
+        if prices is None:
+            continue
+        yes_price, no_price = prices
+
+        title = m.get("question") or event.get("title") or ""
+        raw_cat = m.get("groupItemTitle") or event.get("category") or ""
+
+        end_date_str = m.get("endDate")
+        closes_at = parse(end_date_str).replace(tzinfo=None) if end_date_str else datetime.utcnow()
+
+        rows.append({
+            "polymarket_condition_id": condition_id,
+            "title": title,
+            "description": event.get("description", ""),
+            "category": _canonicalize_category(raw_cat, title),
+            "yes_price": yes_price,
+            "no_price": no_price,
+            "closes_at": closes_at,
+        })
+    return rows
+
+
+async def upsert_polymarket_markets(session: AsyncSession, rows: list) -> dict:
+    """
+    اعمال دسته‌ای ردیف‌های پالی‌مارکت:
+    - یک SELECT برای condition_id های موجود (فیلتر ردیف‌های بدون تغییر در پایتون)
+    - INSERT ... ON CONFLICT (polymarket_condition_id) DO UPDATE ... WHERE IS DISTINCT FROM
+      فقط برای ردیف‌های جدید / تغییرکرده
+    """
+    by_condition = {r["polymarket_condition_id"]: r for r in rows}
+    if not by_condition:
+        return {"added": 0, "updated": 0, "unchanged": 0, "changed": []}
+
+    existing = {
+        row.polymarket_condition_id: row
+        for row in (
+            await session.execute(
+                select(
+                    Market.polymarket_condition_id, Market.yes_price,
+                    Market.no_price, Market.category,
+                ).where(Market.polymarket_condition_id.in_(list(by_condition.keys())))
+            )
+        ).all()
+    }
+
+    pending = []
+    for condition_id, r in by_condition.items():
+        old = existing.get(condition_id)
+        if old is not None and (old.yes_price, old.no_price, old.category) == (r["yes_price"], r["no_price"], r["category"]):
+            continue
+        pending.append(r)
+
+    added = updated = 0
+    changed = []
+    now = datetime.utcnow()
+
+    for i in range(0, len(pending), _UPSERT_CHUNK):
+        chunk = pending[i:i + _UPSERT_CHUNK]
+        values = [
+            {
+                **r,
+                "id": uuid.uuid4(),
+                "market_type": MarketType.POLYMARKET,
+                "status": MarketStatus.ACTIVE,
+                "eligible_for_prop": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for r in chunk
+        ]
+        stmt = pg_insert(Market).values(values)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Market.polymarket_condition_id],
+            set_={
+                "yes_price": excluded.yes_price,
+                "no_price": excluded.no_price,
+                "category": excluded.category,
+                "updated_at": now,
+            },
+            where=or_(
+                Market.yes_price.is_distinct_from(excluded.yes_price),
+                Market.no_price.is_distinct_from(excluded.no_price),
+                Market.category.is_distinct_from(excluded.category),
+            ),
+        ).returning(
+            Market.id, Market.yes_price, Market.no_price,
+            # xmax = 0 → ردیف تازه درج شده (نه update)
+            literal_column("xmax = 0").label("inserted"),
+        )
+
+        for row in (await session.execute(stmt)).all():
+            if row.inserted:
+                added += 1
+            else:
+                updated += 1
+            changed.append({"market_id": row.id, "yes_price": row.yes_price, "no_price": row.no_price})
+
+    # سری زمانی قیمت: فقط ردیف‌های جدید / تغییرکرده، در همان تراکنش
+    if changed:
+        await record_price_points(session, changed, ts=now)
+
+    await session.commit()
+    return {
+        "added": added,
+        "updated": updated,
+        "unchanged": len(by_condition) - added - updated,
+        "changed": changed,
+    }
+
+
+def _parse_event_resolutions(event: dict) -> dict:
+    """market های بسته‌شده یک event با نتیجه قطعی: {condition_id: "YES" / "NO"}"""
+    out = {}
+    for m in event.get("markets", []):
+        condition_id = m.get("conditionId")
+        outcome = _resolved_outcome(m)
+        if condition_id and outcome:
+            out[condition_id] = outcome
+    return out
+
+
+async def resolve_polymarket_markets(session: AsyncSession, resolutions: dict) -> dict:
+    """
+    بستن بازارهای resolve‌شده پالی‌مارکت + تسویه پیش‌بینی‌های پراپ آن‌ها در یک تراکنش
+    resolutions: {condition_id: "YES" / "NO"}؛ بازارهایی که قبلاً RESOLVED شده‌اند رد می‌شوند
+    """
+    if not resolutions:
+        return {"resolved": 0, "prop_accounts": []}
+
+    rows = (
+        await session.execute(
+            update(Market)
+            .where(
+                Market.polymarket_condition_id.in_(list(resolutions.keys())),
+                Market.status.in_([MarketStatus.ACTIVE, MarketStatus.PENDING_RESOLUTION]),
+            )
+            .values(status=MarketStatus.RESOLVED, updated_at=datetime.utcnow())
+            .returning(Market.id, Market.polymarket_condition_id)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+
+    accounts = set()
+    for row in rows:
+        outcome = resolutions[row.polymarket_condition_id]
+        direction = PredictionDirection.YES if outcome == "YES" else PredictionDirection.NO
+        accounts.update(await settle_prop_market(session, row.id, direction))
+
+    await session.commit()
+    mark_prop_accounts_dirty(accounts, event=True)
+    return {"resolved": len(rows), "prop_accounts": list(accounts)}
+
+
+async def _overdue_condition_ids(session: AsyncSession) -> list:
+    """بازارهای پالی‌مارکت گذشته از closes_at که هنوز پیش‌بینی پراپ باز دارند (event آن‌ها دیگر در فید فعال نیست)"""
+    has_open_prop = exists().where(
+        Prediction.market_id == Market.id,
+        Prediction.account_context == "prop",
+        Prediction.status == PredictionStatus.OPEN,
+    )
+    return (
+        await session.execute(
+            select(Market.polymarket_condition_id)
+            .where(
+                Market.market_type == MarketType.POLYMARKET,
+                Market.status == MarketStatus.ACTIVE,
+                Market.closes_at < datetime.utcnow(),
+                has_open_prop,
+            )
+            .order_by(Market.closes_at)
+            .limit(RESOLVE_CHECK_LIMIT)
+        )
+    ).scalars().all()
+
+
+async def _fetch_resolutions(condition_ids: list) -> dict:
+    """وضعیت market های مشخص از /markets (دسته‌های RESOLVE_CHECK_BATCH تایی)"""
+    out = {}
+    for i in range(0, len(condition_ids), RESOLVE_CHECK_BATCH):
+        markets = await request_json(
+            "polymarket", "GET", "/markets",
+            params={"condition_ids": condition_ids[i:i + RESOLVE_CHECK_BATCH], "closed": "true"},
+        )
+        for m in markets or []:
+            outcome = _resolved_outcome(m)
+            if m.get("conditionId") and outcome:
+                out[m["conditionId"]] = outcome
+    return out
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+PAGE_SIZE = _env_int("POLYMARKET_PAGE_SIZE", 100)
+PAGE_CONCURRENCY = _env_int("POLYMARKET_PAGE_CONCURRENCY", 4)
+MAX_PAGES = _env_int("POLYMARKET_MAX_PAGES", 500)
+RESOLVE_CHECK_LIMIT = _env_int("POLYMARKET_RESOLVE_CHECK_LIMIT", 200)
+RESOLVE_CHECK_BATCH = 50
+
+# حافظه بین sync ها (فقط بعد از upsert موفق هر صفحه به‌روز می‌شود)
+_page_validators: dict = {}   # offset -> {"etag", "last_modified", "count"}
+_event_versions: dict = {}    # event id -> امضای updatedAt (event + markets)
+
+
+def _event_version(event: dict) -> str:
+    # قیمت‌ها روی updatedAt خود market اثر می‌گذارند، نه لزوماً روی event
+    stamps = [str(event.get("updatedAt") or "")]
+    stamps.extend(str(m.get("updatedAt") or "") for m in event.get("markets", []))
+    return "|".join(stamps)
+
+
+async def _fetch_page(offset: int) -> dict:
+    """یک صفحه از /events با If-None-Match / If-Modified-Since"""
+    headers = {}
+    cached = _page_validators.get(offset)
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    resp = await request(
+        "polymarket", "GET", "/events",
+        params={
+            "active": "true",
+            "closed": "false",
+            "limit": PAGE_SIZE,
+            "offset": offset,
+            "order": "id",
+            "ascending": "true",
+        },
+        headers=headers or None,
+    )
+    if resp.status_code == 304 and cached:
+        return {"offset": offset, "not_modified": True, "events": [], "count": cached.get("count", PAGE_SIZE)}
+
+    resp.raise_for_status()
+    events = resp.json()
+    return {
+        "offset": offset,
+        "not_modified": False,
+        "events": events,
+        "count": len(events),
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
 async def sync_polymarket_events(session: AsyncSession):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        "Accept": "application/json",
+    """
+    دریافت کل کاتالوگ فعال به صورت صفحه‌ای:
+    - حداکثر PAGE_CONCURRENCY درخواست صفحه همزمان؛ با اولین صفحه ناقص صفحه جدید شروع نمی‌شود
+    - هر صفحه به محض رسیدن وارد مرحله upsert می‌شود (صف)
+    - صفحه 304 و event های با updatedAt تکراری بدون پردازش رد می‌شوند
+    - market های بسته‌شده با نتیجه قطعی (و بازارهای گذشته از closes_at با پیش‌بینی پراپ باز)
+      در پایان resolve و پیش‌بینی‌های پراپشان تسویه می‌شوند
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PAGE_CONCURRENCY * 2)
+    state = {"next_offset": 0, "done": False}
+
+    async def _producer():
+        while not state["done"]:
+            offset = state["next_offset"]
+            if offset >= PAGE_SIZE * MAX_PAGES:
+                state["done"] = True
+                break
+            state["next_offset"] = offset + PAGE_SIZE
+            try:
+                page = await _fetch_page(offset)
+            except Exception as e:
+                state["done"] = True
+                await queue.put({"offset": offset, "error": e})
+                break
+            if page["count"] < PAGE_SIZE:
+                state["done"] = True
+            await queue.put(page)
+
+    async def _close_when_done(workers):
+        await asyncio.gather(*workers, return_exceptions=True)
+        await queue.put(None)
+
+    workers = [asyncio.create_task(_producer()) for _ in range(max(1, PAGE_CONCURRENCY))]
+    closer = asyncio.create_task(_close_when_done(workers))
+
+    totals = {
+        "added": 0, "updated": 0, "unchanged": 0, "changed": [],
+        "pages": 0, "not_modified_pages": 0, "skipped_events": 0, "errors": 0,
+        "resolved": 0, "prop_accounts": [],
     }
-    async with httpx.AsyncClient(timeout=30.0, headers=headers) as client:
-        response = await client.get(POLYMARKET_API_URL, params={"active": "true", "closed": "false", "limit": 100})
-        response.raise_for_status()
-        events = response.json()
-    
-    added_count = 0
-    updated_count = 0
-    
-    for event in events:
-        markets = event.get("markets", [])
-        for m in markets:
-            condition_id = m.get("conditionId")
-            if not condition_id or str(m.get("active")).lower() != "true":
-                continue
-                
-            prices = m.get("outcomePrices", [])
-            if isinstance(prices, str):
-                try: prices = json.loads(prices)
-                except: continue
-            if not isinstance(prices, list) or len(prices) < 2:
+    resolutions = {}
+    try:
+        while True:
+            page = await queue.get()
+            if page is None:
+                break
+            if "error" in page:
+                totals["errors"] += 1
+                print(f"🚨 Polymarket page offset={page['offset']} failed: {page['error']}")
                 continue
-                
-            try:
-                yes_price = Decimal(str(prices[0]))
-                no_price  = Decimal(str(prices[1]))
-            except:
+
+            totals["pages"] += 1
+            if page["not_modified"]:
+                totals["not_modified_pages"] += 1
                 continue
-                
-            title = m.get("question") or event.get("title") or ""
-            raw_cat = m.get("groupItemTitle") or event.get("category") or ""
-            canonical_category = _canonicalize_category(raw_cat, title)
-            
-            end_date_str = m.get("endDate")
-            closes_at = parse(end_date_str).replace(tzinfo=None) if end_date_str else datetime.utcnow()
-            
-            stmt = select(Market).where(Market.polymarket_condition_id == condition_id)
-            result = await session.execute(stmt)
-            existing_market = result.scalar_one_or_none()
-            
-            if existing_market:
-                existing_market.yes_price = yes_price
-                existing_market.no_price = no_price
-                existing_market.category = canonical_category
-                updated_count += 1
-            else:
-                new_market = Market(
-                    title=title,
-                    description=event.get("description", ""),
-                    category=canonical_category,
-                    market_type=MarketType.POLYMARKET,
-                    status=MarketStatus.ACTIVE,
-                    polymarket_condition_id=condition_id,
-                    yes_price=yes_price,
-                    no_price=no_price,
-                    closes_at=closes_at,
-                    eligible_for_prop=True
-                )
-                session.add(new_market)
-                added_count += 1
-                
-    await session.commit()
-    return {"added": added_count, "updated": updated_count}\n
\ No newline at end of file
+
+            rows, versions = [], {}
+            for event in page["events"]:
+                event_id = str(event.get("id") or "")
+                version = _event_version(event)
+                if event_id and _event_versions.get(event_id) == version:
+                    totals["skipped_events"] += 1
+                    continue
+                rows.extend(_parse_event_markets(event))
+                resolutions.update(_parse_event_resolutions(event))
+                if event_id:
+                    versions[event_id] = version
+
+            res = await upsert_polymarket_markets(session, rows)
+            for key in ("added", "updated", "unchanged"):
+                totals[key] += res[key]
+            totals["changed"].extend(res["changed"])
+
+            _event_versions.update(versions)
+            _page_validators[page["offset"]] = {
+                "etag": page.get("etag"),
+                "last_modified": page.get("last_modified"),
+                "count": page["count"],
+            }
+    finally:
+        state["done"] = True
+        for w in workers:
+            w.cancel()
+        closer.cancel()
+
+    try:
+        overdue = [c for c in await _overdue_condition_ids(session) if c not in resolutions]
+        if overdue:
+            resolutions.update(await _fetch_resolutions(overdue))
+    except Exception as e:
+        totals["errors"] += 1
+        print(f"🚨 Polymarket resolution check failed: {e}")
+
+    res = await resolve_polymarket_markets(session, resolutions)
+    totals["resolved"] = res["resolved"]
+    totals["prop_accounts"] = res["prop_accounts"]
+    return totals
@@ -0,0 +1,127 @@
+"""
+Price History Service
+سری زمانی قیمت بازارها (market_price_history، partition روزانه روی ts)
+
+- ثبت فقط هنگام تغییر قیمت (از upsert پالی‌مارکت، در همان تراکنش)
+- ساخت partition های روزهای آینده به صورت روزانه
+- خواندن بازه با downsampling سمت سرور (آخرین قیمت هر bucket)
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+import uuid
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import MarketPriceHistory
+from src.core.utils.timeseries import bucket_start
+
+PARTITION_DAYS_AHEAD = int(os.getenv("MARKET_PRICE_HISTORY_DAYS_AHEAD", "7"))
+_INSERT_CHUNK = 5000
+
+
+async def record_price_points(
+    session: AsyncSession,
+    changes: Iterable[dict],
+    ts: Optional[datetime] = None,
+) -> int:
+    """
+    ثبت نقاط قیمت (بدون commit؛ caller در همان تراکنش upsert commit می‌کند)
+    changes: [{"market_id", "yes_price", "no_price"}, ...]
+    """
+    ts = ts or datetime.utcnow()
+    rows = [
+        {"market_id": c["market_id"], "ts": ts, "yes_price": c["yes_price"], "no_price": c["no_price"]}
+        for c in changes
+    ]
+    for i in range(0, len(rows), _INSERT_CHUNK):
+        await session.execute(
+            pg_insert(MarketPriceHistory)
+            .values(rows[i:i + _INSERT_CHUNK])
+            .on_conflict_do_nothing()
+        )
+    return len(rows)
+
+
+async def ensure_price_history_partitions(session: AsyncSession, days_ahead: int = PARTITION_DAYS_AHEAD) -> List[str]:
+    """
+    ساخت partition روزانه برای امروز تا days_ahead روز بعد (+ partition پیش‌فرض)
+    روزی که قبلاً در default ردیف دارد رد می‌شود (همان‌جا می‌ماند)
+    """
+    await session.execute(text(
+        "CREATE TABLE IF NOT EXISTS market_price_history_default "
+        "PARTITION OF market_price_history DEFAULT"
+    ))
+
+    created = []
+    today = datetime.utcnow().date()
+    for i in range(0, days_ahead + 1):
+        day = today + timedelta(days=i)
+        name = f"market_price_history_{day:%Y%m%d}"
+        try:
+            async with session.begin_nested():
+                await session.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF market_price_history "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                ))
+            created.append(name)
+        except Exception as e:
+            print(f"⚠️ price history partition {name} skipped: {e}")
+
+    await session.commit()
+    return created
+
+
+async def get_price_history(
+    session: AsyncSession,
+    market_id: uuid.UUID,
+    start: datetime,
+    end: datetime,
+    resolution_seconds: int,
+) -> List[dict]:
+    """
+    نقاط قیمت در بازه [start, end]
+    resolution_seconds = 0: نقاط خام؛ در غیر این صورت آخرین قیمت هر bucket
+    آخرین نقطه قبل از start هم (با ts = start) برگردانده می‌شود تا نمودار از ابتدای بازه مقدار داشته باشد
+    """
+    h = MarketPriceHistory
+    in_range = (h.market_id == market_id, h.ts >= start, h.ts <= end)
+
+    seed = (
+        await session.execute(
+            select(h.yes_price, h.no_price)
+            .where(h.market_id == market_id, h.ts < start)
+            .order_by(h.ts.desc())
+            .limit(1)
+        )
+    ).one_or_none()
+
+    if resolution_seconds == 0:
+        rows = (
+            await session.execute(
+                select(h.ts, h.yes_price, h.no_price).where(*in_range).order_by(h.ts)
+            )
+        ).all()
+    else:
+        bucket = bucket_start(h.ts, resolution_seconds).label("ts")
+        rows = (
+            await session.execute(
+                select(
+                    bucket,
+                    func.array_agg(aggregate_order_by(h.yes_price, h.ts.desc()))[1].label("yes_price"),
+                    func.array_agg(aggregate_order_by(h.no_price, h.ts.desc()))[1].label("no_price"),
+                )
+                .where(*in_range)
+                .group_by(bucket)
+                .order_by(bucket)
+            )
+        ).all()
+
+    points = []
+    if seed is not None and (not rows or rows[0].ts > start):
+        points.append({"ts": start, "yes_price": seed.yes_price, "no_price": seed.no_price})
+    points.extend({"ts": r.ts, "yes_price": r.yes_price, "no_price": r.no_price} for r in rows)
+    return points
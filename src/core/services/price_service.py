@@ -3,29 +3,39 @@ Price Service
 گرفتن قیمت از Binance
 """
 
-import httpx
+import os
 from decimal import Decimal
 from typing import Optional
 
+from src.core.config import env_list
+from src.core.utils.http_transport import register_provider, request
+
 BINANCE_API = "https://api.binance.com/api/v3"
 
+register_provider(
+    "binance",
+    [BINANCE_API, *env_list("BINANCE_FALLBACK_URLS", "https://api1.binance.com/api/v3")],
+    rate_per_sec=float(os.getenv("BINANCE_RPS", "20")),
+    timeout=10.0,
+    max_retries=2,
+)
+
 
 async def get_current_price(symbol: str = "BTCUSDT") -> Optional[Decimal]:
     """
     گرفتن قیمت فعلی از Binance
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{BINANCE_API}/ticker/price",
-                params={"symbol": symbol}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return Decimal(data["price"])
-            
-            return None
+        response = await request(
+            "binance", "GET", "/ticker/price",
+            params={"symbol": symbol}
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            return Decimal(data["price"])
+        
+        return None
     except Exception as e:
         print(f"Error fetching price: {e}")
         return None
@@ -38,14 +48,13 @@ async def get_multiple_prices(symbols: list[str]) -> dict[str, Decimal]:
     prices = {}
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{BINANCE_API}/ticker/price")
-            
-            if response.status_code == 200:
-                data = response.json()
-                for item in data:
-                    if item["symbol"] in symbols:
-                        prices[item["symbol"]] = Decimal(item["price"])
+        response = await request("binance", "GET", "/ticker/price")
+        
+        if response.status_code == 200:
+            data = response.json()
+            for item in data:
+                if item["symbol"] in symbols:
+                    prices[item["symbol"]] = Decimal(item["price"])
     except Exception as e:
         print(f"Error fetching prices: {e}")
     
@@ -0,0 +1,117 @@
+"""
+Prop Equity Service
+منحنی اکوئیتی اکانت‌های پراپ (prop_equity_points)
+
+- ثبت از evaluate_prop_accounts (هر ارزیابی = باز / بسته شدن پوزیشن یا tick قیمت)
+- رویدادهای باز / بسته شدن همیشه ثبت می‌شوند؛ tick های mark-to-market فقط با تغییر
+  حداقل PROP_EQUITY_MIN_CHANGE_PCT نسبت به آخرین نقطه ثبت‌شده (محدود کردن حجم)
+- خواندن بازه با downsampling سمت سرور: bucket ثابت (آخرین مقدار هر bucket) یا LTTB
+"""
+
+import os
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import PropEquityPoint
+from src.core.utils.timeseries import bucket_start, lttb
+
+MIN_CHANGE_PCT = Decimal(os.getenv("PROP_EQUITY_MIN_CHANGE_PCT", "0.001"))
+_INSERT_CHUNK = 10000
+
+# آخرین اکوئیتی ثبت‌شده هر اکانت (cache درون‌حافظه‌ای؛ miss = ثبت)
+_last_recorded: Dict[uuid.UUID, Decimal] = {}
+
+
+def _should_record(account_id: uuid.UUID, equity: Decimal) -> bool:
+    last = _last_recorded.get(account_id)
+    if last is None or last == 0:
+        return True
+    return abs(equity - last) / abs(last) >= MIN_CHANGE_PCT
+
+
+async def record_equity_points(
+    session: AsyncSession,
+    equities: Dict[uuid.UUID, Decimal],
+    force: Iterable[uuid.UUID] = (),
+    ts: Optional[datetime] = None,
+) -> int:
+    """
+    ثبت نقاط اکوئیتی (بدون commit؛ caller در همان تراکنش ارزیابی commit می‌کند)
+    force: اکانت‌هایی که بدون در نظر گرفتن آستانه ثبت می‌شوند (باز / بسته شدن پوزیشن)
+    """
+    ts = ts or datetime.utcnow()
+    force = set(force)
+    rows = [
+        {"prop_account_id": account_id, "ts": ts, "equity": equity}
+        for account_id, equity in equities.items()
+        if account_id in force or _should_record(account_id, equity)
+    ]
+    for i in range(0, len(rows), _INSERT_CHUNK):
+        await session.execute(
+            pg_insert(PropEquityPoint)
+            .values(rows[i:i + _INSERT_CHUNK])
+            .on_conflict_do_nothing()
+        )
+    for r in rows:
+        _last_recorded[r["prop_account_id"]] = r["equity"]
+    return len(rows)
+
+
+async def get_equity_curve(
+    session: AsyncSession,
+    account_id: uuid.UUID,
+    start: datetime,
+    end: datetime,
+    resolution_seconds: Optional[int],
+    max_points: int,
+) -> List[dict]:
+    """
+    نقاط اکوئیتی در بازه [start, end]
+    resolution_seconds = 0: نقاط خام؛ None: LTTB تا max_points نقطه؛ در غیر این صورت آخرین مقدار هر bucket
+    آخرین نقطه قبل از start هم (با ts = start) برگردانده می‌شود تا نمودار از ابتدای بازه مقدار داشته باشد
+    """
+    p = PropEquityPoint
+    in_range = (p.prop_account_id == account_id, p.ts >= start, p.ts <= end)
+
+    seed = (
+        await session.execute(
+            select(p.equity)
+            .where(p.prop_account_id == account_id, p.ts < start)
+            .order_by(p.ts.desc())
+            .limit(1)
+        )
+    ).scalar_one_or_none()
+
+    if resolution_seconds:
+        bucket = bucket_start(p.ts, resolution_seconds).label("ts")
+        rows = (
+            await session.execute(
+                select(
+                    bucket,
+                    func.array_agg(aggregate_order_by(p.equity, p.ts.desc()))[1].label("equity"),
+                )
+                .where(*in_range)
+                .group_by(bucket)
+                .order_by(bucket)
+            )
+        ).all()
+    else:
+        rows = (
+            await session.execute(select(p.ts, p.equity).where(*in_range).order_by(p.ts))
+        ).all()
+
+    points = []
+    if seed is not None and (not rows or rows[0].ts > start):
+        points.append({"ts": start, "equity": seed})
+    points.extend({"ts": r.ts, "equity": r.equity} for r in rows)
+
+    if resolution_seconds is None and len(points) > max_points:
+        keep = lttb([((pt["ts"] - start).total_seconds(), float(pt["equity"])) for pt in points], max_points)
+        points = [points[i] for i in keep]
+    return points
@@ -0,0 +1,262 @@
+"""
+Prop Evaluator (event-driven)
+ارزیابی فوری اکانت‌های پراپ فقط وقتی چیزی برایشان تغییر کرده
+
+- mark_prop_accounts_dirty: بعد از ثبت / تسویه پیش‌بینی پراپ (بعد از commit)
+- mark_markets_moved: بعد از تغییر قیمت بازارها؛ فقط اکانت‌هایی که روی آن بازارها پوزیشن باز دارند
+- worker با debounce کوتاه اکانت‌های dirty را دسته‌ای با evaluate_prop_accounts(account_ids=...) ارزیابی می‌کند
+- sweep دوره‌ای کامل (PROP_SWEEP_MINUTES) فقط به عنوان safety net باقی می‌ماند
+- event=True (باز / بسته شدن پوزیشن): نقطه منحنی اکوئیتی بدون آستانه تغییر ثبت می‌شود
+
+چند worker / چند process: فقط یک evaluator (leader) فعال است؛ leader با pg_try_advisory_lock روی
+یک اتصال اختصاصی انتخاب می‌شود و روی همان اتصال LISTEN prop_dirty می‌کند. بقیه‌ی process ها
+(worker های دیگر uvicorn، جاب sync قیمت، ...) account id های dirty را با pg_notify منتشر می‌کنند.
+با قطع اتصال leader قفل آزاد و worker دیگری leader می‌شود؛ رویدادهای بدون leader را sweep پوشش می‌دهد.
+"""
+
+import asyncio
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional, Set
+
+import asyncpg
+from sqlalchemy import func, select
+
+from src.core.config import get_settings
+from src.database.connection import async_session
+from src.database.models import Prediction, PredictionStatus
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+DEBOUNCE_MS = _env_int("PROP_EVAL_DEBOUNCE_MS", 200)
+EVAL_CHUNK = _env_int("PROP_EVAL_CHUNK", 5000)
+SWEEP_MINUTES = _env_int("PROP_SWEEP_MINUTES", 15)
+LEADER_RETRY_SECONDS = _env_int("PROP_EVAL_LEADER_RETRY_SECONDS", 10)
+
+CHANNEL = "prop_dirty"
+LEADER_LOCK_KEY = 0x70726F70  # "prop"
+_NOTIFY_BATCH = 200  # payload NOTIFY حداکثر 8000 بایت (هر uuid 37 بایت)
+
+_dirty: Set[uuid.UUID] = set()
+_events: Set[uuid.UUID] = set()
+_outbox: Dict[uuid.UUID, bool] = {}
+_leader = False
+_wake: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+_publisher: Optional[asyncio.Task] = None
+
+
+def _event() -> asyncio.Event:
+    global _wake
+    if _wake is None:
+        _wake = asyncio.Event()
+    return _wake
+
+
+def _enqueue(account_ids: Iterable[uuid.UUID], event: bool) -> None:
+    account_ids = list(account_ids)
+    before = len(_dirty)
+    _dirty.update(account_ids)
+    if event:
+        _events.update(account_ids)
+    if len(_dirty) != before or event:
+        _event().set()
+
+
+def mark_prop_accounts_dirty(account_ids: Iterable[uuid.UUID], event: bool = False) -> None:
+    """
+    leader همین process است → صف محلی؛ وگرنه pg_notify به leader (در هر process که باشد)
+    بدون event loop (اسکریپت sync) کاری نمی‌کند و sweep پوشش می‌دهد
+    """
+    account_ids = [a for a in account_ids if a is not None]
+    if not account_ids:
+        return
+    if _leader:
+        _enqueue(account_ids, event)
+        return
+    for account_id in account_ids:
+        _outbox[account_id] = _outbox.get(account_id, False) or event
+    _schedule_publish()
+
+
+def _schedule_publish() -> None:
+    global _publisher
+    if _publisher is not None and not _publisher.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _publisher = loop.create_task(_publish())
+
+
+def _payloads(items: List[tuple]) -> List[str]:
+    out = []
+    for flag, prefix in ((True, "e:"), (False, "d:")):
+        ids = [str(a) for a, event in items if event == flag]
+        for i in range(0, len(ids), _NOTIFY_BATCH):
+            out.append(prefix + ",".join(ids[i:i + _NOTIFY_BATCH]))
+    return out
+
+
+async def _publish() -> None:
+    while _outbox:
+        items = list(_outbox.items())
+        _outbox.clear()
+        if _leader:
+            for flag in (True, False):
+                _enqueue((a for a, event in items if event == flag), flag)
+            continue
+        try:
+            async with async_session() as session:
+                for payload in _payloads(items):
+                    await session.execute(select(func.pg_notify(CHANNEL, payload)))
+                await session.commit()
+        except Exception as e:
+            print(f"🚨 Prop dirty publish error: {e}")
+
+
+def _on_notify(connection, pid, channel, payload: str) -> None:
+    flag, _, ids = payload.partition(":")
+    account_ids = []
+    for raw in ids.split(","):
+        try:
+            account_ids.append(uuid.UUID(raw))
+        except ValueError:
+            continue
+    _enqueue(account_ids, flag == "e")
+
+
+async def mark_markets_moved(market_ids: Iterable[uuid.UUID]) -> int:
+    """اکانت‌های دارای پیش‌بینی پراپ باز روی بازارهای تغییرکرده → dirty"""
+    market_ids = list(set(market_ids))
+    if not market_ids:
+        return 0
+
+    async with async_session() as session:
+        account_ids = (
+            await session.execute(
+                select(Prediction.prop_account_id)
+                .where(
+                    Prediction.market_id.in_(market_ids),
+                    Prediction.account_context == "prop",
+                    Prediction.status == PredictionStatus.OPEN,
+                    Prediction.prop_account_id.is_not(None),
+                )
+                .distinct()
+            )
+        ).scalars().all()
+
+    mark_prop_accounts_dirty(account_ids)
+    return len(account_ids)
+
+
+async def _evaluate_dirty() -> dict:
+    from src.core.services.prop_service import evaluate_prop_accounts
+
+    batch = list(_dirty)
+    forced = set(_events)
+    _dirty.clear()
+    _events.clear()
+
+    totals: dict = {}
+    for i in range(0, len(batch), EVAL_CHUNK):
+        chunk = batch[i:i + EVAL_CHUNK]
+        try:
+            async with async_session() as session:
+                res = await evaluate_prop_accounts(
+                    session, account_ids=chunk, force_points=forced.intersection(chunk)
+                )
+        except Exception as e:
+            # دوباره dirty تا دور بعد امتحان شود
+            _dirty.update(chunk)
+            _events.update(forced.intersection(chunk))
+            print(f"🚨 Prop evaluator error: {e}")
+            continue
+        for key, value in res.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _listen_dsn() -> str:
+    # asyncpg مستقیم (اتصال LISTEN خارج از pool SQLAlchemy)
+    return get_settings().database_url.replace("postgresql+asyncpg://", "postgresql://")
+
+
+async def _evaluate_loop(conn: "asyncpg.Connection") -> None:
+    wake = _event()
+    while not conn.is_closed():
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=LEADER_RETRY_SECONDS)
+        except asyncio.TimeoutError:
+            continue
+        wake.clear()
+        # debounce: رویدادهای نزدیک به هم در یک ارزیابی جمع می‌شوند
+        await asyncio.sleep(DEBOUNCE_MS / 1000)
+        if not _dirty:
+            continue
+
+        res = await _evaluate_dirty()
+        changed = {k: v for k, v in res.items() if k not in ("evaluated", "equity_points") and v}
+        if changed:
+            print(f"⚖️ Prop evaluator: {res}")
+        if _dirty:
+            wake.set()
+    raise ConnectionError("LISTEN connection closed")
+
+
+async def run_prop_evaluator() -> None:
+    global _leader
+    print(f"⚖️ Prop evaluator started (debounce {DEBOUNCE_MS}ms, sweep every {SWEEP_MINUTES}m)")
+
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(_listen_dsn())
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", LEADER_LOCK_KEY):
+                # leader دیگری فعال است؛ این process فقط منتشر می‌کند
+                await conn.close()
+                await asyncio.sleep(LEADER_RETRY_SECONDS)
+                continue
+
+            await conn.add_listener(CHANNEL, _on_notify)
+            _leader = True
+            print(f"⚖️ Prop evaluator: leader (LISTEN {CHANNEL})")
+            await _evaluate_loop(conn)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"🚨 Prop evaluator error: {e}")
+            await asyncio.sleep(LEADER_RETRY_SECONDS)
+        finally:
+            _leader = False
+            if conn is not None and not conn.is_closed():
+                # بستن اتصال قفل session را آزاد می‌کند
+                try:
+                    await conn.close()
+                except Exception:
+                    pass
+
+
+def start_prop_evaluator() -> asyncio.Task:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run_prop_evaluator())
+    return _task
+
+
+async def stop_prop_evaluator() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,117 @@
+"""
+Prop Mark-to-Market
+ارزش‌گذاری لحظه‌ای پوزیشن‌های باز پراپ با قیمت فعلی بازار
+
+- یک SELECT: پیش‌بینی‌های باز پراپ + entry_price + yes_price / no_price فعلی بازار
+- محاسبه برداری با NumPy (بدون حلقه Decimal روی هر ردیف) و جمع per-account با bincount
+- هر پوزیشن amount / entry_price سهم است؛ ارزش فعلی = سهم × قیمت فعلی همان سمت
+- اگر entry_price یا قیمت فعلی در دسترس نباشد، پوزیشن به قیمت تمام‌شده (amount) حساب می‌شود
+"""
+
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import (
+    Market, Prediction, PredictionDirection, PredictionStatus, PropAccount, PropStatus
+)
+
+_QUANT = Decimal("0.00000001")
+
+
+@dataclass
+class AccountMark:
+    open_exposure: Decimal   # مجموع amount پوزیشن‌های باز (قیمت تمام‌شده)
+    market_value: Decimal    # ارزش فعلی همان پوزیشن‌ها
+    positions: int
+
+    @property
+    def unrealized_pnl(self) -> Decimal:
+        return self.market_value - self.open_exposure
+
+
+EMPTY_MARK = AccountMark(Decimal("0"), Decimal("0"), 0)
+
+
+def _positions_query(account_ids: Optional[Iterable[uuid.UUID]] = None):
+    stmt = (
+        select(
+            Prediction.prop_account_id,
+            Prediction.amount,
+            Prediction.entry_price,
+            (Prediction.direction == PredictionDirection.YES).label("is_yes"),
+            Market.yes_price,
+            Market.no_price,
+        )
+        .join(Market, Market.id == Prediction.market_id)
+        .where(
+            Prediction.status == PredictionStatus.OPEN,
+            Prediction.prop_account_id.is_not(None),
+        )
+    )
+    if account_ids is not None:
+        return stmt.where(Prediction.prop_account_id.in_(list(account_ids)))
+    return stmt.join(PropAccount, PropAccount.id == Prediction.prop_account_id).where(
+        PropAccount.status == PropStatus.ACTIVE
+    )
+
+
+def _floats(values, count: int) -> np.ndarray:
+    return np.fromiter((np.nan if v is None else float(v) for v in values), dtype=np.float64, count=count)
+
+
+def _to_decimal(value: float) -> Decimal:
+    return Decimal(repr(float(value))).quantize(_QUANT)
+
+
+def mark_positions(rows) -> Dict[uuid.UUID, AccountMark]:
+    """
+    rows: خروجی _positions_query
+    خروجی: {prop_account_id: AccountMark}
+    """
+    n = len(rows)
+    if n == 0:
+        return {}
+
+    account_ids, amounts, entries, is_yes, yes_prices, no_prices = zip(*rows)
+
+    index: Dict[uuid.UUID, int] = {}
+    codes = np.fromiter((index.setdefault(a, len(index)) for a in account_ids), dtype=np.int64, count=n)
+    amount = _floats(amounts, n)
+    entry = _floats(entries, n)
+    current = np.where(
+        np.fromiter(is_yes, dtype=bool, count=n),
+        _floats(yes_prices, n),
+        _floats(no_prices, n),
+    )
+
+    priced = np.isfinite(entry) & (entry > 0) & np.isfinite(current)
+    ratio = np.divide(current, entry, out=np.ones(n), where=priced)
+    value = amount * ratio
+
+    k = len(index)
+    exposure = np.bincount(codes, weights=amount, minlength=k)
+    market_value = np.bincount(codes, weights=value, minlength=k)
+    counts = np.bincount(codes, minlength=k)
+
+    return {
+        account_id: AccountMark(_to_decimal(exposure[i]), _to_decimal(market_value[i]), int(counts[i]))
+        for account_id, i in index.items()
+    }
+
+
+async def mark_to_market(
+    session: AsyncSession,
+    account_ids: Optional[Iterable[uuid.UUID]] = None,
+) -> Dict[uuid.UUID, AccountMark]:
+    """
+    ارزش لحظه‌ای پوزیشن‌های باز account_ids (None = همه اکانت‌های ACTIVE)
+    اکانت بدون پوزیشن باز در خروجی نیست (EMPTY_MARK)
+    """
+    rows = (await session.execute(_positions_query(account_ids))).all()
+    return mark_positions(rows)
@@ -1,13 +1,17 @@
 import uuid
 from decimal import Decimal
 from datetime import datetime
-from sqlalchemy import select, func
+from sqlalchemy import Numeric, and_, bindparam, case, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.services.prop_evaluator import mark_prop_accounts_dirty
+from src.core.services.prop_mtm import EMPTY_MARK, AccountMark, mark_to_market
+from src.core.services.prop_equity_service import record_equity_points
 from src.database.models import (
     Market, PropAccount, PropStatus, PropPhase, 
     Prediction, PredictionStatus, PredictionDirection, 
-    DailyEquitySnapshot, Balance, Ledger, LedgerEventType
+    DailyEquitySnapshot, PropEquityPoint, Balance, Ledger, LedgerEventType
 )
 
 # === پارامترهای طلایی سیستم پراپ ===
@@ -71,6 +75,8 @@ async def buy_prop_challenge(
         start_of_day_equity=account_size
     )
     session.add(snapshot)
+    # نقطه شروع منحنی اکوئیتی
+    session.add(PropEquityPoint(prop_account_id=prop_account.id, ts=prop_account.started_at, equity=account_size))
     
     # ثبت رویداد در لجر (درآمد پلتفرم)
     ledger = Ledger(
@@ -121,16 +127,13 @@ async def place_prop_prediction(
     if prop_account.virtual_balance < amount:
         raise ValueError("Insufficient virtual balance.")
 
-    stmt_open_trades = select(func.count(Prediction.id)).where(
-        Prediction.prop_account_id == prop_account_id,
-        Prediction.status == PredictionStatus.OPEN
-    )
-    open_trades_count = (await session.execute(stmt_open_trades)).scalar()
-    
-    if open_trades_count >= MAX_OPEN_TRADES:
+    # شمارنده روی همین ردیف قفل‌شده (بدون count روی predictions)
+    if prop_account.open_trades >= MAX_OPEN_TRADES:
         raise ValueError(f"Maximum of {MAX_OPEN_TRADES} concurrent open trades reached.")
 
     prop_account.virtual_balance -= amount
+    prop_account.open_trades += 1
+    prop_account.open_exposure += amount
     
     prediction = Prediction(
         user_id=prop_account.user_id,
@@ -144,77 +147,340 @@ async def place_prop_prediction(
     
     session.add(prediction)
     await session.commit()
-    
+
+    # ارزیابی فوری قوانین همین اکانت (+ نقطه منحنی اکوئیتی)
+    mark_prop_accounts_dirty([prop_account.id], event=True)
     return prediction
 
 
-async def evaluate_prop_accounts(session: AsyncSession):
-    """موتور ارزیاب: بررسی مداوم وضعیت اکانت‌ها (Drawdown و Target)"""
-    stmt = select(PropAccount).where(PropAccount.status == PropStatus.ACTIVE)
-    active_accounts = (await session.execute(stmt)).scalars().all()
-    
-    for account in active_accounts:
-        # محاسبه میزان سرمایه درگیر در پیش‌بینی‌های باز
-        stmt_pending = select(func.sum(Prediction.amount)).where(
-            Prediction.prop_account_id == account.id,
-            Prediction.status == PredictionStatus.OPEN
+async def settle_prop_market(
+    session: AsyncSession,
+    market_id: uuid.UUID,
+    winning_direction: PredictionDirection,
+) -> list:
+    """
+    تسویه دسته‌ای پیش‌بینی‌های پراپ یک بازار resolve‌شده (بدون commit؛ caller commit می‌کند)
+
+    payout قیمت‌محور: برنده amount / entry_price (هر سهم ۱ دلار)، بازنده ۰
+    یک statement: UPDATE predictions ... RETURNING (CTE) + UPDATE گروهی prop_accounts
+    idempotent: فقط پیش‌بینی‌های OPEN تسویه می‌شوند
+    خروجی: آیدی اکانت‌های تغییرکرده (برای mark_prop_accounts_dirty بعد از commit)
+    """
+    now = datetime.utcnow()
+    is_win = Prediction.direction == winning_direction
+    # بدون entry_price → قیمت ۰.۵ (ضریب ۲)
+    entry = func.coalesce(func.nullif(Prediction.entry_price, 0), literal(Decimal("0.5"), Numeric))
+    zero = literal(Decimal("0"), Numeric)
+
+    settled = (
+        update(Prediction)
+        .where(
+            Prediction.market_id == market_id,
+            Prediction.account_context == "prop",
+            Prediction.prop_account_id.is_not(None),
+            Prediction.status == PredictionStatus.OPEN,
         )
-        pending_amount = (await session.execute(stmt_pending)).scalar() or Decimal("0")
-        
-        # اکوئیتی لحظه‌ای: موجودی مجازی آزاد + پولی که در بازار درگیر است
-        current_equity = account.virtual_balance + pending_amount
-        
-        # دریافت اکوئیتی شروع روز
-        stmt_snap = select(DailyEquitySnapshot).where(
-            DailyEquitySnapshot.prop_account_id == account.id
-        ).order_by(DailyEquitySnapshot.date.desc()).limit(1)
-        snapshot = (await session.execute(stmt_snap)).scalar_one_or_none()
-        
-        start_of_day_equity = snapshot.start_of_day_equity if snapshot else account.starting_balance
-        
-        # ۱. بررسی افت روزانه (۴٪)
-        daily_dd_limit = start_of_day_equity * (Decimal("1") - MAX_DAILY_DD)
-        if current_equity <= daily_dd_limit:
-            account.status = PropStatus.BREACHED
-            continue
-            
-        # ۲. بررسی افت کل (۸٪ استاتیک)
-        total_dd_limit = account.starting_balance * (Decimal("1") - MAX_TOTAL_DD)
-        if current_equity <= total_dd_limit:
-            account.status = PropStatus.BREACHED
+        .values(
+            status=case(
+                (is_win, literal(PredictionStatus.WON, Prediction.status.type)),
+                else_=literal(PredictionStatus.LOST, Prediction.status.type),
+            ),
+            is_correct=is_win,
+            payout=case((is_win, Prediction.amount / entry), else_=zero),
+            exit_price=case((is_win, literal(Decimal("1"), Numeric)), else_=zero),
+            resolved_at=now,
+        )
+        .returning(Prediction.prop_account_id, Prediction.amount, Prediction.payout, Prediction.is_correct)
+        .cte("settled")
+    )
+
+    totals = (
+        select(
+            settled.c.prop_account_id.label("account_id"),
+            func.sum(settled.c.payout).label("payout"),
+            func.sum(settled.c.amount).label("exposure"),
+            func.sum(settled.c.payout - settled.c.amount).label("pnl"),
+            func.count().label("trades"),
+            func.count().filter(settled.c.is_correct.is_(True)).label("wins"),
+        )
+        .group_by(settled.c.prop_account_id)
+        .subquery()
+    )
+
+    new_balance = PropAccount.virtual_balance + totals.c.payout
+    account_ids = (
+        await session.execute(
+            update(PropAccount)
+            .where(PropAccount.id == totals.c.account_id)
+            .values(
+                virtual_balance=new_balance,
+                peak_balance=func.greatest(PropAccount.peak_balance, new_balance),
+                realized_pnl=PropAccount.realized_pnl + totals.c.pnl,
+                total_predictions=PropAccount.total_predictions + totals.c.trades,
+                winning_predictions=PropAccount.winning_predictions + totals.c.wins,
+                losing_predictions=PropAccount.losing_predictions + totals.c.trades - totals.c.wins,
+                open_trades=PropAccount.open_trades - totals.c.trades,
+                open_exposure=PropAccount.open_exposure - totals.c.exposure,
+                updated_at=now,
+            )
+            .returning(PropAccount.id)
+            .execution_options(synchronize_session=False)
+        )
+    ).scalars().all()
+    return list(account_ids)
+
+
+def _cost_mark(account) -> AccountMark:
+    """ارزش پوزیشن‌ها به قیمت تمام‌شده (از شمارنده‌ها) وقتی قیمت لحظه‌ای در دسترس نیست"""
+    if not account.open_trades:
+        return EMPTY_MARK
+    exposure = Decimal(account.open_exposure)
+    return AccountMark(exposure, exposure, account.open_trades)
+
+
+async def verify_prop_open_counters(session: AsyncSession, fix: bool = True) -> list:
+    """
+    مقایسه open_trades / open_exposure با پیش‌بینی‌های باز واقعی (تشخیص drift)
+    fix=True: مقدار درست نوشته می‌شود؛ خروجی: لیست اختلاف‌ها
+    """
+    actual = (
+        select(
+            Prediction.prop_account_id.label("account_id"),
+            func.count().label("trades"),
+            func.sum(Prediction.amount).label("exposure"),
+        )
+        .where(Prediction.prop_account_id.is_not(None), Prediction.status == PredictionStatus.OPEN)
+        .group_by(Prediction.prop_account_id)
+        .subquery()
+    )
+    trades = func.coalesce(actual.c.trades, 0)
+    exposure = func.coalesce(actual.c.exposure, 0)
+
+    drift = (
+        await session.execute(
+            select(
+                PropAccount.id,
+                PropAccount.open_trades,
+                PropAccount.open_exposure,
+                trades.label("actual_trades"),
+                exposure.label("actual_exposure"),
+            )
+            .outerjoin(actual, actual.c.account_id == PropAccount.id)
+            .where((PropAccount.open_trades != trades) | (PropAccount.open_exposure != exposure))
+        )
+    ).all()
+
+    if drift and fix:
+        t = PropAccount.__table__
+        await session.execute(
+            update(t)
+            .where(t.c.id == bindparam("b_id"))
+            .values(open_trades=bindparam("b_trades"), open_exposure=bindparam("b_exposure")),
+            [{"b_id": d.id, "b_trades": d.actual_trades, "b_exposure": d.actual_exposure} for d in drift],
+        )
+        await session.commit()
+        mark_prop_accounts_dirty(d.id for d in drift)
+
+    return [
+        {
+            "prop_account_id": str(d.id),
+            "open_trades": d.open_trades,
+            "actual_trades": d.actual_trades,
+            "open_exposure": str(d.open_exposure),
+            "actual_exposure": str(d.actual_exposure),
+        }
+        for d in drift
+    ]
+
+
+# نتیجه قوانین برای هر اکانت
+BREACH = "breach"
+PASS = "pass"
+FUND = "fund"
+
+
+def _apply_rules(
+    phase: PropPhase,
+    equity: Decimal,
+    start_of_day_equity: Decimal,
+    starting_balance: Decimal,
+    open_exposure: Decimal,
+):
+    """قوانین پراپ برای یک اکانت: BREACH / PASS / FUND یا None"""
+    # ۱. بررسی افت روزانه (۴٪)
+    if equity <= start_of_day_equity * (Decimal("1") - MAX_DAILY_DD):
+        return BREACH
+
+    # ۲. بررسی افت کل (۸٪ استاتیک)
+    if equity <= starting_balance * (Decimal("1") - MAX_TOTAL_DD):
+        return BREACH
+
+    # ۳. بررسی تارگت سود (فقط زمانی که هیچ پیش‌بینی بازی وجود نداشته باشد)
+    if open_exposure == 0:
+        if phase == PropPhase.PHASE1 and equity >= starting_balance * (Decimal("1") + PHASE_1_TARGET):
+            return PASS
+        if phase == PropPhase.PHASE2 and equity >= starting_balance * (Decimal("1") + PHASE_2_TARGET):
+            return FUND
+    return None
+
+
+def _open_market_value_query():
+    """
+    ارزش فعلی پیش‌بینی‌های باز هر اکانت پراپ (GROUP BY) — همان فرمول prop_mtm سمت SQL
+    (amount / entry_price) × قیمت فعلی همان سمت؛ بدون قیمت → amount
+    """
+    current_price = case(
+        (Prediction.direction == PredictionDirection.YES, Market.yes_price),
+        else_=Market.no_price,
+    )
+    value = case(
+        (and_(Prediction.entry_price > 0, current_price.is_not(None)),
+         Prediction.amount * current_price / Prediction.entry_price),
+        else_=Prediction.amount,
+    )
+    return (
+        select(
+            Prediction.prop_account_id.label("account_id"),
+            func.sum(value).label("open_value"),
+        )
+        .join(Market, Market.id == Prediction.market_id)
+        .where(
+            Prediction.prop_account_id.is_not(None),
+            Prediction.status == PredictionStatus.OPEN,
+        )
+        .group_by(Prediction.prop_account_id)
+    )
+
+
+def _evaluation_query(account_ids=None):
+    """
+    یک SELECT برای همه اکانت‌های ACTIVE (با شمارنده‌های open_trades / open_exposure) + آخرین اسنپ‌شات (DISTINCT ON)
+    پوزیشن‌های باز فقط برای اکانت‌های open_trades > 0 با prop_mtm ارزش‌گذاری می‌شوند
+    """
+    latest_snapshot = (
+        select(
+            DailyEquitySnapshot.prop_account_id.label("account_id"),
+            DailyEquitySnapshot.start_of_day_equity,
+        )
+        .distinct(DailyEquitySnapshot.prop_account_id)
+        .order_by(DailyEquitySnapshot.prop_account_id, DailyEquitySnapshot.date.desc())
+    )
+    if account_ids is not None:
+        latest_snapshot = latest_snapshot.where(DailyEquitySnapshot.prop_account_id.in_(account_ids))
+    latest_snapshot = latest_snapshot.subquery()
+
+    stmt = (
+        select(
+            PropAccount.id,
+            PropAccount.phase,
+            PropAccount.virtual_balance,
+            PropAccount.starting_balance,
+            PropAccount.open_trades,
+            PropAccount.open_exposure,
+            func.coalesce(latest_snapshot.c.start_of_day_equity, PropAccount.starting_balance).label("start_of_day_equity"),
+        )
+        .outerjoin(latest_snapshot, latest_snapshot.c.account_id == PropAccount.id)
+        .where(PropAccount.status == PropStatus.ACTIVE)
+    )
+    if account_ids is not None:
+        stmt = stmt.where(PropAccount.id.in_(account_ids))
+    return stmt
+
+
+async def evaluate_prop_accounts(session: AsyncSession, account_ids=None, force_points=()) -> dict:
+    """
+    موتور ارزیاب: بررسی وضعیت اکانت‌ها (Drawdown و Target)
+
+    یک SELECT برای همه اکانت‌ها + mark-to-market برداری پوزیشن‌های باز
+    + یک UPDATE دسته‌ای (executemany) برای تغییرات وضعیت
+    account_ids: فقط همین اکانت‌ها (ارزیابی رویدادی)؛ None = همه اکانت‌های ACTIVE
+    اکوئیتی هر اکانت در prop_equity_points ثبت می‌شود (force_points بدون آستانه تغییر)
+    - BREACH: status=FAILED, phase=BREACHED
+    - PASS (فاز ۱): status=PASSED
+    - FUND (فاز ۲): status=PASSED, phase=FUNDED
+    """
+    if account_ids is not None:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {"evaluated": 0, BREACH: 0, PASS: 0, FUND: 0}
+
+    rows = (await session.execute(_evaluation_query(account_ids))).all()
+    holding = [row.id for row in rows if row.open_trades > 0]
+    marks = {}
+    if holding:
+        marks = await mark_to_market(session, None if account_ids is None else holding)
+
+    now = datetime.utcnow()
+    changes = []
+    out = {"evaluated": len(rows), BREACH: 0, PASS: 0, FUND: 0}
+    equities = {}
+    for row in rows:
+        mark = marks.get(row.id) or _cost_mark(row)
+        # اکوئیتی لحظه‌ای: موجودی مجازی آزاد + ارزش فعلی پوزیشن‌های باز
+        equity = row.virtual_balance + mark.market_value
+        equities[row.id] = equity
+        result = _apply_rules(row.phase, equity, Decimal(row.start_of_day_equity), row.starting_balance, mark.open_exposure)
+        if result is None:
             continue
-            
-        # ۳. بررسی تارگت سود (فقط زمانی که هیچ پیش‌بینی بازی وجود نداشته باشد)
-        if pending_amount == Decimal("0"):
-            if account.phase == PropPhase.PHASE1:
-                target = account.starting_balance * (Decimal("1") + PHASE_1_TARGET)
-                if current_equity >= target:
-                    account.status = PropStatus.PASSED
-            elif account.phase == PropPhase.PHASE2:
-                target = account.starting_balance * (Decimal("1") + PHASE_2_TARGET)
-                if current_equity >= target:
-                    account.status = PropStatus.FUNDED
-    
-    await session.commit()
 
+        out[result] += 1
+        if result == BREACH:
+            changes.append({"b_id": row.id, "b_status": PropStatus.FAILED, "b_phase": PropPhase.BREACHED,
+                            "b_passed_at": None, "b_failed_at": now, "b_funded_at": None})
+        elif result == PASS:
+            changes.append({"b_id": row.id, "b_status": PropStatus.PASSED, "b_phase": row.phase,
+                            "b_passed_at": now, "b_failed_at": None, "b_funded_at": None})
+        else:
+            changes.append({"b_id": row.id, "b_status": PropStatus.PASSED, "b_phase": PropPhase.FUNDED,
+                            "b_passed_at": now, "b_failed_at": None, "b_funded_at": now})
 
-async def take_daily_snapshots(session: AsyncSession):
-    """گرفتن اسنپ‌شات اکوئیتی در ابتدای هر روز برای محاسبه Drawdown"""
-    stmt = select(PropAccount).where(PropAccount.status == PropStatus.ACTIVE)
-    active_accounts = (await session.execute(stmt)).scalars().all()
-    
-    for account in active_accounts:
-        stmt_pending = select(func.sum(Prediction.amount)).where(
-            Prediction.prop_account_id == account.id,
-            Prediction.status == PredictionStatus.OPEN
+    if changes:
+        t = PropAccount.__table__
+        await session.execute(
+            update(t)
+            .where(t.c.id == bindparam("b_id"), t.c.status == PropStatus.ACTIVE)
+            .values(
+                status=bindparam("b_status"),
+                phase=bindparam("b_phase"),
+                passed_at=func.coalesce(bindparam("b_passed_at", type_=t.c.passed_at.type), t.c.passed_at),
+                failed_at=func.coalesce(bindparam("b_failed_at", type_=t.c.failed_at.type), t.c.failed_at),
+                funded_at=func.coalesce(bindparam("b_funded_at", type_=t.c.funded_at.type), t.c.funded_at),
+                updated_at=now,
+            ),
+            changes,
         )
-        pending_amount = (await session.execute(stmt_pending)).scalar() or Decimal("0")
-        current_equity = account.virtual_balance + pending_amount
-        
-        snapshot = DailyEquitySnapshot(
-            prop_account_id=account.id,
-            start_of_day_equity=current_equity
+
+    out["equity_points"] = await record_equity_points(session, equities, force=force_points, ts=now)
+    await session.commit()
+    return out
+
+
+async def take_daily_snapshots(session: AsyncSession) -> int:
+    """
+    گرفتن اسنپ‌شات اکوئیتی در ابتدای هر روز برای محاسبه Drawdown
+
+    یک INSERT ... SELECT سمت سرور برای همه اکانت‌های ACTIVE؛
+    idempotent برای هر (اکانت، روز UTC) با ON CONFLICT DO NOTHING
+    """
+    now = datetime.utcnow()
+    open_value = _open_market_value_query().subquery()
+
+    snapshots = (
+        select(
+            func.gen_random_uuid(),
+            PropAccount.id,
+            literal(now, DailyEquitySnapshot.date.type),
+            literal(now.date(), DailyEquitySnapshot.snapshot_day.type),
+            PropAccount.virtual_balance + func.coalesce(open_value.c.open_value, 0),
         )
-        session.add(snapshot)
-        
+        .outerjoin(open_value, open_value.c.account_id == PropAccount.id)
+        .where(PropAccount.status == PropStatus.ACTIVE)
+    )
+
+    result = await session.execute(
+        pg_insert(DailyEquitySnapshot)
+        .from_select(["id", "prop_account_id", "date", "snapshot_day", "start_of_day_equity"], snapshots)
+        .on_conflict_do_nothing(constraint="uq_daily_equity_snapshots_account_day")
+    )
     await session.commit()
+    return result.rowcount
@@ -0,0 +1,20 @@
+import asyncio
+import os
+
+from src.core.services.withdrawal_executor import run_withdrawal_executor
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+async def main():
+    interval = _env_int("WITHDRAWAL_EXECUTOR_INTERVAL_SECONDS", 5)
+    await run_withdrawal_executor(interval_seconds=interval)
+
+if __name__ == "__main__":
+    asyncio.run(main())
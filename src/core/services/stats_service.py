@@ -2,12 +2,29 @@
 Stats Service
 محاسبه و به‌روزرسانی آمار کاربران برای لیدربورد
 """
+import os
 import uuid
+from datetime import date, datetime, timedelta
 from decimal import Decimal
-from sqlalchemy import select
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import UserStats
+from src.database.models import AppCounter, UserStats, UserStatsPeriod
+
+# بازه‌های لیدربورد: روز (UTC)، هفته (از دوشنبه)، فصل (ماه تقویمی)
+PERIOD_DAY = "day"
+PERIOD_WEEK = "week"
+PERIOD_SEASON = "season"
+PERIODS = (PERIOD_DAY, PERIOD_WEEK, PERIOD_SEASON)
+
+# با هر تسویه راند یک واحد زیاد می‌شود (invalidation کش صفحات لیدربورد)
+LEADERBOARD_GENERATION = "leaderboard_generation"
+
+# نگهداری bucket های قدیمی (فصل‌ها همیشه نگه داشته می‌شوند)
+DAY_RETENTION_DAYS = int(os.getenv("LEADERBOARD_DAY_RETENTION_DAYS", "35"))
+WEEK_RETENTION_WEEKS = int(os.getenv("LEADERBOARD_WEEK_RETENTION_WEEKS", "26"))
 
 
 def compute_score(stats: UserStats) -> Decimal:
@@ -24,6 +41,97 @@ def compute_score(stats: UserStats) -> Decimal:
     )
 
 
+def window_score(wins, losses, net_pnl):
+    """
+    امتیاز بازه‌ای (بدون streak): (wins * 3) + (net_pnl * 0.1) - (losses * 1)
+    هم برای مقادیر پایتونی و هم ستون‌های SQL
+    """
+    return wins * 3 + net_pnl * Decimal("0.1") - losses
+
+
+def period_start(period: str, day: date) -> date:
+    if period == PERIOD_DAY:
+        return day
+    if period == PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == PERIOD_SEASON:
+        return day.replace(day=1)
+    raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+
+
+def period_starts(ts: datetime) -> Dict[str, date]:
+    return {p: period_start(p, ts.date()) for p in PERIODS}
+
+
+async def add_period_stats(session: AsyncSession, rows: List[dict]) -> None:
+    """
+    افزودن افزایشی به bucket ها (INSERT ... ON CONFLICT DO UPDATE با جمع مقادیر)
+    rows: [{"user_id", "period", "period_start", "wins", "losses", "ties", "total_bets", "net_pnl"}, ...]
+    بدون commit
+    """
+    if not rows:
+        return
+    values = [{**r, "score": window_score(r["wins"], r["losses"], r["net_pnl"])} for r in rows]
+    stmt = pg_insert(UserStatsPeriod).values(values)
+    ex = stmt.excluded
+    t = UserStatsPeriod
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[t.user_id, t.period, t.period_start],
+            set_={
+                "wins": t.wins + ex.wins,
+                "losses": t.losses + ex.losses,
+                "ties": t.ties + ex.ties,
+                "total_bets": t.total_bets + ex.total_bets,
+                "net_pnl": t.net_pnl + ex.net_pnl,
+                "score": window_score(t.wins + ex.wins, t.losses + ex.losses, t.net_pnl + ex.net_pnl),
+                "updated_at": func.now(),
+            },
+        )
+    )
+
+
+def outcome_deltas(outcome: str, pnl_delta: Decimal) -> dict:
+    return {
+        "wins": 1 if outcome == "WIN" else 0,
+        "losses": 1 if outcome == "LOSS" else 0,
+        "ties": 1 if outcome not in ("WIN", "LOSS") else 0,
+        "total_bets": 1,
+        "net_pnl": pnl_delta or Decimal("0"),
+    }
+
+
+async def prune_period_stats(session: AsyncSession, today: Optional[date] = None) -> int:
+    """roll-over: حذف bucket های روزانه / هفتگی قدیمی‌تر از بازه نگهداری"""
+    today = today or datetime.utcnow().date()
+    t = UserStatsPeriod
+    result = await session.execute(
+        delete(t).where(
+            ((t.period == PERIOD_DAY) & (t.period_start < today - timedelta(days=DAY_RETENTION_DAYS)))
+            | ((t.period == PERIOD_WEEK) & (t.period_start < period_start(PERIOD_WEEK, today) - timedelta(weeks=WEEK_RETENTION_WEEKS)))
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def bump_leaderboard_generation(session: AsyncSession) -> None:
+    """+1 روی generation لیدربورد در تراکنش تسویه (بدون commit)"""
+    stmt = pg_insert(AppCounter).values(name=LEADERBOARD_GENERATION, value=1)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[AppCounter.name],
+            set_={"value": AppCounter.value + 1, "updated_at": func.now()},
+        )
+    )
+
+
+async def get_leaderboard_generation(session: AsyncSession) -> int:
+    value = (
+        await session.execute(select(AppCounter.value).where(AppCounter.name == LEADERBOARD_GENERATION))
+    ).scalar_one_or_none()
+    return value or 0
+
 
 async def apply_bet_result(
     session: AsyncSession,
@@ -76,5 +184,12 @@ async def apply_bet_result(
     # 3) recompute score (uses your existing compute_score())
     stats.score = compute_score(stats)
 
+    # 4) bucket های روزانه / هفتگی / فصلی (یک upsert برای هر سه)
+    deltas = outcome_deltas(outcome, pnl_delta)
+    await add_period_stats(session, [
+        {"user_id": user_id, "period": period, "period_start": start, **deltas}
+        for period, start in period_starts(datetime.utcnow()).items()
+    ])
+
     # no commit/rollback here
     return stats
@@ -6,76 +6,255 @@ TON Provider
 import httpx
 import os
 from decimal import Decimal
-from src.core.config import get_settings
+from src.core.config import get_settings, env_list
+from src.core.utils.http_transport import register_provider, request_json
 
 settings = get_settings()
 
 TONCENTER_API_KEY = os.getenv("TONCENTER_API_KEY", "").strip()
 
 
+def _base_url() -> str:
+    # انتخاب endpoint بر اساس شبکه (قابل override برای محیط تست)
+    override = os.getenv("TONCENTER_BASE_URL", "").strip()
+    if override:
+        return override
+    if settings.ton_network == "mainnet":
+        return "https://toncenter.com/api/v2"
+    return "https://testnet.toncenter.com/api/v2"
+
+
+# سهمیه Toncenter: بدون API key حدود 1 req/s، با key حدود 10 req/s
+register_provider(
+    "toncenter",
+    [_base_url(), *env_list("TONCENTER_FALLBACK_URLS")],
+    rate_per_sec=float(os.getenv("TONCENTER_RPS", "10" if TONCENTER_API_KEY else "1")),
+    headers={"X-API-Key": TONCENTER_API_KEY} if TONCENTER_API_KEY else None,
+    max_retries=int(os.getenv("TONCENTER_MAX_RETRIES", "3")),
+)
+
+
+def _tx_id(tx: dict) -> tuple[int, str]:
+    tid = tx.get("transaction_id", {}) or {}
+    try:
+        lt = int(tid.get("lt", 0) or 0)
+    except (TypeError, ValueError):
+        lt = 0
+    return lt, str(tid.get("hash", "") or "")
+
+
+def _parse_incoming(tx: dict) -> dict | None:
+    """
+    تبدیل یک تراکنش خام toncenter به فرمت normalize شده
+    (None اگر ورودی با value > 0 نباشد)
+    """
+    # فقط تراکنش‌های ورودی (in_msg با value > 0)
+    in_msg = tx.get("in_msg", {}) or {}
+
+    # مقدار به nanoTON هست، تبدیل به TON
+    value_nano = int(in_msg.get("value", 0) or 0)
+    if value_nano <= 0:
+        return None
+
+    amount = Decimal(value_nano) / Decimal("1000000000")  # nano to TON
+
+    # گرفتن memo (comment)
+    memo = None
+    msg_data = in_msg.get("msg_data", {}) or {}
+    if msg_data.get("@type") == "msg.dataText":
+        memo = msg_data.get("text", "")
+
+    # ساخت hash یونیک از transaction_id
+    lt, raw_hash = _tx_id(tx)
+    tx_hash = f"{lt if lt else ''}_{raw_hash}"
+
+    return {
+        "hash": tx_hash,
+        "amount": amount,
+        "memo": memo,
+        "from_address": in_msg.get("source", ""),
+        "timestamp": tx.get("utime", 0),
+        "lt": lt,
+    }
+
+
+async def fetch_transactions_page(
+    address: str,
+    limit: int = 50,
+    lt: int | None = None,
+    tx_hash: str | None = None,
+    to_lt: int | None = None,
+) -> list[dict]:
+    """
+    یک صفحه از تراکنش‌های خام (جدیدترین اول)
+
+    - بدون lt/hash: از head
+    - با lt + hash: از همان تراکنش به عقب (خود تراکنش هم برگردانده می‌شود)
+    - to_lt: سرور بعد از رسیدن به این lt متوقف می‌شود
+
+    در صورت خطا exception می‌دهد تا cursor اشتباهی جلو نرود.
+    """
+    params = {
+        "address": address,
+        "limit": limit,
+        **({"api_key": TONCENTER_API_KEY} if TONCENTER_API_KEY else {}),
+    }
+    if lt is not None and tx_hash:
+        params["lt"] = int(lt)
+        params["hash"] = tx_hash
+    if to_lt:
+        params["to_lt"] = int(to_lt)
+
+    data = await request_json("toncenter", "GET", "/getTransactions", params=params)
+
+    if not data.get("ok"):
+        raise RuntimeError(f"TON API error: {data}")
+
+    return data.get("result", []) or []
+
+
+async def _walk_back(
+    address: str,
+    stop_lt: int,
+    page_size: int,
+    max_pages: int,
+    start_lt: int | None = None,
+    start_hash: str | None = None,
+) -> dict:
+    """
+    پیمایش صفحه‌به‌صفحه از (start_lt, start_hash) یا head به عقب تا رسیدن به stop_lt
+
+    خروجی:
+      - raw: تراکنش‌های خام با lt > stop_lt (جدیدترین اول)
+      - complete: True اگر به stop_lt یا ابتدای تاریخچه رسیدیم
+    """
+    raw: list[dict] = []
+    seen_lt: set[int] = set()
+    cursor_lt, cursor_hash = start_lt, start_hash
+
+    for _ in range(max(1, max_pages)):
+        page = await fetch_transactions_page(
+            address,
+            limit=page_size,
+            lt=cursor_lt,
+            tx_hash=cursor_hash,
+            to_lt=stop_lt or None,
+        )
+
+        fresh = 0
+        for tx in page:
+            lt, h = _tx_id(tx)
+            if lt in seen_lt:
+                # اولین آیتم صفحه‌ی بعدی همان cursor است
+                continue
+            if lt <= stop_lt:
+                return {"raw": raw, "complete": True}
+            seen_lt.add(lt)
+            raw.append(tx)
+            fresh += 1
+            cursor_lt, cursor_hash = lt, h
+
+        if len(page) < page_size or fresh == 0:
+            # به ابتدای تاریخچه‌ی آدرس رسیدیم
+            return {"raw": raw, "complete": True}
+
+    return {"raw": raw, "complete": False}
+
+
+async def fetch_new_incoming_transactions(
+    address: str,
+    after_lt: int | None,
+    page_size: int = 50,
+    max_pages: int = 20,
+    resume_lt: int | None = None,
+    resume_hash: str | None = None,
+) -> dict:
+    """
+    فقط تراکنش‌های جدیدتر از watermark (after_lt)
+
+    - resume_lt / resume_hash: ادامه‌ی پیمایش ناتمام سیکل قبل از همان تراکنش به عقب
+      (به جای head؛ خود تراکنش resume قبلاً پردازش شده و برگردانده نمی‌شود)
+
+    خروجی:
+      - transactions: ورودی‌های normalize شده (قدیمی‌ترین اول)
+      - head_lt / head_hash: جدیدترین تراکنش دیده‌شده (watermark بعدی)
+      - oldest_lt / oldest_hash: قدیمی‌ترین تراکنش دیده‌شده (cursor ادامه)
+      - complete: False اگر max_pages تمام شد و هنوز به watermark نرسیدیم
+        (در این حالت watermark نباید جلو برود و پیمایش از oldest ادامه پیدا می‌کند)
+    """
+    resuming = resume_lt is not None and bool(resume_hash)
+
+    if after_lt is None:
+        # اجرای اول: فقط یک صفحه از head (مثل رفتار قبلی)
+        raw = await fetch_transactions_page(address, limit=page_size)
+        walk = {"raw": raw, "complete": True}
+    else:
+        walk = await _walk_back(
+            address,
+            int(after_lt),
+            page_size,
+            max_pages,
+            start_lt=int(resume_lt) if resuming else None,
+            start_hash=resume_hash if resuming else None,
+        )
+
+    raw = walk["raw"]
+    if resuming:
+        raw = [tx for tx in raw if _tx_id(tx)[0] < int(resume_lt)]
+
+    head_lt, head_hash = _tx_id(raw[0]) if raw else (after_lt, None)
+    oldest_lt, oldest_hash = _tx_id(raw[-1]) if raw else (resume_lt, resume_hash)
+
+    transactions = [t for t in (_parse_incoming(tx) for tx in reversed(raw)) if t]
+
+    return {
+        "transactions": transactions,
+        "head_lt": head_lt,
+        "head_hash": head_hash,
+        "oldest_lt": oldest_lt,
+        "oldest_hash": oldest_hash,
+        "complete": walk["complete"],
+    }
+
+
+async def fetch_incoming_transactions_range(
+    address: str,
+    from_lt: int,
+    to_lt: int | None = None,
+    to_hash: str | None = None,
+    page_size: int = 50,
+    max_pages: int = 1000,
+) -> list[dict]:
+    """
+    Backfill: ورودی‌های بازه‌ی (from_lt, to_lt]
+
+    اگر to_lt + to_hash داده شود پیمایش از همان تراکنش شروع می‌شود،
+    وگرنه از head به عقب رفته و موارد بالاتر از to_lt فیلتر می‌شوند.
+    """
+    walk = await _walk_back(
+        address,
+        stop_lt=int(from_lt),
+        page_size=page_size,
+        max_pages=max_pages,
+        start_lt=to_lt if to_hash else None,
+        start_hash=to_hash,
+    )
+    raw = walk["raw"]
+    if to_lt is not None:
+        raw = [tx for tx in raw if _tx_id(tx)[0] <= int(to_lt)]
+
+    return [t for t in (_parse_incoming(tx) for tx in reversed(raw)) if t]
+
+
 async def fetch_incoming_transactions(address: str, limit: int = 50) -> list[dict]:
     """
     گرفتن تراکنش‌های ورودی به یک آدرس
     خروجی: لیست از {hash, amount, memo, from_address}
     """
-    
-    # انتخاب endpoint بر اساس شبکه
-    if settings.ton_network == "mainnet":
-        base_url = "https://toncenter.com/api/v2"
-    else:
-        base_url = "https://testnet.toncenter.com/api/v2"
-    
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            headers = {"X-API-Key": TONCENTER_API_KEY} if TONCENTER_API_KEY else None
-            response = await client.get(
-                f"{base_url}/getTransactions",
-                params={
-                    "address": address,
-                    "limit": limit,
-                    **({"api_key": TONCENTER_API_KEY} if TONCENTER_API_KEY else {}),
-                },
-                headers=headers,
-            )
-            response.raise_for_status()
-            data = response.json()
-        
-        if not data.get("ok"):
-            print(f"TON API error: {data}")
-            return []
-        
-        transactions = []
-        
-        for tx in data.get("result", []):
-            # فقط تراکنش‌های ورودی (in_msg با value > 0)
-            in_msg = tx.get("in_msg", {})
-            
-            # مقدار به nanoTON هست، تبدیل به TON
-            value_nano = int(in_msg.get("value", 0))
-            if value_nano <= 0:
-                continue
-            
-            amount = Decimal(value_nano) / Decimal("1000000000")  # nano to TON
-            
-            # گرفتن memo (comment)
-            memo = None
-            msg_data = in_msg.get("msg_data", {})
-            if msg_data.get("@type") == "msg.dataText":
-                memo = msg_data.get("text", "")
-            
-            # ساخت hash یونیک از transaction_id
-            tx_hash = f"{tx.get('transaction_id', {}).get('lt', '')}_{tx.get('transaction_id', {}).get('hash', '')}"
-            
-            transactions.append({
-                "hash": tx_hash,
-                "amount": amount,
-                "memo": memo,
-                "from_address": in_msg.get("source", ""),
-                "timestamp": tx.get("utime", 0),
-            })
-        
-        return transactions
-        
+        raw = await fetch_transactions_page(address, limit=limit)
+        return [t for t in (_parse_incoming(tx) for tx in raw) if t]
+
     except httpx.HTTPError as e:
         print(f"HTTP error fetching TON transactions: {e}")
         return []
@@ -88,17 +267,9 @@ async def test_connection() -> bool:
     """
     تست اتصال به TON API
     """
-    if settings.ton_network == "mainnet":
-        base_url = "https://toncenter.com/api/v2"
-    else:
-        base_url = "https://testnet.toncenter.com/api/v2"
-    
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{base_url}/getMasterchainInfo")
-            response.raise_for_status()
-            data = response.json()
-            return data.get("ok", False)
+        data = await request_json("toncenter", "GET", "/getMasterchainInfo", timeout=10.0)
+        return data.get("ok", False)
     except Exception as e:
         print(f"TON connection test failed: {e}")
         return False
@@ -60,6 +60,7 @@ async def credit_trc20_deposit_by_address(
             DepositAddress.asset == asset,
             DepositAddress.network == network,
             DepositAddress.address == to_address,
+            DepositAddress.user_id.is_not(None),
         )
     )
     da = r.scalar_one_or_none()
@@ -22,10 +22,22 @@ from decimal import Decimal
 
 import httpx
 
+from src.core.config import env_list
+from src.core.utils.http_transport import register_provider, request_json
+
 
 TRONGRID_API_KEY = os.getenv("TRONGRID_API_KEY", "").strip()
 TRONGRID_BASE_URL = os.getenv("TRONGRID_BASE_URL", "https://api.trongrid.io").strip()
 
+# سهمیه TronGrid: با API key حدود 15 req/s، بدون key خیلی کمتر
+register_provider(
+    "trongrid",
+    [TRONGRID_BASE_URL, *env_list("TRONGRID_FALLBACK_URLS")],
+    rate_per_sec=float(os.getenv("TRONGRID_RPS", "10" if TRONGRID_API_KEY else "3")),
+    timeout=20.0,
+    max_retries=int(os.getenv("TRONGRID_MAX_RETRIES", "3")),
+)
+
 
 def _headers(api_key: Optional[str]) -> Optional[Dict[str, str]]:
     key = (api_key or TRONGRID_API_KEY).strip()
@@ -51,13 +63,12 @@ async def get_latest_tron_block_number(api_key: Optional[str] = None) -> int:
     TronGrid endpoint: /wallet/getnowblock (POST)
     returns: block_header.raw_data.number
     """
-    url = f"{TRONGRID_BASE_URL}/wallet/getnowblock"
-    headers = _headers(api_key)
-
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.post(url, json={}, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+    data = await request_json(
+        "trongrid", "POST", "/wallet/getnowblock",
+        json={},
+        headers=_headers(api_key),
+        timeout=15.0,
+    )
 
     try:
         return int(data["block_header"]["raw_data"]["number"])
@@ -66,11 +77,30 @@ async def get_latest_tron_block_number(api_key: Optional[str] = None) -> int:
         return int(data.get("block", {}).get("number", 0) or 0)
 
 
+async def get_tron_block_hash(block_number: int, api_key: Optional[str] = None) -> str:
+    """
+    TronGrid endpoint: /wallet/getblockbynum (POST)
+    returns: blockID (برای تشخیص reorg بین فاز pending و تایید)
+    """
+    data = await request_json(
+        "trongrid", "POST", "/wallet/getblockbynum",
+        json={"num": int(block_number)},
+        headers=_headers(api_key),
+        timeout=15.0,
+    )
+    block_id = data.get("blockID")
+    if not block_id:
+        raise RuntimeError(f"TRON block {block_number} not found")
+    return str(block_id)
+
+
 async def fetch_trc20_transfers_by_block(
     block_number: int,
     token_contract: str,
     limit: int = 200,
     api_key: Optional[str] = None,
+    only_confirmed: bool = True,
+    raise_on_error: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Reads TRC20 Transfer events in a specific block via TronGrid contract events.
@@ -79,19 +109,22 @@ async def fetch_trc20_transfers_by_block(
       GET /v1/contracts/{contract}/events
 
     We try both snake_case and camelCase parameter names (TronGrid variants exist).
+
+    only_confirmed=False: بلاک‌های نزدیک head (فاز pending)
+    raise_on_error=True: خطا به caller برمی‌گردد تا cursor جلو نرود
     """
     contract = (token_contract or "").strip()
     if not contract:
         return []
 
-    url = f"{TRONGRID_BASE_URL}/v1/contracts/{contract}/events"
+    path = f"/v1/contracts/{contract}/events"
     headers = _headers(api_key)
 
     # we try camelCase first (TronGrid SDK style)
     params_candidates = [
         {
             "eventName": "Transfer",
-            "onlyConfirmed": "true",
+            "onlyConfirmed": "true" if only_confirmed else "false",
             "blockNumber": str(int(block_number)),
             "limit": str(int(limit)),
             "orderBy": "block_timestamp,asc",
@@ -99,7 +132,7 @@ async def fetch_trc20_transfers_by_block(
         # snake_case fallback (some deployments accept these)
         {
             "event_name": "Transfer",
-            "only_confirmed": "true",
+            "only_confirmed": "true" if only_confirmed else "false",
             "block_number": str(int(block_number)),
             "limit": str(int(limit)),
             "order_by": "block_timestamp,asc",
@@ -110,10 +143,7 @@ async def fetch_trc20_transfers_by_block(
 
     for params in params_candidates:
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                resp = await client.get(url, params=params, headers=headers)
-                resp.raise_for_status()
-                data = resp.json()
+            data = await request_json("trongrid", "GET", path, params=params, headers=headers)
 
             items = data.get("data") or []
             out: List[Dict[str, Any]] = []
@@ -163,6 +193,7 @@ async def fetch_trc20_transfers_by_block(
                         "from_address": from_addr,
                         "to_address": to_addr,
                         "timestamp": ts,
+                        "block_number": int(block_number),
                     }
                 )
 
@@ -173,6 +204,8 @@ async def fetch_trc20_transfers_by_block(
             continue
 
     if last_err:
+        if raise_on_error:
+            raise last_err
         print(f"[TRON] fetch_trc20_transfers_by_block error: {last_err}")
     return []
 
@@ -198,7 +231,7 @@ async def fetch_incoming_trc20_transfers(
 
     headers = _headers(api_key)
 
-    url = f"{TRONGRID_BASE_URL}/v1/accounts/{address}/transactions/trc20"
+    path = f"/v1/accounts/{address}/transactions/trc20"
     params = {
         "only_confirmed": "true",
         "limit": str(int(limit)),
@@ -207,10 +240,12 @@ async def fetch_incoming_trc20_transfers(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url, params=params, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
+        data = await request_json(
+            "trongrid", "GET", path,
+            params=params,
+            headers=headers,
+            timeout=15.0,
+        )
 
         items = data.get("data") or []
         out: List[Dict[str, Any]] = []
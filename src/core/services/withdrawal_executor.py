@@ -0,0 +1,825 @@
+"""
+Withdrawal Executor
+پردازش برداشت‌ها: PENDING/APPROVED → PROCESSING → COMPLETED / FAILED
+
+- claim دسته‌ای با FOR UPDATE SKIP LOCKED (چند instance همزمان بدون تداخل)
+- broadcast با sender قابل‌تعویض هر شبکه و موازی‌سازی محدود (Semaphore برای هر شبکه)
+- ارسال دسته‌ای (multi-send) برای شبکه‌هایی که sender آن‌ها batch پشتیبانی می‌کند:
+  برداشت‌های هر (asset, network) در یک WithdrawalBatch جمع می‌شوند و با یک تراکنش
+  ارسال می‌شوند (TON highload wallet / EVM batch transfer). دسته وقتی ساخته می‌شود که
+  WITHDRAWAL_BATCH_SIZE برداشت جمع شود یا قدیمی‌ترین آن WITHDRAWAL_BATCH_WAIT_SECONDS منتظر مانده باشد.
+- پیگیری تایید به صورت جدا از broadcast (برای دسته‌ها به ازای هر خروجی / batch_index)
+  - COMPLETED: مبلغ از locked کسر می‌شود
+  - FAILED: مبلغ locked به available برمی‌گردد
+
+Sender ها باید نسبت به withdrawal.id (و batch.id) idempotent باشند: ردیف / دسته‌ای که
+بعد از claim (به دلیل crash) tx_hash نگرفته، پس از lease دوباره claim و ارسال می‌شود.
+"""
+
+import asyncio
+import os
+import random
+import socket
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.connection import async_session
+from src.database.models import (
+    Balance, Ledger, LedgerEventType,
+    Withdrawal, WithdrawalStatus, WithdrawalBatch, WithdrawalBatchStatus,
+)
+from src.core.services.alerts import alert_admin
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+EXECUTOR_ID = os.getenv("WITHDRAWAL_EXECUTOR_ID") or f"{socket.gethostname()}:{os.getpid()}"
+CLAIM_BATCH_SIZE = _env_int("WITHDRAWAL_CLAIM_BATCH", 20)
+SEND_CONCURRENCY = _env_int("WITHDRAWAL_SEND_CONCURRENCY", 4)
+CLAIM_LEASE_SECONDS = _env_int("WITHDRAWAL_CLAIM_LEASE_SECONDS", 300)
+BATCH_SIZE = _env_int("WITHDRAWAL_BATCH_SIZE", 100)
+BATCH_WAIT_SECONDS = _env_int("WITHDRAWAL_BATCH_WAIT_SECONDS", 30)
+
+TX_PENDING = "pending"
+TX_CONFIRMED = "confirmed"
+TX_FAILED = "failed"
+
+
+class WithdrawalSendError(Exception):
+    """خطای قطعی ارسال (آدرس نامعتبر، موجودی ناکافی hot wallet و ...) → FAILED + refund"""
+    pass
+
+
+@dataclass
+class ClaimedWithdrawal:
+    id: uuid.UUID
+    user_id: uuid.UUID
+    amount: Decimal
+    asset: str
+    network: str
+    to_address: str
+    tx_hash: Optional[str] = None
+    batch_index: Optional[int] = None
+
+
+@dataclass
+class ClaimedBatch:
+    id: uuid.UUID
+    asset: str
+    network: str
+    items: List[ClaimedWithdrawal] = field(default_factory=list)
+
+
+class ChainSender:
+    """
+    رابط sender هر شبکه
+
+    send: برگرداندن tx_hash (تکرار با همان withdrawal.id نباید دوباره پول بفرستد)
+    get_status: یکی از TX_PENDING / TX_CONFIRMED / TX_FAILED
+
+    ارسال دسته‌ای (اختیاری، با max_batch_size > 1):
+    send_batch: یک تراکنش با یک خروجی برای هر آیتم به ترتیب batch_index (idempotent با batch_id)
+    get_batch_status: وضعیت هر خروجی به ترتیب batch_index
+    """
+    network: str = ""
+    max_batch_size: int = 1
+
+    async def send(self, withdrawal: ClaimedWithdrawal) -> str:
+        raise NotImplementedError
+
+    async def get_status(self, tx_hash: str) -> str:
+        raise NotImplementedError
+
+    async def send_batch(self, batch_id: uuid.UUID, withdrawals: List[ClaimedWithdrawal]) -> str:
+        raise NotImplementedError
+
+    async def get_batch_status(self, tx_hash: str, size: int) -> List[str]:
+        # پیش‌فرض: تراکنش atomic (همه خروجی‌ها با هم موفق / ناموفق)
+        return [await self.get_status(tx_hash)] * size
+
+
+class FakeChainSender(ChainSender):
+    """
+    sender محلی در حافظه برای تست / staging
+
+    confirm_after: ثانیه تا تایید؛ fail_rate: احتمال شکست روی زنجیره (برای دسته: هر خروجی)
+    """
+
+    def __init__(
+        self,
+        network: str,
+        confirm_after: float = 5.0,
+        fail_rate: float = 0.0,
+        latency: float = 0.05,
+        max_batch_size: int = 254,
+    ):
+        self.network = network
+        self.confirm_after = confirm_after
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.max_batch_size = max_batch_size
+        self._by_withdrawal: Dict[uuid.UUID, str] = {}
+        self._txs: Dict[str, dict] = {}
+
+    async def send(self, withdrawal: ClaimedWithdrawal) -> str:
+        await asyncio.sleep(self.latency)
+        existing = self._by_withdrawal.get(withdrawal.id)
+        if existing:
+            return existing
+
+        tx_hash = f"fake-{self.network.lower()}-{uuid.uuid4().hex}"
+        self._by_withdrawal[withdrawal.id] = tx_hash
+        self._txs[tx_hash] = {
+            "sent_at": datetime.utcnow(),
+            "fails": random.random() < self.fail_rate,
+        }
+        return tx_hash
+
+    async def get_status(self, tx_hash: str) -> str:
+        tx = self._txs.get(tx_hash)
+        if tx is None:
+            return TX_FAILED
+        if datetime.utcnow() - tx["sent_at"] < timedelta(seconds=self.confirm_after):
+            return TX_PENDING
+        return TX_FAILED if tx["fails"] else TX_CONFIRMED
+
+    async def send_batch(self, batch_id: uuid.UUID, withdrawals: List[ClaimedWithdrawal]) -> str:
+        await asyncio.sleep(self.latency)
+        existing = self._by_withdrawal.get(batch_id)
+        if existing:
+            return existing
+
+        tx_hash = f"fake-{self.network.lower()}-batch-{uuid.uuid4().hex}"
+        self._by_withdrawal[batch_id] = tx_hash
+        self._txs[tx_hash] = {
+            "sent_at": datetime.utcnow(),
+            "fails": False,
+            "outputs": [random.random() < self.fail_rate for _ in withdrawals],
+        }
+        return tx_hash
+
+    async def get_batch_status(self, tx_hash: str, size: int) -> List[str]:
+        tx = self._txs.get(tx_hash)
+        if tx is None:
+            return [TX_FAILED] * size
+        if datetime.utcnow() - tx["sent_at"] < timedelta(seconds=self.confirm_after):
+            return [TX_PENDING] * size
+        return [TX_FAILED if failed else TX_CONFIRMED for failed in tx["outputs"]]
+
+
+# ---------------------------------------------------------------------------
+# Sender registry
+# ---------------------------------------------------------------------------
+
+_SENDERS: Dict[str, ChainSender] = {}
+_SEMAPHORES: Dict[str, asyncio.Semaphore] = {}
+
+
+def register_sender(network: str, sender: ChainSender) -> None:
+    _SENDERS[network.strip().upper()] = sender
+
+
+def get_sender(network: str) -> Optional[ChainSender]:
+    return _SENDERS.get((network or "").strip().upper())
+
+
+def _batch_limit(network: str) -> int:
+    sender = get_sender(network)
+    if sender is None:
+        return 1
+    return max(1, min(BATCH_SIZE, sender.max_batch_size))
+
+
+def _batch_networks() -> List[str]:
+    return [n for n in _SENDERS if _batch_limit(n) > 1]
+
+
+def _single_networks() -> List[str]:
+    return [n for n in _SENDERS if _batch_limit(n) <= 1]
+
+
+def _semaphore(network: str) -> asyncio.Semaphore:
+    sem = _SEMAPHORES.get(network)
+    if sem is None:
+        sem = asyncio.Semaphore(SEND_CONCURRENCY)
+        _SEMAPHORES[network] = sem
+    return sem
+
+
+if os.getenv("WITHDRAWAL_FAKE_SENDER", "").strip() in ("1", "true", "yes"):
+    for _network in ("TON", "TRC20", "ERC20", "BEP20"):
+        register_sender(_network, FakeChainSender(_network))
+
+
+# ---------------------------------------------------------------------------
+# Claim
+# ---------------------------------------------------------------------------
+
+async def claim_withdrawals(
+    session: AsyncSession,
+    limit: int = CLAIM_BATCH_SIZE,
+    executor_id: str = EXECUTOR_ID,
+) -> List[ClaimedWithdrawal]:
+    """
+    claim دسته‌ای برداشت‌های آماده ارسال
+
+    UPDATE withdrawals SET status = 'PROCESSING', claimed_by = ..., claimed_at = now()
+    WHERE id IN (SELECT id ... FOR UPDATE SKIP LOCKED LIMIT :n) RETURNING ...
+
+    شامل ردیف‌های PROCESSING بدون tx_hash که lease آن‌ها تمام شده (crash قبل از ثبت broadcast).
+    فقط شبکه‌های بدون ارسال دسته‌ای (آن‌ها با claim_batches پردازش می‌شوند).
+    """
+    networks = _single_networks()
+    if not networks:
+        return []
+
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=CLAIM_LEASE_SECONDS)
+
+    ids = (
+        select(Withdrawal.id)
+        .where(
+            Withdrawal.network.in_(networks),
+            or_(
+                Withdrawal.status.in_([WithdrawalStatus.PENDING, WithdrawalStatus.APPROVED]),
+                and_(
+                    Withdrawal.status == WithdrawalStatus.PROCESSING,
+                    Withdrawal.tx_hash.is_(None),
+                    Withdrawal.batch_id.is_(None),
+                    Withdrawal.claimed_at < stale_before,
+                ),
+            ),
+        )
+        .order_by(Withdrawal.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+    r = await session.execute(
+        update(Withdrawal)
+        .where(Withdrawal.id.in_(ids.scalar_subquery()))
+        .values(
+            status=WithdrawalStatus.PROCESSING,
+            claimed_by=executor_id,
+            claimed_at=now,
+            updated_at=now,
+        )
+        .returning(
+            Withdrawal.id, Withdrawal.user_id, Withdrawal.amount,
+            Withdrawal.asset, Withdrawal.network, Withdrawal.to_address,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimed = [
+        ClaimedWithdrawal(
+            id=row.id,
+            user_id=row.user_id,
+            amount=Decimal(row.amount),
+            asset=row.asset,
+            network=row.network,
+            to_address=row.to_address,
+        )
+        for row in r.all()
+    ]
+    await session.commit()
+    return claimed
+
+
+def _claimed_item(row) -> ClaimedWithdrawal:
+    return ClaimedWithdrawal(
+        id=row.id,
+        user_id=row.user_id,
+        amount=Decimal(row.amount),
+        asset=row.asset,
+        network=row.network,
+        to_address=row.to_address,
+        batch_index=row.batch_index,
+    )
+
+
+async def claim_batches(
+    session: AsyncSession,
+    executor_id: str = EXECUTOR_ID,
+) -> List[ClaimedBatch]:
+    """
+    ساخت دسته‌های ارسال برای هر (asset, network)
+
+    دسته وقتی ساخته می‌شود که به اندازه batch برداشت منتظر باشد یا قدیمی‌ترین آن
+    BATCH_WAIT_SECONDS صبر کرده باشد. انتخاب ردیف‌ها با FOR UPDATE SKIP LOCKED است؛
+    هر دسته در تراکنش جدا commit می‌شود تا lock ها کوتاه بمانند.
+    """
+    networks = _batch_networks()
+    if not networks:
+        return []
+
+    now = datetime.utcnow()
+    open_statuses = [WithdrawalStatus.PENDING, WithdrawalStatus.APPROVED]
+
+    groups = (
+        await session.execute(
+            select(
+                Withdrawal.asset,
+                Withdrawal.network,
+                func.count().label("waiting"),
+                func.min(Withdrawal.created_at).label("oldest"),
+            )
+            .where(Withdrawal.status.in_(open_statuses), Withdrawal.network.in_(networks))
+            .group_by(Withdrawal.asset, Withdrawal.network)
+        )
+    ).all()
+    await session.rollback()
+
+    batches: List[ClaimedBatch] = []
+    for g in groups:
+        limit = _batch_limit(g.network)
+        if g.waiting < limit and g.oldest > now - timedelta(seconds=BATCH_WAIT_SECONDS):
+            continue
+
+        rows = (
+            await session.execute(
+                select(
+                    Withdrawal.id, Withdrawal.user_id, Withdrawal.amount,
+                    Withdrawal.asset, Withdrawal.network, Withdrawal.to_address,
+                    Withdrawal.batch_index,
+                )
+                .where(
+                    Withdrawal.status.in_(open_statuses),
+                    Withdrawal.asset == g.asset,
+                    Withdrawal.network == g.network,
+                )
+                .order_by(Withdrawal.created_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not rows:
+            await session.rollback()
+            continue
+
+        batch = WithdrawalBatch(
+            id=uuid.uuid4(),
+            asset=g.asset,
+            network=g.network,
+            status=WithdrawalBatchStatus.PENDING,
+            size=len(rows),
+            total_amount=sum((Decimal(r.amount) for r in rows), Decimal("0")),
+            claimed_by=executor_id,
+            claimed_at=now,
+        )
+        session.add(batch)
+        await session.flush()
+
+        # bulk UPDATE by primary key (executemany)
+        await session.execute(
+            update(Withdrawal),
+            [
+                {
+                    "id": r.id,
+                    "status": WithdrawalStatus.PROCESSING,
+                    "batch_id": batch.id,
+                    "batch_index": i,
+                    "claimed_by": executor_id,
+                    "claimed_at": now,
+                    "updated_at": now,
+                }
+                for i, r in enumerate(rows)
+            ],
+        )
+        await session.commit()
+
+        items = [_claimed_item(r) for r in rows]
+        for i, item in enumerate(items):
+            item.batch_index = i
+        batches.append(ClaimedBatch(id=batch.id, asset=g.asset, network=g.network, items=items))
+
+    return batches
+
+
+async def reclaim_stale_batches(
+    session: AsyncSession,
+    limit: int = 10,
+    executor_id: str = EXECUTOR_ID,
+) -> List[ClaimedBatch]:
+    """دسته‌های PENDING که lease آن‌ها تمام شده (crash قبل از ثبت broadcast) → ارسال دوباره با همان batch.id"""
+    networks = _batch_networks()
+    if not networks:
+        return []
+
+    now = datetime.utcnow()
+    ids = (
+        select(WithdrawalBatch.id)
+        .where(
+            WithdrawalBatch.status == WithdrawalBatchStatus.PENDING,
+            WithdrawalBatch.network.in_(networks),
+            WithdrawalBatch.claimed_at < now - timedelta(seconds=CLAIM_LEASE_SECONDS),
+        )
+        .order_by(WithdrawalBatch.claimed_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    r = await session.execute(
+        update(WithdrawalBatch)
+        .where(WithdrawalBatch.id.in_(ids.scalar_subquery()))
+        .values(claimed_by=executor_id, claimed_at=now)
+        .returning(WithdrawalBatch.id, WithdrawalBatch.asset, WithdrawalBatch.network)
+        .execution_options(synchronize_session=False)
+    )
+    batches = {row.id: ClaimedBatch(id=row.id, asset=row.asset, network=row.network) for row in r.all()}
+    if batches:
+        rows = (
+            await session.execute(
+                select(
+                    Withdrawal.id, Withdrawal.user_id, Withdrawal.amount,
+                    Withdrawal.asset, Withdrawal.network, Withdrawal.to_address,
+                    Withdrawal.batch_index, Withdrawal.batch_id,
+                )
+                .where(
+                    Withdrawal.batch_id.in_(list(batches.keys())),
+                    Withdrawal.status == WithdrawalStatus.PROCESSING,
+                )
+                .order_by(Withdrawal.batch_id, Withdrawal.batch_index)
+            )
+        ).all()
+        for row in rows:
+            batches[row.batch_id].items.append(_claimed_item(row))
+    await session.commit()
+    return [b for b in batches.values() if b.items]
+
+
+# ---------------------------------------------------------------------------
+# Finalize (COMPLETED / FAILED)
+# ---------------------------------------------------------------------------
+
+async def _finalize(
+    session: AsyncSession,
+    withdrawal_id: uuid.UUID,
+    success: bool,
+    reason: Optional[str] = None,
+) -> bool:
+    """
+    انتقال PROCESSING → COMPLETED/FAILED + آزادسازی مبلغ locked (atomic)
+    خروجی False اگر ردیف دیگر PROCESSING نباشد (instance دیگری finalize کرده)
+    """
+    w = (
+        await session.execute(
+            select(Withdrawal).where(Withdrawal.id == withdrawal_id).with_for_update()
+        )
+    ).scalar_one_or_none()
+    if not w or w.status != WithdrawalStatus.PROCESSING:
+        await session.rollback()
+        return False
+
+    await _apply_finalize(session, w, success, reason, w.tx_hash)
+    await session.commit()
+    return True
+
+
+async def _apply_finalize(
+    session: AsyncSession,
+    w: Withdrawal,
+    success: bool,
+    reason: Optional[str],
+    tx_ref: Optional[str],
+) -> None:
+    """تغییر balance + Ledger برای یک برداشت قفل‌شده (بدون commit)"""
+    balance = (
+        await session.execute(
+            select(Balance).where(
+                Balance.user_id == w.user_id,
+                Balance.asset == w.asset,
+                Balance.network == w.network,
+            ).with_for_update()
+        )
+    ).scalar_one()
+
+    available_before = balance.available
+    locked_before = balance.locked
+    now = datetime.utcnow()
+
+    balance.locked -= w.amount
+    if success:
+        w.status = WithdrawalStatus.COMPLETED
+        event_type = LedgerEventType.WITHDRAWAL
+        description = f"برداشت ارسال شد: {w.amount} {w.asset} | tx: {tx_ref}"
+        idempotency_key = f"WITHDRAWAL_COMPLETE:{w.id}"
+    else:
+        balance.available += w.amount
+        w.status = WithdrawalStatus.FAILED
+        w.admin_note = reason
+        event_type = LedgerEventType.REFUND
+        description = f"برداشت ناموفق، مبلغ برگشت خورد: {reason or 'نامشخص'}"
+        idempotency_key = f"WITHDRAWAL_FAILED:{w.id}"
+
+    w.processed_at = now
+
+    session.add(Ledger(
+        id=uuid.uuid4(),
+        user_id=w.user_id,
+        event_type=event_type,
+        amount=w.amount,
+        currency=w.asset,
+        asset=w.asset,
+        network=w.network,
+        available_before=available_before,
+        available_after=balance.available,
+        locked_before=locked_before,
+        locked_after=balance.locked,
+        description=description,
+        idempotency_key=idempotency_key,
+    ))
+
+
+async def _finalize_batch(
+    session: AsyncSession,
+    batch_id: uuid.UUID,
+    statuses: Optional[List[str]] = None,
+    reason: Optional[str] = None,
+) -> Optional[Dict[str, int]]:
+    """
+    نهایی کردن همه برداشت‌های یک دسته در یک تراکنش
+
+    statuses: وضعیت هر خروجی به ترتیب batch_index؛ None = همه ناموفق (خطای قطعی ارسال)
+    خروجی None اگر دسته قبلاً نهایی شده باشد
+    """
+    batch = (
+        await session.execute(
+            select(WithdrawalBatch).where(WithdrawalBatch.id == batch_id).with_for_update()
+        )
+    ).scalar_one_or_none()
+    if not batch or batch.status not in (WithdrawalBatchStatus.PENDING, WithdrawalBatchStatus.SENT):
+        await session.rollback()
+        return None
+
+    withdrawals = (
+        await session.execute(
+            select(Withdrawal)
+            .where(Withdrawal.batch_id == batch_id, Withdrawal.status == WithdrawalStatus.PROCESSING)
+            .order_by(Withdrawal.user_id, Withdrawal.batch_index)
+            .with_for_update()
+        )
+    ).scalars().all()
+
+    out = {TX_CONFIRMED: 0, TX_FAILED: 0}
+    # ترتیب user_id برای lock های balance (جلوگیری از deadlock بین دسته‌ها)
+    for w in withdrawals:
+        ok = statuses is not None and w.batch_index < len(statuses) and statuses[w.batch_index] == TX_CONFIRMED
+        tx_ref = f"{batch.tx_hash}#{w.batch_index}" if batch.tx_hash else None
+        await _apply_finalize(
+            session, w, ok,
+            None if ok else (reason or f"batch output failed on chain: {tx_ref}"),
+            tx_ref,
+        )
+        out[TX_CONFIRMED if ok else TX_FAILED] += 1
+
+    batch.status = WithdrawalBatchStatus.CONFIRMED if out[TX_CONFIRMED] else WithdrawalBatchStatus.FAILED
+    batch.finalized_at = datetime.utcnow()
+    await session.commit()
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Broadcast
+# ---------------------------------------------------------------------------
+
+async def _broadcast(w: ClaimedWithdrawal) -> str:
+    """ارسال یک برداشت claim‌شده؛ خروجی: sent / failed / retry"""
+    sender = get_sender(w.network)
+    if sender is None:
+        return "retry"
+
+    async with _semaphore(w.network):
+        try:
+            tx_hash = await sender.send(w)
+        except WithdrawalSendError as e:
+            async with async_session() as session:
+                await _finalize(session, w.id, success=False, reason=str(e))
+            await alert_admin(f"❌ Withdrawal {w.id} failed: {e}")
+            return "failed"
+        except Exception as e:
+            # وضعیت نامشخص: ردیف PROCESSING می‌ماند و بعد از lease دوباره (idempotent) ارسال می‌شود
+            print(f"⚠️ Withdrawal {w.id} send error ({w.network}): {e}")
+            return "retry"
+
+    async with async_session() as session:
+        await session.execute(
+            update(Withdrawal)
+            .where(
+                Withdrawal.id == w.id,
+                Withdrawal.status == WithdrawalStatus.PROCESSING,
+            )
+            .values(tx_hash=tx_hash, broadcast_at=datetime.utcnow(), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    print(f"📤 Withdrawal {w.id} broadcast: {w.amount} {w.asset}/{w.network} | tx: {tx_hash}")
+    return "sent"
+
+
+async def _broadcast_batch(batch: ClaimedBatch) -> str:
+    """ارسال یک دسته با یک تراکنش multi-send؛ خروجی: sent / failed / retry"""
+    sender = get_sender(batch.network)
+    if sender is None:
+        return "retry"
+
+    async with _semaphore(batch.network):
+        try:
+            tx_hash = await sender.send_batch(batch.id, batch.items)
+        except WithdrawalSendError as e:
+            async with async_session() as session:
+                await _finalize_batch(session, batch.id, statuses=None, reason=str(e))
+            await alert_admin(f"❌ Withdrawal batch {batch.id} ({len(batch.items)} items) failed: {e}")
+            return "failed"
+        except Exception as e:
+            # دسته PENDING می‌ماند و بعد از lease با همان batch.id دوباره ارسال می‌شود
+            print(f"⚠️ Withdrawal batch {batch.id} send error ({batch.network}): {e}")
+            return "retry"
+
+    now = datetime.utcnow()
+    async with async_session() as session:
+        await session.execute(
+            update(WithdrawalBatch)
+            .where(
+                WithdrawalBatch.id == batch.id,
+                WithdrawalBatch.status == WithdrawalBatchStatus.PENDING,
+            )
+            .values(status=WithdrawalBatchStatus.SENT, tx_hash=tx_hash, broadcast_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(
+            update(Withdrawal)
+            .where(
+                Withdrawal.batch_id == batch.id,
+                Withdrawal.status == WithdrawalStatus.PROCESSING,
+            )
+            .values(broadcast_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    total = sum((w.amount for w in batch.items), Decimal("0"))
+    print(
+        f"📤 Withdrawal batch {batch.id} broadcast: {len(batch.items)} outputs, "
+        f"{total} {batch.asset}/{batch.network} | tx: {tx_hash}"
+    )
+    return "sent"
+
+
+async def process_withdrawal_queue(limit: int = CLAIM_BATCH_SIZE) -> Dict[str, int]:
+    """claim + broadcast موازی (محدود به SEND_CONCURRENCY برای هر شبکه)"""
+    async with async_session() as session:
+        claimed = await claim_withdrawals(session, limit=limit)
+        batches = await reclaim_stale_batches(session)
+        batches += await claim_batches(session)
+
+    out = {
+        "claimed": len(claimed) + sum(len(b.items) for b in batches),
+        "batches": len(batches),
+        "sent": 0,
+        "failed": 0,
+        "retry": 0,
+    }
+    if not claimed and not batches:
+        return out
+
+    tasks = [_broadcast(w) for w in claimed] + [_broadcast_batch(b) for b in batches]
+    for result in await asyncio.gather(*tasks):
+        out[result] += 1
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Confirmation tracking
+# ---------------------------------------------------------------------------
+
+async def _check_one(withdrawal_id: uuid.UUID, network: str, tx_hash: str) -> str:
+    sender = get_sender(network)
+    if sender is None:
+        return TX_PENDING
+
+    async with _semaphore(network):
+        try:
+            status = await sender.get_status(tx_hash)
+        except Exception as e:
+            print(f"⚠️ Withdrawal {withdrawal_id} status error ({network}): {e}")
+            return TX_PENDING
+
+    if status == TX_PENDING:
+        return status
+
+    async with async_session() as session:
+        changed = await _finalize(
+            session,
+            withdrawal_id,
+            success=(status == TX_CONFIRMED),
+            reason=None if status == TX_CONFIRMED else f"tx failed on chain: {tx_hash}",
+        )
+    if changed and status == TX_FAILED:
+        await alert_admin(f"❌ Withdrawal {withdrawal_id} failed on chain: {tx_hash}")
+    return status
+
+
+async def _check_batch(batch_id: uuid.UUID, network: str, tx_hash: str, size: int) -> Dict[str, int]:
+    sender = get_sender(network)
+    if sender is None:
+        return {TX_PENDING: size}
+
+    async with _semaphore(network):
+        try:
+            statuses = await sender.get_batch_status(tx_hash, size)
+        except Exception as e:
+            print(f"⚠️ Withdrawal batch {batch_id} status error ({network}): {e}")
+            return {TX_PENDING: size}
+
+    if len(statuses) < size or TX_PENDING in statuses:
+        return {TX_PENDING: size}
+
+    async with async_session() as session:
+        result = await _finalize_batch(session, batch_id, statuses=statuses)
+    if result and result[TX_FAILED]:
+        await alert_admin(f"❌ Withdrawal batch {batch_id}: {result[TX_FAILED]}/{size} outputs failed | tx: {tx_hash}")
+    return result or {}
+
+
+async def track_confirmations(limit: int = 100) -> Dict[str, int]:
+    """
+    بررسی برداشت‌های broadcast‌شده؛ بدون نگه داشتن lock در حین RPC
+    (finalize خودش ردیف را FOR UPDATE می‌گیرد و وضعیت را دوباره چک می‌کند)
+    """
+    networks = list(_SENDERS.keys())
+    if not networks:
+        return {"checked": 0}
+
+    async with async_session() as session:
+        rows = (
+            await session.execute(
+                select(Withdrawal.id, Withdrawal.network, Withdrawal.tx_hash)
+                .where(
+                    Withdrawal.status == WithdrawalStatus.PROCESSING,
+                    Withdrawal.tx_hash.is_not(None),
+                    Withdrawal.network.in_(networks),
+                )
+                .order_by(Withdrawal.broadcast_at)
+                .limit(limit)
+            )
+        ).all()
+
+        batch_rows = (
+            await session.execute(
+                select(WithdrawalBatch.id, WithdrawalBatch.network, WithdrawalBatch.tx_hash, WithdrawalBatch.size)
+                .where(
+                    WithdrawalBatch.status == WithdrawalBatchStatus.SENT,
+                    WithdrawalBatch.network.in_(networks),
+                )
+                .order_by(WithdrawalBatch.broadcast_at)
+                .limit(limit)
+            )
+        ).all()
+
+    out = {"checked": len(rows) + len(batch_rows), TX_CONFIRMED: 0, TX_FAILED: 0, TX_PENDING: 0}
+    for status in await asyncio.gather(*[_check_one(r.id, r.network, r.tx_hash) for r in rows]):
+        out[status] += 1
+    for counts in await asyncio.gather(*[_check_batch(b.id, b.network, b.tx_hash, b.size) for b in batch_rows]):
+        for status, n in counts.items():
+            out[status] += n
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+async def run_withdrawal_executor(interval_seconds: int = 5):
+    print("=" * 50)
+    print("📤 Withdrawal Executor شروع شد")
+    print(f"   instance: {EXECUTOR_ID}")
+    print(f"   شبکه‌ها: {sorted(_SENDERS.keys())}")
+    print(f"   فاصله: {interval_seconds} ثانیه | موازی: {SEND_CONCURRENCY} برای هر شبکه")
+    print(f"   دسته‌ای: {sorted(_batch_networks())} | اندازه: {BATCH_SIZE} | انتظار: {BATCH_WAIT_SECONDS} ثانیه")
+    print("=" * 50)
+
+    if not _SENDERS:
+        print("⚠️ هیچ sender ای ثبت نشده (WITHDRAWAL_FAKE_SENDER=1 برای تست محلی)")
+
+    while True:
+        try:
+            sent = await process_withdrawal_queue()
+            tracked = await track_confirmations()
+            if sent["claimed"] or tracked.get(TX_CONFIRMED) or tracked.get(TX_FAILED):
+                print(f"📊 Withdrawals: {sent} | confirmations: {tracked}")
+        except Exception as e:
+            print(f"❌ خطا در Withdrawal Executor: {e}")
+            await alert_admin(f"🚨 Withdrawal Executor Error: {e}")
+
+        await asyncio.sleep(interval_seconds)
@@ -9,6 +9,7 @@ from datetime import datetime
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from src.database.models import (
     User, Balance, Withdrawal, Ledger,
@@ -22,6 +23,12 @@ settings = get_settings()
 AUTO_WITHDRAWAL_LIMIT = Decimal("50")  # TON
 MIN_WITHDRAWAL_AMOUNT = Decimal("1")   # حداقل برداشت
 
+CANCELLABLE_STATUSES = (
+    WithdrawalStatus.PENDING,
+    WithdrawalStatus.NEEDS_REVIEW,
+    WithdrawalStatus.APPROVED,
+)
+
 
 class WithdrawalError(Exception):
     """خطای برداشت"""
@@ -146,6 +153,7 @@ async def get_user_withdrawals(
     
     result = await session.execute(
         select(Withdrawal)
+        .options(selectinload(Withdrawal.batch))
         .where(Withdrawal.user_id == user.id)
         .order_by(Withdrawal.created_at.desc())
         .limit(limit)
@@ -214,15 +222,17 @@ async def cancel_withdrawal(
     لغو برداشت و برگشت موجودی
     """
     async with session.begin():
+        # قفل ردیف برداشت: executor ممکن است همزمان آن را claim کند
         result = await session.execute(
-            select(Withdrawal).where(Withdrawal.id == withdrawal_id)
+            select(Withdrawal).where(Withdrawal.id == withdrawal_id).with_for_update()
         )
         withdrawal = result.scalar_one_or_none()
 
         if not withdrawal:
             raise WithdrawalError("برداشت پیدا نشد")
 
-        if withdrawal.status in [WithdrawalStatus.SENT, WithdrawalStatus.CONFIRMED]:
+        # فقط قبل از claim توسط withdrawal_executor قابل لغو است
+        if withdrawal.status not in CANCELLABLE_STATUSES:
             raise WithdrawalError("این برداشت قابل لغو نیست")
 
         asset = (getattr(withdrawal, "asset", None) or settings.default_asset).strip().upper()
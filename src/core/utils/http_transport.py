@@ -0,0 +1,417 @@
+"""
+Shared HTTP Transport
+لایه‌ی مشترک HTTP برای provider های بلاکچین و مارکت
+
+- یک httpx.AsyncClient مشترک برای هر host (connection pool محدود)
+- retry با backoff تصادفی (tenacity) روی خطای شبکه / 429 / 5xx
+- token bucket برای هر provider (سهمیه TronGrid / Toncenter)
+- circuit breaker برای هر base URL
+- fallback بین چند base URL، مرتب‌شده بر اساس latency مشاهده‌شده
+- متریک latency و خطا برای هر provider / base URL
+
+استفاده:
+    register_provider("trongrid", ["https://api.trongrid.io"], rate_per_sec=10)
+    resp = await request("trongrid", "POST", "/wallet/getnowblock", json={})
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TransportError(Exception):
+    """همه‌ی base URL ها در دسترس نیستند (circuit باز)"""
+    pass
+
+
+class _RetryableFailure(Exception):
+    """خطای موقت؛ tenacity دوباره تلاش می‌کند"""
+
+    def __init__(
+        self,
+        message: str,
+        response: Optional[httpx.Response] = None,
+        cause: Optional[BaseException] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.response = response
+        self.cause = cause
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------------------------
+# Building blocks
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    """Token bucket ساده (rate توکن در ثانیه، حداکثر burst)"""
+
+    def __init__(self, rate_per_sec: float, burst: int):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    closed → (failure_threshold خطای پشت‌سرهم) → open
+    open → (بعد از reset_timeout) → half-open: یک درخواست آزمایشی
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """آزاد کردن درخواست آزمایشی half-open (cancel / exception غیرمنتظره)"""
+        self._probing = False
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    errors: int = 0
+    latency_ewma_ms: Optional[float] = None
+    latency_max_ms: float = 0.0
+    last_status: Optional[int] = None
+    last_error: Optional[str] = None
+
+    def observe(self, latency_ms: float, status: Optional[int], error: Optional[str]) -> None:
+        self.requests += 1
+        self.last_status = status
+        if error:
+            # خطاهای سریع (429 / 5xx / قطع اتصال) در latency شمرده نمی‌شوند تا endpoint خراب سریع‌ترین به نظر نرسد
+            self.errors += 1
+            self.last_error = error
+            return
+        self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+        if self.latency_ewma_ms is None:
+            self.latency_ewma_ms = latency_ms
+        else:
+            self.latency_ewma_ms = 0.8 * self.latency_ewma_ms + 0.2 * latency_ms
+
+
+@dataclass
+class Provider:
+    name: str
+    base_urls: List[str]
+    headers: Dict[str, str] = field(default_factory=dict)
+    timeout: float = 15.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    max_connections: int = 20
+    bucket: Optional[TokenBucket] = None
+    breakers: Dict[str, CircuitBreaker] = field(default_factory=dict)
+    stats: Dict[str, EndpointStats] = field(default_factory=dict)
+
+    def ranked_urls(self) -> List[str]:
+        """
+        ترتیب تلاش: ابتدا URL هایی که circuit آن‌ها بسته است، سپس بر اساس latency پاسخ‌های موفق
+        (URL های بدون نمونه latency بعد از URL های اندازه‌گیری‌شده و به ترتیب پیکربندی)
+        """
+        def key(item):
+            idx, url = item
+            breaker = self.breakers[url]
+            ewma = self.stats[url].latency_ewma_ms
+            return (breaker.state == "open", ewma is None, ewma or 0.0, idx)
+
+        return [url for _, url in sorted(enumerate(self.base_urls), key=key)]
+
+
+_providers: Dict[str, Provider] = {}
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def register_provider(
+    name: str,
+    base_urls: List[str],
+    *,
+    rate_per_sec: Optional[float] = None,
+    burst: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 15.0,
+    max_retries: int = 3,
+    backoff_base: float = 0.5,
+    backoff_max: float = 8.0,
+    max_connections: int = 20,
+    failure_threshold: int = 5,
+    reset_timeout: float = 30.0,
+) -> Provider:
+    """
+    ثبت (یا جایگزینی) یک provider؛ اولین base URL اصلی و بقیه fallback هستند
+    """
+    urls = []
+    for u in base_urls:
+        u = (u or "").strip().rstrip("/")
+        if u and u not in urls:
+            urls.append(u)
+    if not urls:
+        raise ValueError(f"provider {name} has no base URL")
+
+    provider = Provider(
+        name=name,
+        base_urls=urls,
+        headers=dict(headers or {}),
+        timeout=timeout,
+        max_retries=max(0, int(max_retries)),
+        backoff_base=backoff_base,
+        backoff_max=backoff_max,
+        max_connections=max_connections,
+        bucket=TokenBucket(rate_per_sec, burst or max(1, int(rate_per_sec))) if rate_per_sec else None,
+        breakers={u: CircuitBreaker(failure_threshold, reset_timeout) for u in urls},
+        stats={u: EndpointStats() for u in urls},
+    )
+    _providers[name] = provider
+    return provider
+
+
+def get_provider(name: str) -> Provider:
+    provider = _providers.get(name)
+    if provider is None:
+        raise KeyError(f"HTTP provider not registered: {name}")
+    return provider
+
+
+def _client_for(url: str, provider: Provider) -> httpx.AsyncClient:
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=provider.timeout,
+            limits=httpx.Limits(
+                max_connections=provider.max_connections,
+                max_keepalive_connections=max(1, provider.max_connections // 2),
+            ),
+        )
+        _clients[key] = client
+    return client
+
+
+def _retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    raw = resp.headers.get("Retry-After")
+    if not raw:
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def _make_wait(provider: Provider):
+    def _wait(retry_state) -> float:
+        # full jitter exponential backoff (+ احترام به Retry-After)
+        attempt = retry_state.attempt_number
+        delay = random.uniform(0, min(provider.backoff_max, provider.backoff_base * (2 ** attempt)))
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after:
+            delay = max(delay, min(float(retry_after), provider.backoff_max))
+        return delay
+    return _wait
+
+
+async def _attempt(
+    provider: Provider,
+    method: str,
+    path: str,
+    params: Optional[Dict[str, Any]],
+    json: Any,
+    headers: Optional[Dict[str, str]],
+    timeout: Optional[float],
+) -> httpx.Response:
+    """یک دور تلاش روی URL های مرتب‌شده (fallback)"""
+    last: Optional[_RetryableFailure] = None
+    tried = 0
+
+    for base_url in provider.ranked_urls():
+        breaker = provider.breakers[base_url]
+        if not breaker.allow():
+            continue
+        tried += 1
+
+        url = f"{base_url}{path}" if path else base_url
+        merged_headers = {**provider.headers, **(headers or {})} or None
+        stats = provider.stats[base_url]
+        started = time.monotonic()
+
+        try:
+            if provider.bucket is not None:
+                await provider.bucket.acquire()
+                started = time.monotonic()
+            resp = await _client_for(base_url, provider).request(
+                method,
+                url,
+                params=params,
+                json=json,
+                headers=merged_headers,
+                timeout=timeout or provider.timeout,
+            )
+        except httpx.TransportError as e:
+            stats.observe((time.monotonic() - started) * 1000, None, f"{type(e).__name__}: {e}")
+            breaker.record_failure()
+            last = _RetryableFailure(f"{provider.name} {base_url}: {e}", cause=e)
+            continue
+        finally:
+            # probe نیمه‌باز با cancel یا exception دیگر هم آزاد شود (وگرنه URL برای همیشه رد می‌شود)
+            breaker.release_probe()
+
+        latency_ms = (time.monotonic() - started) * 1000
+        if resp.status_code in RETRYABLE_STATUS:
+            stats.observe(latency_ms, resp.status_code, f"HTTP {resp.status_code}")
+            breaker.record_failure()
+            last = _RetryableFailure(
+                f"{provider.name} {base_url}: HTTP {resp.status_code}",
+                response=resp,
+                retry_after=_retry_after_seconds(resp),
+            )
+            continue
+
+        stats.observe(latency_ms, resp.status_code, None)
+        breaker.record_success()
+        return resp
+
+    if tried == 0:
+        raise TransportError(f"{provider.name}: all endpoints are circuit-open")
+    raise last  # type: ignore[misc]
+
+
+async def request(
+    provider_name: str,
+    method: str,
+    path: str = "",
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    json: Any = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> httpx.Response:
+    """
+    ارسال درخواست از طریق provider ثبت‌شده
+
+    - پاسخ‌های غیر retryable (2xx/3xx/4xx) همان‌طور برگردانده می‌شوند
+    - بعد از اتمام retry ها: آخرین پاسخ 429/5xx برگردانده می‌شود
+      یا آخرین خطای شبکه raise می‌شود
+    """
+    provider = get_provider(provider_name)
+
+    try:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(provider.max_retries + 1),
+            wait=_make_wait(provider),
+            retry=retry_if_exception_type(_RetryableFailure),
+            reraise=True,
+        ):
+            with attempt:
+                return await _attempt(provider, method, path, params, json, headers, timeout)
+    except _RetryableFailure as e:
+        if e.response is not None:
+            return e.response
+        if e.cause is not None:
+            raise e.cause
+        raise TransportError(str(e))
+
+    raise TransportError(f"{provider.name}: retries exhausted")  # pragma: no cover
+
+
+async def request_json(
+    provider_name: str,
+    method: str,
+    path: str = "",
+    **kwargs: Any,
+) -> Any:
+    """request + raise_for_status + json()"""
+    resp = await request(provider_name, method, path, **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def get_transport_metrics() -> Dict[str, Any]:
+    """snapshot متریک‌ها برای مانیتورینگ"""
+    out: Dict[str, Any] = {}
+    for name, provider in _providers.items():
+        out[name] = {
+            "rate_per_sec": provider.bucket.rate if provider.bucket else None,
+            "endpoints": [
+                {
+                    "base_url": url,
+                    "circuit": provider.breakers[url].state,
+                    "requests": provider.stats[url].requests,
+                    "errors": provider.stats[url].errors,
+                    "latency_ewma_ms": round(provider.stats[url].latency_ewma_ms or 0, 1),
+                    "latency_max_ms": round(provider.stats[url].latency_max_ms, 1),
+                    "last_status": provider.stats[url].last_status,
+                    "last_error": provider.stats[url].last_error,
+                }
+                for url in provider.ranked_urls()
+            ],
+        }
+    return out
+
+
+async def close_transport() -> None:
+    """بستن همه‌ی client های مشترک (shutdown)"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
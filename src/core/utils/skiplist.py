@@ -0,0 +1,110 @@
+"""
+Indexable skip list
+لیست مرتب با درج / حذف / rank / دسترسی با اندیس در O(log n) (هر لینک طول پرش خود را نگه می‌دارد)
+"""
+
+import random
+from typing import Any, Iterator, List, Optional
+
+MAX_LEVEL = 32
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Any, level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # فاصله (تعداد موقعیت) تا next[i]؛ انتهای لیست در موقعیت size + 1 است
+        self.width: List[int] = [1] * level
+
+
+class IndexableSkipList:
+    """کلیدها باید یکتا و قابل مقایسه باشند (مثلاً tuple)"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self._head = _Node(None, MAX_LEVEL)
+        self._size = 0
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._rng.random() < 0.5:
+            level += 1
+        return level
+
+    def _find(self, key: Any):
+        """آخرین node قبل از key در هر سطح + موقعیت آن"""
+        update: List[_Node] = [self._head] * MAX_LEVEL
+        steps = [0] * MAX_LEVEL
+        node, pos = self._head, 0
+        for i in reversed(range(MAX_LEVEL)):
+            while node.next[i] is not None and node.next[i].key < key:
+                pos += node.width[i]
+                node = node.next[i]
+            update[i] = node
+            steps[i] = pos
+        return update, steps, pos
+
+    def insert(self, key: Any) -> None:
+        update, steps, pos = self._find(key)
+        level = self._random_level()
+        new = _Node(key, level)
+        for i in range(MAX_LEVEL):
+            prev = update[i]
+            if i < level:
+                new.next[i] = prev.next[i]
+                prev.next[i] = new
+                new.width[i] = prev.width[i] - (pos - steps[i])
+                prev.width[i] = pos + 1 - steps[i]
+            else:
+                prev.width[i] += 1
+        self._size += 1
+
+    def remove(self, key: Any) -> bool:
+        update, _, _ = self._find(key)
+        target = update[0].next[0]
+        if target is None or target.key != key:
+            return False
+        for i in range(MAX_LEVEL):
+            prev = update[i]
+            if prev.next[i] is target:
+                prev.width[i] += target.width[i] - 1
+                prev.next[i] = target.next[i]
+            else:
+                prev.width[i] -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, key: Any) -> int:
+        """تعداد کلیدهای کوچک‌تر از key (= اندیس صفرمبنا اگر key موجود باشد)"""
+        return self._find(key)[2]
+
+    def __contains__(self, key: Any) -> bool:
+        node = self._find(key)[0][0].next[0]
+        return node is not None and node.key == key
+
+    def _node_at(self, index: int) -> _Node:
+        if not 0 <= index < self._size:
+            raise IndexError("skip list index out of range")
+        node, remaining = self._head, index + 1
+        for i in reversed(range(MAX_LEVEL)):
+            while node.next[i] is not None and node.width[i] <= remaining:
+                remaining -= node.width[i]
+                node = node.next[i]
+        return node
+
+    def __getitem__(self, index: int) -> Any:
+        return self._node_at(index).key
+
+    def iter_from(self, index: int) -> Iterator[Any]:
+        """کلیدها از اندیس index به بعد (O(log n) برای شروع، O(1) برای هر قدم)"""
+        if index >= self._size:
+            return
+        node = self._node_at(max(index, 0))
+        while node is not None:
+            yield node.key
+            node = node.next[0]
@@ -0,0 +1,107 @@
+"""
+Time-series helpers
+resolution / bucket برای downsampling سمت سرور
+"""
+
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, literal_column
+
+# resolution های مجاز (ثانیه)
+RESOLUTIONS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+RAW = "raw"
+AUTO = "auto"
+
+
+def parse_resolution(value: Optional[str]) -> Optional[int]:
+    """
+    "raw" → 0 (بدون downsampling)، "auto" / None → None، "5m" → 300
+    ValueError برای مقدار ناشناخته
+    """
+    if value is None or value == AUTO:
+        return None
+    if value == RAW:
+        return 0
+    if value not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of: {RAW}, {AUTO}, {', '.join(RESOLUTIONS)}")
+    return RESOLUTIONS[value]
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """ورودی tz-aware → UTC بدون tzinfo (ستون‌های ts naive-UTC هستند)؛ ورودی naive همان UTC فرض می‌شود"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def auto_resolution(start: datetime, end: datetime, max_points: int) -> int:
+    """کوچک‌ترین bucket استاندارد که تعداد نقاط بازه را زیر max_points نگه دارد"""
+    span = max((end - start).total_seconds(), 1)
+    for seconds in sorted(RESOLUTIONS.values()):
+        if span / seconds <= max_points:
+            return seconds
+    return max(RESOLUTIONS.values())
+
+
+def resolution_label(seconds: int) -> str:
+    if seconds == 0:
+        return RAW
+    for label, value in RESOLUTIONS.items():
+        if value == seconds:
+            return label
+    return f"{seconds}s"
+
+
+def bucket_start(column, seconds: int):
+    """
+    شروع bucket برای ستون TIMESTAMP (بدون timezone، UTC) — معادل date_bin
+
+    ثابت‌ها literal هستند (نه bind param) تا همین عبارت در SELECT و GROUP BY یکسان باشد
+    """
+    step = literal_column(str(int(seconds)))
+    epoch = func.extract("epoch", column)
+    return func.to_timestamp(func.floor(epoch / step) * step).op("AT TIME ZONE")(literal_column("'UTC'"))
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets: اندیس نقاطی که شکل نمودار را با threshold نقطه حفظ می‌کنند
+    points: (x, y) مرتب‌شده بر حسب x؛ اولین و آخرین نقطه همیشه نگه داشته می‌شوند
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # میانگین bucket بعدی (نقطه سوم مثلث)
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = points[next_start:next_end]
+        avg_x = sum(p[0] for p in span) / len(span)
+        avg_y = sum(p[1] for p in span) / len(span)
+
+        # نقطه‌ای از bucket فعلی با بزرگ‌ترین مساحت مثلث
+        ax, ay = points[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, next_start):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
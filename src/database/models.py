@@ -12,8 +12,8 @@ import uuid
 from sqlalchemy import (
     MetaData,
     Column, String, Integer, BigInteger, Numeric,
-    DateTime, ForeignKey, Enum as SQLEnum, Boolean, Text,
-    CheckConstraint, UniqueConstraint, func
+    Date, DateTime, ForeignKey, Enum as SQLEnum, Boolean, Text,
+    CheckConstraint, Index, UniqueConstraint, func
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase, relationship
@@ -154,6 +154,13 @@ class Transaction(Base):
     reference_id = Column(String(255), nullable=True)
     tx_hash = Column(String(255), nullable=True, unique=True)
     memo = Column(String(255), nullable=True)
+
+    # واریزهای address-based: PENDING نزدیک head → CONFIRMED در عمق تایید / FAILED اگر reorg شد
+    asset = Column(String(10), nullable=True)
+    network = Column(String(10), nullable=True)
+    block_number = Column(BigInteger, nullable=True)
+    block_hash = Column(String(128), nullable=True)
+
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -243,7 +250,8 @@ class DepositAddress(Base):
     __tablename__ = "deposit_addresses"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    # NULL = آدرس pre-derived داخل pool که هنوز به کاربری داده نشده
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
 
     asset = Column(String(10), nullable=False)
     network = Column(String(10), nullable=False)
@@ -251,6 +259,7 @@ class DepositAddress(Base):
 
     derivation_index = Column(Integer, nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    assigned_at = Column(DateTime, nullable=True)
 
     user = relationship("User")
 
@@ -294,6 +303,14 @@ class WithdrawalStatus(str, Enum):
     FAILED = "FAILED"            # خطا در پردازش
     CANCELLED = "CANCELLED"      # لغو شده
 
+
+class WithdrawalBatchStatus(str, Enum):
+    """وضعیت دسته ارسال (چند برداشت در یک تراکنش)"""
+    PENDING = "PENDING"       # ساخته شده، هنوز broadcast نشده
+    SENT = "SENT"             # broadcast شده، در انتظار تایید
+    CONFIRMED = "CONFIRMED"   # نهایی شده (حداقل یک خروجی موفق)
+    FAILED = "FAILED"         # همه خروجی‌ها ناموفق
+
 class UserStats(Base):
     """User statistics for leaderboard"""
     __tablename__ = "user_stats"
@@ -310,11 +327,45 @@ class UserStats(Base):
     best_streak = Column(Integer, default=0, nullable=False)
     
     score = Column(Numeric(18, 8), default=0, nullable=False)
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    # index: polling افزایشی ایندکس لیدربورد
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False, index=True)
     
     # Relationship
     user = relationship("User", back_populates="stats")
 
+class UserStatsPeriod(Base):
+    """
+    آمار بازه‌ای کاربران برای لیدربورد روزانه / هفتگی / فصلی
+    هر ردیف یک bucket (user, period, period_start)؛ در تسویه به صورت افزایشی به‌روز می‌شود
+    """
+    __tablename__ = "user_stats_periods"
+    __table_args__ = (
+        # لیدربورد هر بازه: WHERE period, period_start ORDER BY score DESC
+        Index("ix_user_stats_periods_rank", "period", "period_start", "score"),
+    )
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    period = Column(String(8), primary_key=True)  # day | week | season
+    period_start = Column(Date, primary_key=True)
+
+    wins = Column(Integer, default=0, nullable=False)
+    losses = Column(Integer, default=0, nullable=False)
+    ties = Column(Integer, default=0, nullable=False)
+    total_bets = Column(Integer, default=0, nullable=False)
+    net_pnl = Column(Numeric(18, 8), default=0, nullable=False)
+    score = Column(Numeric(18, 8), default=0, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class AppCounter(Base):
+    """شمارنده‌های سراسری (مثلاً generation لیدربورد برای invalidation کش)"""
+    __tablename__ = "app_counters"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
 class Withdrawal(Base):
     """مدل درخواست برداشت"""
     __tablename__ = "withdrawals"
@@ -336,7 +387,38 @@ class Withdrawal(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     processed_at = Column(DateTime, nullable=True)
 
+    # withdrawal_executor: کدام instance و کی ردیف را claim کرد / کی broadcast شد
+    claimed_by = Column(String(128), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    broadcast_at = Column(DateTime, nullable=True)
+
+    # ارسال دسته‌ای: tx_hash روی batch است، batch_index = شماره خروجی در آن تراکنش
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("withdrawal_batches.id"), nullable=True, index=True)
+    batch_index = Column(Integer, nullable=True)
+
     user = relationship("User")
+    batch = relationship("WithdrawalBatch", back_populates="withdrawals")
+
+
+class WithdrawalBatch(Base):
+    """یک تراکنش multi-send روی زنجیره (TON highload / EVM batch transfer)"""
+    __tablename__ = "withdrawal_batches"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    asset = Column(String(10), nullable=False)
+    network = Column(String(10), nullable=False)
+    status = Column(SQLEnum(WithdrawalBatchStatus), default=WithdrawalBatchStatus.PENDING, nullable=False)
+    size = Column(Integer, nullable=False)
+    total_amount = Column(Numeric(20, 9), nullable=False)
+    tx_hash = Column(String(255), nullable=True, unique=True)
+
+    claimed_by = Column(String(128), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    broadcast_at = Column(DateTime, nullable=True)
+    finalized_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    withdrawals = relationship("Withdrawal", back_populates="batch", order_by="Withdrawal.batch_index")
 
 class Asset(str, Enum):
     TON = "TON"
@@ -483,6 +565,32 @@ class MarketResolution(Base):
     market = relationship("Market", back_populates="resolutions")
 
 
+class MarketPriceHistory(Base):
+    """
+    تاریخچه قیمت بازار (append-only، فقط هنگام تغییر قیمت)
+    جدول partition شده روی ts (روزانه + default) — partition ها در price_history_service ساخته می‌شوند
+    """
+    __tablename__ = "market_price_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+
+    market_id = Column(UUID(as_uuid=True), primary_key=True)
+    ts = Column(DateTime, primary_key=True)
+    yes_price = Column(Numeric(6, 4), nullable=True)
+    no_price = Column(Numeric(6, 4), nullable=True)
+
+
+class PropEquityPoint(Base):
+    """
+    منحنی اکوئیتی اکانت پراپ (append-only؛ هنگام باز / بسته شدن پوزیشن و تغییر معنادار mark-to-market)
+    کلید مرکب (prop_account_id, ts) بدون id جدا تا ردیف‌ها کوچک بمانند
+    """
+    __tablename__ = "prop_equity_points"
+
+    prop_account_id = Column(UUID(as_uuid=True), ForeignKey("prop_accounts.id", ondelete="CASCADE"), primary_key=True)
+    ts = Column(DateTime, primary_key=True)
+    equity = Column(Numeric(20, 2), nullable=False)
+
+
 class PropAccount(Base):
     __tablename__ = "prop_accounts"
 
@@ -506,6 +614,11 @@ class PropAccount(Base):
     losing_predictions = Column(Integer, default=0, nullable=False)
     
     realized_pnl = Column(Numeric(20, 2), default=Decimal("0"), nullable=False)
+
+    # شمارنده‌های denormalized پوزیشن‌های باز (در همان تراکنش ثبت / تسویه به‌روز می‌شوند)
+    open_trades = Column(Integer, default=0, nullable=False)
+    open_exposure = Column(Numeric(20, 9), default=Decimal("0"), nullable=False)
+
     funded_amount = Column(Numeric(20, 2), nullable=True)
     profit_split_pct = Column(Numeric(5, 2), default=Decimal("80"), nullable=False)
     
@@ -545,8 +658,13 @@ class DemoCredit(Base):
 
 class DailyEquitySnapshot(Base):
     __tablename__ = 'daily_equity_snapshots'
+    __table_args__ = (
+        # یک اسنپ‌شات برای هر اکانت در هر روز UTC (اجرای دوباره job تکراری نمی‌سازد)
+        UniqueConstraint("prop_account_id", "snapshot_day", name="uq_daily_equity_snapshots_account_day"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     prop_account_id = Column(UUID(as_uuid=True), ForeignKey('prop_accounts.id'))
     date = Column(DateTime, default=datetime.utcnow)
+    snapshot_day = Column(Date, nullable=False, default=lambda: datetime.utcnow().date())
     start_of_day_equity = Column(Numeric(18, 8), nullable=False)
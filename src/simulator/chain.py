@@ -0,0 +1,269 @@
+"""
+Synthetic Chains
+زنجیره‌های مصنوعی برای بنچمارک deposit_observer (بدون TronGrid / Toncenter / RPC واقعی)
+
+هر زنجیره بر اساس زمان واقعی جلو می‌رود (blocks_per_sec) و در هر بلاک
+deposits_per_block انتقال به آدرس‌ها/memo های پیکربندی‌شده می‌سازد.
+- reorg: با احتمال reorg_probability چند بلاک آخر با hash و انتقال‌های جدید جایگزین می‌شوند
+- produced_at: زمان تولید هر انتقال (برای اندازه‌گیری latency تا credit)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+
+@dataclass
+class SimConfig:
+    blocks_per_sec: float = 1.0
+    deposits_per_block: int = 5
+    reorg_probability: float = 0.0
+    reorg_depth: int = 2
+    rate_limit_probability: float = 0.0
+    min_amount: Decimal = Decimal("1")
+    max_amount: Decimal = Decimal("100")
+    seed: int = 42
+
+
+@dataclass
+class SimTransfer:
+    tx_hash: str
+    from_address: str
+    to_address: str
+    amount: Decimal
+    log_index: int
+    produced_at: float
+    memo: Optional[str] = None
+
+
+@dataclass
+class SimBlock:
+    number: int
+    hash: str
+    timestamp_ms: int
+    transfers: List[SimTransfer] = field(default_factory=list)
+
+
+def _hex_hash(*parts) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+class SyntheticChain:
+    """
+    زنجیره‌ی block-based (TRON / EVM)
+
+    thread-safe؛ بلاک‌ها lazy و بر اساس زمان سپری‌شده تولید می‌شوند.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: SimConfig,
+        recipients: List[str],
+        start_block: int = 1_000_000,
+        hash_prefix: str = "",
+        sender: str = "",
+    ):
+        self.name = name
+        self.config = config
+        self.recipients = list(recipients)
+        self.start_block = start_block
+        self.hash_prefix = hash_prefix
+        self.sender = sender
+
+        self._rng = random.Random(f"{config.seed}:{name}")
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._blocks: Dict[int, SimBlock] = {}
+        self._head = start_block - 1
+        self._generation = 0
+
+        # برای گزارش بنچمارک
+        self.produced: Dict[str, float] = {}
+        self.orphaned: set = set()
+        self.blocks_served = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.reorgs = 0
+
+    # ------------------------------------------------------------------
+    # generation
+    # ------------------------------------------------------------------
+
+    def _amount(self) -> Decimal:
+        lo, hi = self.config.min_amount, self.config.max_amount
+        cents = self._rng.randint(int(lo * 100), int(hi * 100))
+        return Decimal(cents) / Decimal(100)
+
+    def _make_block(self, number: int) -> SimBlock:
+        self._generation += 1
+        now = time.time()
+        block_hash = self.hash_prefix + _hex_hash(self.name, number, self._generation)
+        block = SimBlock(number=number, hash=block_hash, timestamp_ms=int(now * 1000))
+
+        if self.recipients:
+            for i in range(self.config.deposits_per_block):
+                tx_hash = self.hash_prefix + _hex_hash(self.name, "tx", number, self._generation, i)
+                transfer = SimTransfer(
+                    tx_hash=tx_hash,
+                    from_address=self.sender,
+                    to_address=self._rng.choice(self.recipients),
+                    amount=self._amount(),
+                    log_index=i,
+                    produced_at=now,
+                )
+                block.transfers.append(transfer)
+                self.produced[tx_hash] = now
+        return block
+
+    def _maybe_reorg(self) -> None:
+        if self.config.reorg_probability <= 0 or self._head < self.start_block:
+            return
+        if self._rng.random() >= self.config.reorg_probability:
+            return
+
+        depth = min(self.config.reorg_depth, self._head - self.start_block + 1)
+        self.reorgs += 1
+        for number in range(self._head - depth + 1, self._head + 1):
+            for t in self._blocks[number].transfers:
+                self.orphaned.add(t.tx_hash)
+            self._blocks[number] = self._make_block(number)
+
+    def advance(self) -> int:
+        """تولید بلاک‌ها تا ارتفاع متناظر با زمان فعلی؛ خروجی = head"""
+        with self._lock:
+            elapsed = time.time() - self._started
+            target = self.start_block + int(elapsed * self.config.blocks_per_sec)
+            while self._head < target:
+                self._maybe_reorg()
+                self._head += 1
+                self._blocks[self._head] = self._make_block(self._head)
+            return self._head
+
+    # ------------------------------------------------------------------
+    # queries
+    # ------------------------------------------------------------------
+
+    def should_rate_limit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.config.rate_limit_probability > 0 and self._rng.random() < self.config.rate_limit_probability:
+                self.rate_limited += 1
+                return True
+            return False
+
+    def block(self, number: int) -> Optional[SimBlock]:
+        self.advance()
+        with self._lock:
+            return self._blocks.get(int(number))
+
+    def blocks_range(self, from_block: int, to_block: int) -> List[SimBlock]:
+        head = self.advance()
+        lo = max(int(from_block), self.start_block)
+        hi = min(int(to_block), head)
+        with self._lock:
+            out = [self._blocks[n] for n in range(lo, hi + 1)]
+            self.blocks_served += len(out)
+        return out
+
+
+class SyntheticTonWallet:
+    """
+    تاریخچه‌ی تراکنش‌های house wallet در TON (memo-based، بدون reorg)
+
+    lt ها صعودی‌اند؛ getTransactions جدیدترین را اول برمی‌گرداند.
+    """
+
+    def __init__(self, config: SimConfig, memos: List[str], senders: Optional[List[str]] = None):
+        self.config = config
+        self.memos = list(memos)
+        self.senders = senders or ["EQsim-sender"]
+
+        self._rng = random.Random(f"{config.seed}:ton")
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._txs: List[dict] = []
+        self._blocks_made = 0
+        self._lt = 10_000_000
+        self._memo_idx = 0
+
+        self.produced: Dict[str, float] = {}
+        self.orphaned: set = set()
+        self.blocks_served = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.reorgs = 0
+
+    def _next_memo(self) -> str:
+        if self._memo_idx < len(self.memos):
+            memo = self.memos[self._memo_idx]
+            self._memo_idx += 1
+            return memo
+        return f"SIM-{self._rng.randint(0, 10**9)}"
+
+    def advance(self) -> int:
+        with self._lock:
+            elapsed = time.time() - self._started
+            target = int(elapsed * self.config.blocks_per_sec)
+            while self._blocks_made < target:
+                self._blocks_made += 1
+                now = time.time()
+                for _ in range(self.config.deposits_per_block):
+                    self._lt += 1000
+                    raw_hash = _hex_hash("ton", self._lt)
+                    amount = self._rng.randint(1, 100)
+                    self._txs.append({
+                        "transaction_id": {"lt": str(self._lt), "hash": raw_hash},
+                        "utime": int(now),
+                        "in_msg": {
+                            "value": str(amount * 1_000_000_000),
+                            "source": self._rng.choice(self.senders),
+                            "msg_data": {"@type": "msg.dataText", "text": self._next_memo()},
+                        },
+                    })
+                    self.produced[f"{self._lt}_{raw_hash}"] = now
+            return self._lt
+
+    def should_rate_limit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.config.rate_limit_probability > 0 and self._rng.random() < self.config.rate_limit_probability:
+                self.rate_limited += 1
+                return True
+            return False
+
+    def transactions(
+        self,
+        limit: int,
+        lt: Optional[int] = None,
+        tx_hash: Optional[str] = None,
+        to_lt: Optional[int] = None,
+    ) -> List[dict]:
+        self.advance()
+        with self._lock:
+            newest_first = list(reversed(self._txs))
+
+        if lt is not None and tx_hash:
+            start = next(
+                (i for i, t in enumerate(newest_first) if int(t["transaction_id"]["lt"]) <= int(lt)),
+                len(newest_first),
+            )
+            newest_first = newest_first[start:]
+
+        out = []
+        for t in newest_first:
+            if to_lt and int(t["transaction_id"]["lt"]) <= int(to_lt):
+                break
+            out.append(t)
+            if len(out) >= limit:
+                break
+
+        with self._lock:
+            self.blocks_served += len(out)
+        return out
@@ -0,0 +1,292 @@
+"""
+Chain Simulator Server
+stand-in محلی برای TronGrid / Toncenter / EVM JSON-RPC
+
+مسیرها (base URL هر provider را به این‌ها اشاره دهید):
+- TRONGRID_BASE_URL   = http://host:port/tron
+- TONCENTER_BASE_URL  = http://host:port/ton
+- ERC20_RPC_URL       = http://host:port/evm/ERC20
+- BEP20_RPC_URL       = http://host:port/evm/BEP20
+
+/__sim__/stats و /__sim__/deposits برای اسکریپت بنچمارک هستند.
+
+اجرا:
+    python -m src.simulator.server --port 8700 --tron-address T... --evm-address 0x...
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from src.simulator.chain import SimConfig, SyntheticChain, SyntheticTonWallet
+
+
+EVM_TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+TRON_SIM_SENDER = "TSimSender1111111111111111111111111"
+EVM_SIM_SENDER = "0x" + "5e" * 20
+
+
+@dataclass
+class Simulation:
+    tron: Optional[SyntheticChain] = None
+    ton: Optional[SyntheticTonWallet] = None
+    evm: Dict[str, SyntheticChain] = field(default_factory=dict)
+
+    def chains(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        if self.tron:
+            out["TRC20"] = self.tron
+        if self.ton:
+            out["TON"] = self.ton
+        out.update(self.evm)
+        return out
+
+
+def build_simulation(
+    config: SimConfig,
+    tron_addresses: Optional[List[str]] = None,
+    ton_memos: Optional[List[str]] = None,
+    evm_addresses: Optional[Dict[str, List[str]]] = None,
+) -> Simulation:
+    sim = Simulation()
+    if tron_addresses:
+        sim.tron = SyntheticChain("TRC20", config, tron_addresses, sender=TRON_SIM_SENDER)
+    if ton_memos:
+        sim.ton = SyntheticTonWallet(config, ton_memos)
+    for network, addresses in (evm_addresses or {}).items():
+        if addresses:
+            sim.evm[network.upper()] = SyntheticChain(
+                network.upper(),
+                config,
+                [a.lower() for a in addresses],
+                start_block=20_000_000,
+                hash_prefix="0x",
+                sender=EVM_SIM_SENDER,
+            )
+    return sim
+
+
+def _rate_limited() -> JSONResponse:
+    return JSONResponse({"error": "rate limit exceeded (simulated)"}, status_code=429)
+
+
+def _topic(addr: str) -> str:
+    return "0x" + addr.lower().replace("0x", "").zfill(64)
+
+
+def create_app(sim: Simulation) -> FastAPI:
+    app = FastAPI(title="Chain Simulator")
+
+    # ------------------------------------------------------------------
+    # TRON (TronGrid)
+    # ------------------------------------------------------------------
+
+    @app.api_route("/tron/wallet/getnowblock", methods=["GET", "POST"])
+    async def tron_now_block():
+        chain = sim.tron
+        if chain is None:
+            return JSONResponse({"error": "tron disabled"}, status_code=404)
+        if chain.should_rate_limit():
+            return _rate_limited()
+        head = chain.advance()
+        block = chain.block(head)
+        return {
+            "blockID": block.hash,
+            "block_header": {"raw_data": {"number": head, "timestamp": block.timestamp_ms}},
+        }
+
+    @app.api_route("/tron/wallet/getblockbynum", methods=["GET", "POST"])
+    async def tron_block_by_num(request: Request):
+        chain = sim.tron
+        if chain is None:
+            return JSONResponse({"error": "tron disabled"}, status_code=404)
+        if chain.should_rate_limit():
+            return _rate_limited()
+        body = await request.json() if request.method == "POST" else dict(request.query_params)
+        block = chain.block(int(body.get("num", 0)))
+        if block is None:
+            return {}
+        return {
+            "blockID": block.hash,
+            "block_header": {"raw_data": {"number": block.number, "timestamp": block.timestamp_ms}},
+        }
+
+    @app.get("/tron/v1/contracts/{contract}/events")
+    async def tron_contract_events(contract: str, request: Request):
+        chain = sim.tron
+        if chain is None:
+            return JSONResponse({"error": "tron disabled"}, status_code=404)
+        if chain.should_rate_limit():
+            return _rate_limited()
+
+        q = request.query_params
+        bn = q.get("blockNumber") or q.get("block_number")
+        if bn is None:
+            return {"data": [], "success": True}
+
+        blocks = chain.blocks_range(int(bn), int(bn))
+        data = []
+        for block in blocks:
+            for t in block.transfers:
+                data.append({
+                    "transaction_id": t.tx_hash,
+                    "block_number": block.number,
+                    "block_timestamp": block.timestamp_ms,
+                    "contract_address": contract,
+                    "event_name": "Transfer",
+                    "result": {
+                        "from": t.from_address,
+                        "to": t.to_address,
+                        "value": str(int(t.amount * 10**6)),
+                    },
+                })
+        return {"data": data, "success": True}
+
+    # ------------------------------------------------------------------
+    # TON (Toncenter v2)
+    # ------------------------------------------------------------------
+
+    @app.get("/ton/getTransactions")
+    async def ton_get_transactions(
+        address: str,
+        limit: int = 50,
+        lt: Optional[int] = None,
+        hash: Optional[str] = None,
+        to_lt: Optional[int] = None,
+    ):
+        wallet = sim.ton
+        if wallet is None:
+            return JSONResponse({"ok": False, "error": "ton disabled"}, status_code=404)
+        if wallet.should_rate_limit():
+            return _rate_limited()
+        return {"ok": True, "result": wallet.transactions(limit, lt=lt, tx_hash=hash, to_lt=to_lt)}
+
+    @app.get("/ton/getAddressBalance")
+    async def ton_balance(address: str):
+        return {"ok": True, "result": "0"}
+
+    # ------------------------------------------------------------------
+    # EVM (JSON-RPC)
+    # ------------------------------------------------------------------
+
+    @app.post("/evm/{network}")
+    async def evm_rpc(network: str, request: Request):
+        chain = sim.evm.get(network.upper())
+        if chain is None:
+            return JSONResponse({"error": f"{network} disabled"}, status_code=404)
+        if chain.should_rate_limit():
+            return _rate_limited()
+
+        body = await request.json()
+        rpc_id = body.get("id", 1)
+        method = body.get("method")
+        params = body.get("params") or []
+
+        if method == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": rpc_id, "result": hex(chain.advance())}
+
+        if method == "eth_getLogs":
+            flt = params[0] if params else {}
+            from_block = int(flt.get("fromBlock", "0x0"), 16)
+            to_block = int(flt.get("toBlock", "0x0"), 16)
+            topics = flt.get("topics") or []
+            to_filter = topics[2] if len(topics) > 2 else None
+            if isinstance(to_filter, str):
+                to_filter = [to_filter]
+            wanted = {t.lower() for t in to_filter} if to_filter else None
+
+            logs = []
+            for block in chain.blocks_range(from_block, to_block):
+                for t in block.transfers:
+                    to_topic = _topic(t.to_address)
+                    if wanted is not None and to_topic not in wanted:
+                        continue
+                    logs.append({
+                        "transactionHash": t.tx_hash,
+                        "blockNumber": hex(block.number),
+                        "blockHash": block.hash,
+                        "logIndex": hex(t.log_index),
+                        "address": flt.get("address"),
+                        "topics": [EVM_TRANSFER_TOPIC, _topic(t.from_address), to_topic],
+                        "data": hex(int(t.amount * 10**6)),
+                    })
+            return {"jsonrpc": "2.0", "id": rpc_id, "result": logs}
+
+        return {
+            "jsonrpc": "2.0",
+            "id": rpc_id,
+            "error": {"code": -32601, "message": f"method {method} not supported by simulator"},
+        }
+
+    # ------------------------------------------------------------------
+    # benchmark introspection
+    # ------------------------------------------------------------------
+
+    @app.get("/__sim__/stats")
+    async def sim_stats():
+        out = {}
+        for name, chain in sim.chains().items():
+            out[name] = {
+                "head": chain.advance(),
+                "produced": len(chain.produced),
+                "orphaned": len(chain.orphaned),
+                "blocks_served": chain.blocks_served,
+                "requests": chain.requests,
+                "rate_limited": chain.rate_limited,
+                "reorgs": chain.reorgs,
+            }
+        return out
+
+    @app.get("/__sim__/deposits")
+    async def sim_deposits(network: str):
+        chain = sim.chains().get(network.upper())
+        if chain is None:
+            return JSONResponse({"error": f"{network} disabled"}, status_code=404)
+        chain.advance()
+        return {
+            "produced": dict(chain.produced),
+            "orphaned": sorted(chain.orphaned),
+        }
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local chain simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--blocks-per-sec", type=float, default=1.0)
+    parser.add_argument("--deposits-per-block", type=int, default=5)
+    parser.add_argument("--reorg-probability", type=float, default=0.0)
+    parser.add_argument("--reorg-depth", type=int, default=2)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--tron-address", action="append", default=[])
+    parser.add_argument("--ton-memo", action="append", default=[])
+    parser.add_argument("--evm-address", action="append", default=[])
+    args = parser.parse_args()
+
+    config = SimConfig(
+        blocks_per_sec=args.blocks_per_sec,
+        deposits_per_block=args.deposits_per_block,
+        reorg_probability=args.reorg_probability,
+        reorg_depth=args.reorg_depth,
+        rate_limit_probability=args.rate_limit_probability,
+    )
+    sim = build_simulation(
+        config,
+        tron_addresses=args.tron_address,
+        ton_memos=args.ton_memo,
+        evm_addresses={"ERC20": args.evm_address, "BEP20": args.evm_address},
+    )
+    uvicorn.run(create_app(sim), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()